@@ -1,14 +1,38 @@
 import os
+import sys
 import json
-import requests
-from flask import Flask, request, jsonify, render_template
+import time
+import queue
+import zipfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
-import tempfile
-import PyPDF2
-import docx
 from werkzeug.utils import secure_filename
+from kanoon_cache import normalize_query
+import kanoon_client
+from kanoon_client import KanoonError
+from uploads import open_upload, read_upload
+import llm
+from pipeline import Pipeline
+import semantic_cache
+import prompt_builder
+import document_analysis
+import jobs
+from judgment_store import judgment_store
+from citation_graph import top_docs_by_authority
+from app_helpers import (
+    allowed_file,
+    extract_text_from_file,
+    extract_lead_text,
+    format_search_results,
+    build_kanoon_context,
+    collect_metrics,
+    build_chat_messages,
+    build_analysis_messages,
+)
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -21,106 +45,178 @@ load_dotenv()
 hf_api_key = os.getenv("HF_API_KEY")
 indian_kanoon_api_key = os.getenv("INDIAN_KANOON_API_KEY")
 
-# Initialize Hugging Face Inference Client
-client = InferenceClient(api_key=hf_api_key)
+# Initialize the inference client for the configured LLM backend
+client = llm.create_client()
 
 # Directory to save response files
 output_directory = os.path.abspath("output_files")
 os.makedirs(output_directory, exist_ok=True)
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {"pdf", "doc", "docx", "txt"}
-
-# System prompt for the chatbot
-system_template = """As a highly qualified Legal Advisor specializing in Indian law, your role is to provide expert, accurate, and comprehensive responses to legal inquiries. Utilize your extensive knowledge of Indian jurisprudence, including statutes, case law, and legal principles to formulate your answers. When responding:
-1. Conduct a thorough analysis of the query to identify key legal issues and relevant areas of law.
-2. Provide clear, concise explanations of applicable laws, acts, and legal concepts, citing specific sections where appropriate.
-3. Reference relevant case precedents and judicial pronouncements, including citations and brief summaries of their significance.
-4. Offer insights into potential legal strategies or courses of action, considering both short-term and long-term implications.
-5. Explain the practical applications of the law in the context of the query, including any potential challenges or considerations.
-6. Highlight any ambiguities, areas of legal debate, or recent developments in the law that may impact the situation.
-7. Where applicable, mention any relevant statutes of limitations or procedural requirements.
-8. Conclude with a succinct summary of key points, critical information, and recommended next steps if appropriate."""
-
-# Helper function to check allowed file extensions
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-# Helper function to extract text from files
-def extract_text_from_file(file, filename):
-    try:
-        file_extension = filename.rsplit('.', 1)[1].lower()
-        if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = "".join([page.extract_text() for page in pdf_reader.pages])
-        elif file_extension in ['doc', 'docx']:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-                temp_file.write(file.read())
-                temp_file.close()
-                doc = docx.Document(temp_file.name)
-                text = "\n".join([para.text for para in doc.paragraphs])
-            os.unlink(temp_file.name)
-        elif file_extension == 'txt':
-            text = file.read().decode('utf-8')
+# Batch analysis limits: documents per batch, total uncompressed bytes, parallel extractions,
+# and LLM calls in flight across the whole batch
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 200))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", 500 * 1024 * 1024))
+BATCH_EXTRACT_WORKERS = int(os.getenv("BATCH_EXTRACT_WORKERS", 4))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 4))
+
+# Helper function to extract the document and look it up on Indian Kanoon as a stage pipeline.
+# For PDFs the Kanoon search only needs the first pages, so it overlaps with full extraction;
+# both stages share the PDF bytes, while other formats are parsed straight from the upload buffer.
+def run_document_pipeline(upload, filename):
+    pipeline = Pipeline()
+    if filename.rsplit('.', 1)[1].lower() == 'pdf':
+        data = read_upload(open_upload(upload))
+        pipeline.add("extract", lambda: extract_text_from_file(data, filename))
+        pipeline.add("lead", lambda: extract_lead_text(data))
+        pipeline.add("kanoon", lambda lead: fetch_indian_kanoon_info(prompt_builder.lead_excerpt(lead)), "lead")
+    else:
+        pipeline.add("extract", lambda: extract_text_from_file(upload, filename))
+        pipeline.add("kanoon", lambda text: fetch_indian_kanoon_info(prompt_builder.lead_excerpt(text)), "extract")
+    results = pipeline.run()
+    return results["extract"], results["kanoon"], pipeline
+
+# Helper function to analyze an uploaded document end to end; used by /analyze and its job workers
+def analyze_upload(upload, filename):
+    document_text, kanoon_info, pipeline = run_document_pipeline(upload, filename)
+    document_text = document_analysis.condense_document(client, document_text)
+    messages, max_new_tokens = build_analysis_messages(document_text, kanoon_info)
+    analysis_content = document_analysis.generate_analysis(client, messages, max_new_tokens)
+    return {"analysis": analysis_content, "timings": pipeline.report()}
+
+# Helper function to expand uploaded files and zip archives into (filename, bytes) pairs.
+# Archive members with unsupported extensions are skipped; the batch size limits are enforced.
+def expand_batch_files(files):
+    documents = []
+    total_bytes = 0
+    for filename, file in files:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(open_upload(file)) as archive:
+                members = [
+                    (secure_filename(os.path.basename(info.filename)), info)
+                    for info in archive.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                ]
+                for member_name, info in members:
+                    if not allowed_file(member_name):
+                        continue
+                    total_bytes += info.file_size
+                    if total_bytes > BATCH_MAX_BYTES:
+                        raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes")
+                    documents.append((member_name, archive.read(info)))
+        elif allowed_file(filename):
+            data = read_upload(open_upload(file))
+            total_bytes += len(data)
+            if total_bytes > BATCH_MAX_BYTES:
+                raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes")
+            documents.append((filename, data))
         else:
-            raise ValueError("Unsupported file format")
-        return text
-    except Exception as e:
-        raise ValueError(f"Error while extracting text: {e}")
+            raise ValueError(f"Unsupported file: {filename}")
+        if len(documents) > BATCH_MAX_FILES:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_FILES} documents")
+    return documents
+
+# Analyze many documents at once, yielding one result per document as soon as it finishes.
+# Extraction runs in parallel; documents whose Kanoon queries normalize to the same text share
+# one lookup; analysis runs on a pool of `llm_concurrency` threads, and each document condenses
+# its sections one call at a time, so at most `llm_concurrency` LLM calls are in flight.
+def analyze_batch(documents, llm_concurrency=BATCH_LLM_CONCURRENCY):
+    started = time.perf_counter()
+    results = queue.Queue()
+    lookups = {}
+    lookups_lock = threading.Lock()
+    extract_pool = ThreadPoolExecutor(max_workers=BATCH_EXTRACT_WORKERS)
+    kanoon_pool = ThreadPoolExecutor(max_workers=kanoon_client.KANOON_FETCH_WORKERS)
+    llm_pool = ThreadPoolExecutor(max_workers=llm_concurrency)
+
+    def fail(index, filename, error):
+        results.put({"index": index, "filename": filename, "error": f"Error analyzing document: {error}"})
+
+    def analyze(index, filename, document_text, key, document_started):
+        try:
+            kanoon_info = lookups[key].result()
+            document_text = document_analysis.condense_document(client, document_text, max_workers=1)
+            messages, max_new_tokens = build_analysis_messages(document_text, kanoon_info)
+            results.put({
+                "index": index,
+                "filename": filename,
+                "analysis": document_analysis.generate_analysis(client, messages, max_new_tokens),
+                "elapsed_s": round(time.perf_counter() - document_started, 4),
+            })
+        except Exception as e:
+            fail(index, filename, e)
+
+    def extract(index, filename, data):
+        document_started = time.perf_counter()
+        try:
+            document_text = extract_text_from_file(data, filename)
+            query = prompt_builder.lead_excerpt(document_text)
+            key = normalize_query(query)
+            with lookups_lock:
+                if key not in lookups:
+                    lookups[key] = kanoon_pool.submit(fetch_indian_kanoon_info, query)
+            lookups[key].add_done_callback(
+                lambda _: llm_pool.submit(analyze, index, filename, document_text, key, document_started)
+            )
+        except Exception as e:
+            fail(index, filename, e)
+
+    try:
+        for index, (filename, data) in enumerate(documents):
+            extract_pool.submit(extract, index, filename, data)
+        for _ in documents:
+            yield results.get()
+        yield {
+            "done": True,
+            "documents": len(documents),
+            "kanoon_lookups": len(lookups),
+            "elapsed_s": round(time.perf_counter() - started, 4),
+        }
+    finally:
+        for pool in (extract_pool, kanoon_pool, llm_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# Command-line batch analysis: python app.py batch <files or zips...> prints NDJSON results
+def run_batch_cli(argv):
+    parser = argparse.ArgumentParser(prog="app.py batch", description="Analyze many legal documents at once.")
+    parser.add_argument("paths", nargs="+", help="documents (pdf, doc, docx, txt) or zip archives")
+    parser.add_argument("--concurrency", type=int, default=BATCH_LLM_CONCURRENCY, help="LLM calls in flight")
+    args = parser.parse_args(argv)
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as file:
+            files.append((os.path.basename(path), file.read()))
+    for event in analyze_batch(expand_batch_files(files), args.concurrency):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
 
 # Helper function to fetch legal information from Indian Kanoon
 def fetch_indian_kanoon_info(query):
     try:
-        url = "https://api.indiankanoon.org/search/"
-        params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-        response = requests.post(url, params=params, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            relevant_info = [
-                f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
-                for doc in data.get('docs', [])[:1]
-            ]
-            return "\n".join(relevant_info)
-        else:
-            return "Unable to fetch information from Indian Kanoon API."
+        data = kanoon_client.search(query)
+        return format_search_results(data)
+    except KanoonError:
+        return "Unable to fetch information from Indian Kanoon API."
     except Exception as e:
         return f"Error fetching Indian Kanoon info: {e}"
 
-# Helper function to fetch the top document's context
-def fetch_indian_kanoon_context(query):
+# Helper function to fetch the top-k documents' context
+def fetch_indian_kanoon_context(query, top_k=kanoon_client.KANOON_TOP_K):
     try:
-        search_url = "https://api.indiankanoon.org/search/"
-        search_params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-
-        search_response = requests.post(search_url, params=search_params, headers=headers)
-        search_response.raise_for_status()
-        search_data = search_response.json()
-
-        # Save search_response.json
-        search_file_path = os.path.join(output_directory, "search_response.json")
-        with open(search_file_path, "w") as file:
-            json.dump(search_data, file, indent=4)
+        search_data = kanoon_client.search(query)
 
-        # Get the first document's ID (tid)
-        docs = search_data.get("docs", [])
+        # Get the top-k document IDs (tid), without duplicates, the most-cited precedents first
+        docs = top_docs_by_authority(search_data, top_k)
         if not docs:
             return "No relevant documents found in Indian Kanoon."
-        docid = docs[0].get("tid")
 
-        # Fetch the document context
-        context_url = f"https://api.indiankanoon.org/doc/{docid}/"
-        context_response = requests.post(context_url, headers=headers)
-        context_response.raise_for_status()
-        context_data = context_response.json()
+        # Fetch the document contexts concurrently
+        documents = kanoon_client.fetch_docs([doc.get("tid") for doc in docs])
+        if not documents:
+            return "No content found in the document context."
 
-        # Save response_context.json
-        context_file_path = os.path.join(output_directory, "response_context.json")
-        with open(context_file_path, "w") as file:
-            json.dump(context_data, file, indent=4)
+        # Append the fetched judgments to the judgment store
+        judgment_store.record_judgments(documents)
 
-        return context_data.get("content", "No content found in the document context.")
+        return build_kanoon_context(query, documents)
     except Exception as e:
         return f"Error fetching Indian Kanoon context: {e}"
 
@@ -132,24 +228,71 @@ def index():
 def ai_help():
     return render_template('feature.html')
 
+@app.route("/metrics")
+def metrics():
+    return jsonify(collect_metrics())
+
+# Helper function to check whether the client asked for a streamed (NDJSON) response
+def wants_stream():
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+# Helper function to check whether the client asked for a background job instead of waiting
+def wants_async():
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+# Helper function to get an optional http(s) webhook URL to notify when a job finishes
+def job_webhook():
+    webhook = request.values.get("webhook", "").strip()
+    if webhook and not webhook.startswith(("http://", "https://")):
+        raise ValueError("Webhook must be an http(s) URL")
+    return webhook or None
+
+# Helper function to stream NDJSON events: a status line first, then one line per token
+def ndjson_response(events, error_prefix):
+    def generate():
+        try:
+            for event in events():
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"{error_prefix}: {e}"}) + "\n"
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 @app.route("/chat", methods=["POST"])
 def chatbot_response():
     query = request.json.get("query", "")
     if not query:
         return jsonify({"error": "Query is required"}), 400
 
+    # Answer near-duplicate questions from the semantic cache
+    cached_response, query_vector = semantic_cache.lookup(query)
+
+    if wants_stream():
+        def events():
+            if cached_response is not None:
+                yield {"status": "cached", "query": query}
+                yield {"token": cached_response}
+                yield {"done": True}
+                return
+            yield {"status": "retrieving", "query": query}
+            messages = build_chat_messages(query, fetch_indian_kanoon_context(query))
+            tokens = []
+            for token in llm.stream_tokens(client, messages, max_tokens=1500):
+                tokens.append(token)
+                yield {"token": token}
+            semantic_cache.store(query, "".join(tokens), vector=query_vector)
+            yield {"done": True}
+        return ndjson_response(events, "Error processing query")
+
+    if cached_response is not None:
+        return jsonify({"query": query, "response": cached_response, "cached": True})
+
     try:
-        kanoon_context = fetch_indian_kanoon_context(query)
-        messages = [
-            {"role": "system", "content": system_template},
-            {"role": "user", "content": f"Query: {query}\n\nIndian Kanoon Context: {kanoon_context}"}
-        ]
-        completion = client.chat.completions.create(
-            model="meta-llama/Llama-3.2-3B-Instruct",
-            messages=messages,
-            max_tokens=1500
-        )
-        response_content = completion.choices[0].message["content"]
+        messages = build_chat_messages(query, fetch_indian_kanoon_context(query))
+        response_content = llm.generate(client, messages, max_tokens=1500)
+        semantic_cache.store(query, response_content, vector=query_vector)
         # # Save response_context.json
         # ai_response_path = os.path.join(output_directory, "ai_response.txt")
         # with open(ai_response_path, "w") as file:
@@ -164,47 +307,69 @@ def analyze_document():
     if not file or not allowed_file(file.filename):
         return jsonify({"error": "Invalid or missing file"}), 400
     filename = secure_filename(file.filename)
+    upload = open_upload(file)
+
+    if wants_async():
+        try:
+            job_id = jobs.job_queue.submit("analyze", filename, read_upload(upload), webhook=job_webhook())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except jobs.QueueFullError as e:
+            return jsonify({"error": str(e)}), 503
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+    if wants_stream():
+        def events():
+            yield {"status": "analyzing", "filename": filename}
+            document_text, kanoon_info, pipeline = run_document_pipeline(upload, filename)
+            # Long documents are summarised section by section first; report progress as sections finish
+            for event in document_analysis.condense_events(client, document_text):
+                if "text" in event:
+                    document_text = event["text"]
+                else:
+                    yield event
+            yield {"status": "generating", "timings": pipeline.report()}
+            messages, max_new_tokens = build_analysis_messages(document_text, kanoon_info)
+            for token in document_analysis.stream_analysis(client, messages, max_new_tokens):
+                yield {"token": token}
+            yield {"done": True}
+        return ndjson_response(events, "Error analyzing document")
+
     try:
-        document_text = extract_text_from_file(file, filename)
-        kanoon_info = fetch_indian_kanoon_info(document_text[:500])
-
-        # Ensure the input is within token limits
-        analysis_prompt = f"""Analyze the following legal document and provide a comprehensive summary, highlighting relevant legal sections:
-
-        Document Content:
-        {document_text[:2000]}  # Truncate content if necessary to fit token limit
-
-        Relevant Indian Kanoon Information:
-        {kanoon_info}
-
-        Please provide:
-        1. A concise summary of the document's content and purpose
-        2. Key legal points or sections, with references to specific laws or regulations
-        3. Relevant laws, regulations, or case law mentioned or applicable
-        4. Potential legal implications or actions to consider
-        5. Any areas of ambiguity or potential legal challenges
-        6. Recommendations for further legal review or action, if necessary."""
-
-        messages = [
-            {"role": "system", "content": system_template},
-            {"role": "user", "content": analysis_prompt}
-        ]
-
-        # Adjust max_tokens to fit within limit
-        max_allowed_tokens = 4096 - len(analysis_prompt.split())
-        max_new_tokens = min(1500, max_allowed_tokens)
-
-        completion = client.chat.completions.create(
-            model="meta-llama/Llama-3.2-3B-Instruct",
-            messages=messages,
-            max_tokens=max_new_tokens
-        )
-
-        analysis_content = completion.choices[0].message["content"]
-        return jsonify({"analysis": analysis_content})
+        return jsonify(analyze_upload(upload, filename))
     except Exception as e:
         return jsonify({"error": f"Error analyzing document: {e}"}), 500
 
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch_documents():
+    files = [(secure_filename(file.filename), file) for file in request.files.getlist("files") + request.files.getlist("file")]
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    try:
+        documents = expand_batch_files(files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    concurrency = min(request.args.get("concurrency", BATCH_LLM_CONCURRENCY, type=int), BATCH_LLM_CONCURRENCY)
+    return ndjson_response(lambda: analyze_batch(documents, max(1, concurrency)), "Error analyzing batch")
+
+# Background analysis jobs submitted with /analyze?async=1; the workers start with the app, so jobs
+# left queued by a previous process run without waiting for a request
+jobs.job_queue.register("analyze", analyze_upload).start()
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        run_batch_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "worker":
+        # Run only the job workers, e.g. next to ASGI servers, which queue jobs but do not run them
+        while True:
+            time.sleep(3600)
+    else:
+        app.run(debug=True)
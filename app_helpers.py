@@ -0,0 +1,162 @@
+import os
+import logging
+import docx
+from kanoon_cache import cache_stats
+import kanoon_client
+import pdf_text
+from pdf_text import extract_pdf_text, extract_pdf_lead
+from uploads import open_upload, read_upload, iter_decoded
+import llm
+from local_index import document_body
+import vector_index
+import semantic_cache
+import prompt_builder
+import document_analysis
+import jobs
+from judgment_store import judgment_store
+import judgment_parser
+from entity_index import entity_index
+from citation_graph import citation_graph
+
+# Prompts, upload handling and prompt-context helpers shared by the Flask app (app.py) and the ASGI
+# app (asgi_app.py). Importing this module creates no inference client and starts no workers.
+
+# Token budget for the merged Kanoon documents in the chat prompt, counted with the model tokenizer
+KANOON_CONTEXT_TOKENS = int(os.getenv("KANOON_CONTEXT_TOKENS", 2000))
+
+# Pick the most query-relevant passages with the embedding model instead of each document's first characters
+VECTOR_PASSAGES = os.getenv("VECTOR_PASSAGES", "1") == "1"
+
+# Allowed file extensions
+ALLOWED_EXTENSIONS = {"pdf", "doc", "docx", "txt"}
+
+
+# System prompt for the chatbot
+system_template = """As a highly qualified Legal Advisor specializing in Indian law, your role is to provide expert, accurate, and comprehensive responses to legal inquiries. Utilize your extensive knowledge of Indian jurisprudence, including statutes, case law, and legal principles to formulate your answers. When responding:
+1. Conduct a thorough analysis of the query to identify key legal issues and relevant areas of law.
+2. Provide clear, concise explanations of applicable laws, acts, and legal concepts, citing specific sections where appropriate.
+3. Reference relevant case precedents and judicial pronouncements, including citations and brief summaries of their significance.
+4. Offer insights into potential legal strategies or courses of action, considering both short-term and long-term implications.
+5. Explain the practical applications of the law in the context of the query, including any potential challenges or considerations.
+6. Highlight any ambiguities, areas of legal debate, or recent developments in the law that may impact the situation.
+7. Where applicable, mention any relevant statutes of limitations or procedural requirements.
+8. Conclude with a succinct summary of key points, critical information, and recommended next steps if appropriate."""
+
+# Helper function to check allowed file extensions
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+# Helper function to extract text from files
+def extract_text_from_file(file, filename):
+    try:
+        file_extension = filename.rsplit('.', 1)[1].lower()
+        upload = open_upload(file)
+        if file_extension == 'pdf':
+            text = extract_pdf_text(read_upload(upload))
+        elif file_extension in ['doc', 'docx']:
+            doc = docx.Document(upload)
+            text = "\n".join([para.text for para in doc.paragraphs])
+        elif file_extension == 'txt':
+            text = "".join(iter_decoded(upload))
+        else:
+            raise ValueError("Unsupported file format")
+        return text
+    except Exception as e:
+        raise ValueError(f"Error while extracting text: {e}")
+
+# Helper function to extract just enough leading PDF text to build the Kanoon query
+def extract_lead_text(file, limit=500):
+    return extract_pdf_lead(read_upload(open_upload(file)), limit)
+
+
+# Helper function to format Indian Kanoon search results for the prompt
+def format_search_results(data, top_k=kanoon_client.KANOON_TOP_K):
+    relevant_info = [
+        f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
+        for doc in kanoon_client.top_docs(data, top_k)
+    ]
+    return "\n".join(relevant_info)
+
+
+# Helper function to merge several documents into one context under a token budget.
+# Shorter documents give their unused share to the longer ones, in ranking order.
+def merge_documents(documents, token_budget=KANOON_CONTEXT_TOKENS):
+    sections = [
+        (context_data.get("title", ""), prompt_builder.compact_whitespace(document_body(context_data)))
+        for context_data in documents
+    ]
+    remaining = token_budget
+    merged = []
+    for index, (title, content) in enumerate(sections):
+        share = remaining // (len(sections) - index)
+        excerpt, tokens = prompt_builder.fit_tokens(content, share)
+        remaining -= tokens
+        merged.append(f"Title: {title}\n{excerpt}")
+    return "\n\n".join(merged)
+
+# Helper function to turn the fetched documents into prompt context: the most relevant passages
+# when the embedding model is available, otherwise the leading text of each document
+def build_kanoon_context(query, documents):
+    if VECTOR_PASSAGES and vector_index.available():
+        try:
+            return vector_index.select_passages(query, documents, KANOON_CONTEXT_TOKENS)
+        except Exception as e:
+            logging.warning(f"Passage selection failed, using leading text: {e}")
+    return merge_documents(documents)
+
+
+# Helper function to collect the cache and client metrics reported by /metrics
+def collect_metrics():
+    return {
+        "kanoon_cache": cache_stats(),
+        "kanoon_client": kanoon_client.client_stats(),
+        "semantic_cache": semantic_cache.cache_stats(),
+        "analysis_cache": document_analysis.cache_stats(),
+        "pdf_page_cache": pdf_text.cache_stats(),
+        "jobs": jobs.job_queue.stats(),
+        "llm_single_flight": llm.flight_stats(),
+        "llm_backend": llm.backend_stats(),
+        "llm_prefix_cache": llm.prefix_stats(),
+        "judgment_store": judgment_store.stats(),
+        "parsed_doc_cache": judgment_parser.parsed_cache.stats(),
+        "entity_index": entity_index.stats(),
+        "citation_graph": citation_graph.stats(),
+    }
+
+
+# Helper function to build the chat messages for a query and its Kanoon context; the query is
+# packed first so only the retrieved context is cut when the context window is tight
+def build_chat_messages(query, kanoon_context):
+    messages, _ = prompt_builder.pack_messages(
+        system_template,
+        "Query: {query}\n\nIndian Kanoon Context: {kanoon_context}",
+        {"query": query, "kanoon_context": kanoon_context},
+    )
+    return messages
+
+# Helper function to build the analysis messages and token budget for a document.
+# The Kanoon information is packed before the document, which fills the rest of the window.
+# The fixed instructions come first so that backends with a prefix cache can reuse them.
+def build_analysis_messages(document_text, kanoon_info):
+    analysis_prompt = """Analyze the following legal document and provide a comprehensive summary, highlighting relevant legal sections.
+
+    Please provide:
+    1. A concise summary of the document's content and purpose
+    2. Key legal points or sections, with references to specific laws or regulations
+    3. Relevant laws, regulations, or case law mentioned or applicable
+    4. Potential legal implications or actions to consider
+    5. Any areas of ambiguity or potential legal challenges
+    6. Recommendations for further legal review or action, if necessary.
+
+    Document Content:
+    {document}
+
+    Relevant Indian Kanoon Information:
+    {kanoon_info}"""
+
+    return prompt_builder.pack_messages(
+        system_template,
+        analysis_prompt,
+        {"kanoon_info": kanoon_info, "document": document_text},
+        max_new_tokens=1500,
+    )
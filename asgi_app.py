@@ -0,0 +1,239 @@
+import json
+import asyncio
+from quart import Quart, Response, request, jsonify, render_template
+from quart_cors import cors
+from werkzeug.utils import secure_filename
+import kanoon_client
+from kanoon_client import KanoonError
+from uploads import open_upload, read_upload
+import llm
+import semantic_cache
+import prompt_builder
+import document_analysis
+import jobs
+from judgment_store import judgment_store
+from citation_graph import top_docs_by_authority
+from app_helpers import (
+    allowed_file,
+    extract_text_from_file,
+    extract_lead_text,
+    format_search_results,
+    build_kanoon_context,
+    build_chat_messages,
+    build_analysis_messages,
+    collect_metrics,
+)
+
+# Async (ASGI) variant of the Flask app: run with `hypercorn asgi_app:app` or `uvicorn asgi_app:app`.
+# Kanoon calls go through the shared httpx pool and generation through the async HF client,
+# so one worker process can hold many in-flight requests.
+app = cors(Quart(__name__))
+
+# Initialize the async inference client for the configured LLM backend
+client = llm.create_async_client()
+
+# Analysis jobs submitted here are queued in the shared job database and run by the workers of the
+# Flask app or of `python app.py worker`; this process starts no job workers of its own
+jobs.job_queue.register("analyze")
+
+
+@app.after_serving
+async def close_clients():
+    await kanoon_client.aclose()
+
+
+# Helper function to fetch legal information from Indian Kanoon
+async def fetch_indian_kanoon_info(query):
+    try:
+        data = await kanoon_client.async_search(query)
+        return format_search_results(data)
+    except KanoonError:
+        return "Unable to fetch information from Indian Kanoon API."
+    except Exception as e:
+        return f"Error fetching Indian Kanoon info: {e}"
+
+
+# Helper function to fetch the top-k documents' context
+async def fetch_indian_kanoon_context(query, top_k=kanoon_client.KANOON_TOP_K):
+    try:
+        search_data = await kanoon_client.async_search(query)
+
+        # Get the top-k document IDs (tid), without duplicates, the most-cited precedents first; the
+        # first call loads or computes the citation graph, so it runs off the event loop
+        docs = await asyncio.to_thread(top_docs_by_authority, search_data, top_k)
+        if not docs:
+            return "No relevant documents found in Indian Kanoon."
+
+        documents = await kanoon_client.async_fetch_docs([doc.get("tid") for doc in docs])
+        if not documents:
+            return "No content found in the document context."
+        judgment_store.record_judgments(documents)
+
+        # Passage selection runs the embedding model, keep it off the event loop
+        return await asyncio.to_thread(build_kanoon_context, query, documents)
+    except Exception as e:
+        return f"Error fetching Indian Kanoon context: {e}"
+
+
+# Helper function to extract the document and look it up on Indian Kanoon. Extraction is CPU-bound
+# and runs in a thread; for PDFs the Kanoon search starts from the first pages and overlaps with it.
+async def run_document_stages(upload, filename):
+    if filename.rsplit('.', 1)[1].lower() != 'pdf':
+        document_text = await asyncio.to_thread(extract_text_from_file, upload, filename)
+        return document_text, await fetch_indian_kanoon_info(prompt_builder.lead_excerpt(document_text))
+
+    data = read_upload(open_upload(upload))
+    extraction = asyncio.to_thread(extract_text_from_file, data, filename)
+
+    async def lookup():
+        lead = await asyncio.to_thread(extract_lead_text, data)
+        return await fetch_indian_kanoon_info(prompt_builder.lead_excerpt(lead))
+
+    document_text, kanoon_info = await asyncio.gather(extraction, lookup())
+    return document_text, kanoon_info
+
+
+# Helper function to check whether the client asked for a streamed (NDJSON) response
+def wants_stream():
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+# Helper function to check whether the client asked for a background job instead of waiting
+def wants_async():
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+
+# Helper function to get an optional http(s) webhook URL to notify when a job finishes
+async def job_webhook():
+    webhook = (request.args.get("webhook") or (await request.form).get("webhook") or "").strip()
+    if webhook and not webhook.startswith(("http://", "https://")):
+        raise ValueError("Webhook must be an http(s) URL")
+    return webhook or None
+
+
+# Helper function to stream NDJSON events from an async generator
+def ndjson_response(events, error_prefix):
+    async def generate():
+        try:
+            async for event in events():
+                yield (json.dumps(event) + "\n").encode()
+        except Exception as e:
+            yield (json.dumps({"error": f"{error_prefix}: {e}"}) + "\n").encode()
+    response = Response(generate(), mimetype="application/x-ndjson")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/")
+async def index():
+    return await render_template("index.html")
+
+
+@app.route("/ai-help")
+async def ai_help():
+    return await render_template('feature.html')
+
+
+@app.route("/metrics")
+async def metrics():
+    return jsonify(collect_metrics())
+
+
+@app.route("/chat", methods=["POST"])
+async def chatbot_response():
+    payload = await request.get_json()
+    query = (payload or {}).get("query", "")
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+
+    # Answer near-duplicate questions from the semantic cache (embedding runs off the event loop)
+    cached_response, query_vector = await asyncio.to_thread(semantic_cache.lookup, query)
+
+    if wants_stream():
+        async def events():
+            if cached_response is not None:
+                yield {"status": "cached", "query": query}
+                yield {"token": cached_response}
+                yield {"done": True}
+                return
+            yield {"status": "retrieving", "query": query}
+            messages = build_chat_messages(query, await fetch_indian_kanoon_context(query))
+            tokens = []
+            async for token in llm.astream_tokens(client, messages, max_tokens=1500):
+                tokens.append(token)
+                yield {"token": token}
+            semantic_cache.store(query, "".join(tokens), vector=query_vector)
+            yield {"done": True}
+        return ndjson_response(events, "Error processing query")
+
+    if cached_response is not None:
+        return jsonify({"query": query, "response": cached_response, "cached": True})
+
+    try:
+        messages = build_chat_messages(query, await fetch_indian_kanoon_context(query))
+        response_content = await llm.agenerate(client, messages, max_tokens=1500)
+        semantic_cache.store(query, response_content, vector=query_vector)
+        return jsonify({"query": query, "response": response_content})
+    except Exception as e:
+        return jsonify({"error": f"Error processing query: {e}"}), 500
+
+
+@app.route("/analyze", methods=["POST"])
+async def analyze_document():
+    files = await request.files
+    file = files.get("file")
+    if not file or not allowed_file(file.filename):
+        return jsonify({"error": "Invalid or missing file"}), 400
+    filename = secure_filename(file.filename)
+    upload = open_upload(file)
+
+    if wants_async():
+        try:
+            webhook = await job_webhook()
+            job_id = await asyncio.to_thread(jobs.job_queue.submit, "analyze", filename, read_upload(upload), webhook)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except jobs.QueueFullError as e:
+            return jsonify({"error": str(e)}), 503
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+    if wants_stream():
+        async def events():
+            yield {"status": "analyzing", "filename": filename}
+            document_text, kanoon_info = await run_document_stages(upload, filename)
+            # Long documents are summarised section by section first; report progress as sections finish
+            async for event in document_analysis.acondense_events(client, document_text):
+                if "text" in event:
+                    document_text = event["text"]
+                else:
+                    yield event
+            yield {"status": "generating"}
+            messages, max_new_tokens = build_analysis_messages(document_text, kanoon_info)
+            async for token in document_analysis.astream_analysis(client, messages, max_new_tokens):
+                yield {"token": token}
+            yield {"done": True}
+        return ndjson_response(events, "Error analyzing document")
+
+    try:
+        document_text, kanoon_info = await run_document_stages(upload, filename)
+        async for event in document_analysis.acondense_events(client, document_text):
+            document_text = event.get("text", document_text)
+        messages, max_new_tokens = build_analysis_messages(document_text, kanoon_info)
+        analysis_content = await document_analysis.agenerate_analysis(client, messages, max_new_tokens)
+        return jsonify({"analysis": analysis_content})
+    except Exception as e:
+        return jsonify({"error": f"Error analyzing document: {e}"}), 500
+
+
+
+@app.route("/jobs/<job_id>")
+async def job_status(job_id):
+    job = await asyncio.to_thread(jobs.job_queue.get, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
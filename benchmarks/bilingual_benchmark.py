@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Benchmark comparing legal_hindi's two ways of producing an English and a Hindi answer:
+# "single" (one completion with delimited English and Hindi sections, see bilingual.py) and
+# "two_call" (an English completion, then a translation of it). By default the model is a local
+# stub that charges a fixed time per prompt and per generated token, so the run is repeatable
+# offline; --live sends the same prompts to the configured LLM endpoint instead.
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_directory)
+
+QUERIES = [
+    "Can the police arrest me without a warrant for a bailable offence?",
+    "What is the procedure to get anticipatory bail under section 438 CrPC?",
+    "My landlord refuses to return the security deposit. What are my remedies?",
+    "Is a cheque bounce under section 138 of the Negotiable Instruments Act a criminal offence?",
+    "How can a wife claim maintenance under section 125 CrPC?",
+    "What is the limitation period for filing a civil suit for recovery of money?",
+    "Can an FIR be quashed by the High Court under section 482 CrPC?",
+    "What are the grounds for divorce under the Hindu Marriage Act?",
+]
+
+KANOON_CONTEXT = (
+    "Title: Section 41 in The Code Of Criminal Procedure, 1973\nSnippet: When police may arrest without warrant.\n\n"
+    "Title: Arnesh Kumar vs State Of Bihar & Anr on 2 July, 2014\nSnippet: No arrest should be made only because the offence is non-bailable.\n"
+)
+
+# Prompt used by legal_hindi's text query flow
+SYSTEM_PROMPT = (
+    "As a highly qualified Legal Advisor specializing in Indian law, your role is to provide expert, accurate, "
+    "and comprehensive responses to legal inquiries."
+)
+TEXT_QUERY_PROMPT = """
+    You are tasked with answering a legal query in a structured and organized format. Use the following guidelines:
+
+    Please provide the response in the following format:
+    1. **Key Defense Points**: Outline key arguments to defend against any legal allegations or challenges.
+    2. **Supportive Points**: Highlight relevant laws, evidence, or precedents that strengthen the case.
+    3. **Case Overview**: Mention any relevant judge(s), court name, and case details (if applicable).
+    4. **Reason for Dispute**: Summarize the primary cause of the dispute or legal issue.
+    5. **Legal Precedents**: Provide similar case precedents, their decisions, and relevance to this case.
+    6. **Recommendations**: Suggest potential legal strategies, next steps, or actions.
+
+    Ensure the response is concise, factual, and actionable.
+
+    User Query:
+    {user_query}
+
+    Relevant Indian Kanoon Context:
+    {kanoon_context}
+"""
+
+ENGLISH_LINE = "The court will consider the facts, the applicable provisions and the settled precedents before deciding."
+HINDI_LINE = "न्यायालय निर्णय लेने से पहले तथ्यों, लागू प्रावधानों और स्थापित नजीरों पर विचार करेगा।"
+_numbered_re = re.compile(r"^(\d+): ", re.MULTILINE)
+
+
+# Stub OpenAI-compatible chat completions endpoint that answers in the requested layout
+def make_stub_handler(prompt_latency, token_latency, answer_lines):
+    import prompt_builder
+    import bilingual
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = request["messages"][-1]["content"]
+            headings = [f"{number}. **Point {number}**: " for number in range(1, answer_lines + 1)]
+            if bilingual.HINDI_MARKER in prompt:
+                content = "\n".join(
+                    [bilingual.ENGLISH_MARKER] + [heading + ENGLISH_LINE for heading in headings]
+                    + [bilingual.HINDI_MARKER] + [heading + HINDI_LINE for heading in headings] + [bilingual.END_MARKER]
+                )
+            elif "Translate each numbered line" in prompt:
+                content = "\n".join(f"{number}: {HINDI_LINE}" for number in _numbered_re.findall(prompt))
+            else:
+                content = "\n".join(heading + ENGLISH_LINE for heading in headings)
+            prompt_tokens = sum(prompt_builder.count_tokens(message["content"]) for message in request["messages"])
+            completion_tokens = prompt_builder.count_tokens(content)
+            time.sleep(prompt_tokens * prompt_latency + completion_tokens * token_latency)
+
+            body = json.dumps({
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+# Inference client wrapper counting calls and the token usage reported by each completion
+class MeteredClient:
+    def __init__(self, client):
+        self.client = client
+        self.chat = self
+        self.completions = self
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def create(self, **kwargs):
+        completion = self.client.chat.completions.create(**kwargs)
+        with self._lock:
+            self.calls += 1
+            if completion.usage:
+                self.prompt_tokens += completion.usage.prompt_tokens
+                self.completion_tokens += completion.usage.completion_tokens
+        return completion
+
+
+# Run every query through one mode and summarise latency and token usage per request
+def run_mode(mode, client, queries):
+    import bilingual
+    import translation
+    import prompt_builder
+
+    latencies, calls, prompt_tokens, completion_tokens, fallbacks = [], [], [], [], 0
+    for query in queries:
+        # Cold translation caches, so the two-call mode pays for every translation as a new question would
+        translation.translation_cache.clear()
+        translation.phrase_memory.clear()
+        client.reset()
+        sections = {"user_query": query, "kanoon_context": KANOON_CONTEXT}
+        started = time.perf_counter()
+        if mode == "single":
+            messages, max_new_tokens = bilingual.pack_bilingual_messages(SYSTEM_PROMPT, TEXT_QUERY_PROMPT, sections)
+            result = bilingual.generate_bilingual(client, messages, max_new_tokens)
+        else:
+            messages, max_new_tokens = prompt_builder.pack_messages(SYSTEM_PROMPT, TEXT_QUERY_PROMPT, sections)
+            result = bilingual.generate_then_translate(client, messages, max_new_tokens)
+        latencies.append(time.perf_counter() - started)
+        fallbacks += result["mode"] == "fallback"
+        calls.append(client.calls)
+        prompt_tokens.append(client.prompt_tokens)
+        completion_tokens.append(client.completion_tokens)
+
+    return {
+        "requests": len(queries),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "llm_calls_per_request": round(statistics.mean(calls), 2),
+        "prompt_tokens_per_request": round(statistics.mean(prompt_tokens)),
+        "completion_tokens_per_request": round(statistics.mean(completion_tokens)),
+        "fallbacks": fallbacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-pass bilingual generation with generate-then-translate.")
+    parser.add_argument("--requests", type=int, default=len(QUERIES))
+    parser.add_argument("--live", action="store_true", help="use the configured LLM endpoint instead of the stub")
+    parser.add_argument("--prompt-latency", type=float, default=0.0002, help="stub seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stub seconds per generated token")
+    parser.add_argument("--answer-lines", type=int, default=6, help="numbered points in each stub answer")
+    parser.add_argument("--modes", default="single,two_call")
+    args = parser.parse_args()
+
+    # The caches are created on import, so point them at a scratch directory first
+    cache_directory = tempfile.TemporaryDirectory()
+    os.environ["KANOON_CACHE_DIR"] = cache_directory.name
+    os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "0")
+    import llm
+    from huggingface_hub import InferenceClient
+
+    server = None
+    if args.live:
+        client = MeteredClient(llm.create_client())
+    else:
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), make_stub_handler(args.prompt_latency, args.token_latency, args.answer_lines)
+        )
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = MeteredClient(InferenceClient(base_url=f"http://127.0.0.1:{server.server_port}", api_key="stub"))
+
+    queries = (QUERIES * (args.requests // len(QUERIES) + 1))[:args.requests]
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            results[mode] = run_mode(mode, client, queries)
+    finally:
+        if server is not None:
+            server.shutdown()
+        cache_directory.cleanup()
+
+    print(f"{'mode':<10}{'p50 ms':>10}{'mean ms':>10}{'calls':>8}{'prompt tok':>12}{'output tok':>12}{'fallbacks':>11}")
+    for mode, result in results.items():
+        print(f"{mode:<10}{result['p50_ms']:>10}{result['mean_ms']:>10}{result['llm_calls_per_request']:>8}"
+              f"{result['prompt_tokens_per_request']:>12}{result['completion_tokens_per_request']:>12}{result['fallbacks']:>11}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
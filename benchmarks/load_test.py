@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+# Load test comparing the sync Flask server (gunicorn, sync workers) with the ASGI server (hypercorn).
+# Both servers are pointed at a local stub upstream that simulates Indian Kanoon and the
+# OpenAI-compatible chat completions endpoint with fixed latencies, so the numbers measure
+# how many I/O-bound requests each serving model can overlap rather than upstream speed.
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Stub upstream for /search/, /doc/<tid>/ and /v1/chat/completions
+def make_upstream_handler(kanoon_latency, llm_latency):
+    class UpstreamHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if length:
+                self.rfile.read(length)
+            if self.path.startswith("/v1/chat/completions"):
+                time.sleep(llm_latency)
+                payload = {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "Stub legal analysis."}}],
+                }
+            elif self.path.startswith("/search/"):
+                time.sleep(kanoon_latency)
+                tid = abs(hash(self.path)) % 10_000_000
+                payload = {"docs": [{"tid": tid, "title": "Stub v. State", "snippet": "Stub snippet."}]}
+            else:
+                time.sleep(kanoon_latency)
+                payload = {"tid": 1, "title": "Stub v. State", "content": "<p>Stub judgment text.</p>"}
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return UpstreamHandler
+
+
+# Helper function to start the stub upstream in a background thread
+def start_upstream(port, kanoon_latency, llm_latency):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_upstream_handler(kanoon_latency, llm_latency))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Helper function to launch one of the two servers as a subprocess. Every on-disk store points into
+# `state_dir`, so each run starts cold and the benchmark never writes to output_files.
+def start_server(kind, port, workers, upstream_url, state_dir):
+    env = dict(
+        os.environ,
+        KANOON_BASE_URL=upstream_url,
+        LLM_BASE_URL=upstream_url,
+        HF_API_KEY=os.getenv("HF_API_KEY", "stub"),
+        INDIAN_KANOON_API_KEY=os.getenv("INDIAN_KANOON_API_KEY", "stub"),
+        KANOON_CACHE_DIR=os.path.join(state_dir, "cache"),
+        JOBS_DB=os.path.join(state_dir, "jobs", "jobs.sqlite3"),
+        JUDGMENT_STORE_DB=os.path.join(state_dir, "store", "judgments.sqlite3"),
+        ENTITY_INDEX_DB=os.path.join(state_dir, "index", "entities.sqlite3"),
+        LOCAL_INDEX_DIR=os.path.join(state_dir, "index", "bm25"),
+        CITATION_GRAPH_DIR=os.path.join(state_dir, "index", "graph"),
+        VECTOR_INDEX_DIR=os.path.join(state_dir, "index", "vectors"),
+        # The load queries differ only in their counter, so the semantic cache would answer most of them
+        SEMANTIC_CACHE_ENABLED="0",
+    )
+    if kind == "sync":
+        command = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                   "--backlog", "2048", "--timeout", "300", "app:app"]
+    else:
+        command = [sys.executable, "-m", "hypercorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                   "--backlog", "2048", "asgi_app:app"]
+    process = subprocess.Popen(command, cwd=repo_directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start on port {port}")
+
+
+# Fire `total` /chat requests with at most `concurrency` in flight and collect latencies
+async def run_load(base_url, total, concurrency, label):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json={"query": f"{label} bail under section 437 #{i}"})
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(total / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /chat throughput of the sync and ASGI servers.")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes for each server")
+    parser.add_argument("--kanoon-latency", type=float, default=0.2, help="simulated Kanoon latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="simulated generation latency (s)")
+    parser.add_argument("--targets", default="sync,async")
+    args = parser.parse_args()
+
+    upstream = start_upstream(8799, args.kanoon_latency, args.llm_latency)
+    upstream_url = "http://127.0.0.1:8799"
+    results = {}
+    try:
+        for port, kind in enumerate(args.targets.split(","), start=8801):
+            with tempfile.TemporaryDirectory() as state_dir:
+                process = start_server(kind, port, args.workers, upstream_url, state_dir)
+                try:
+                    results[kind] = asyncio.run(
+                        run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, kind)
+                    )
+                finally:
+                    process.terminate()
+                    process.wait()
+    finally:
+        upstream.shutdown()
+
+    print(f"{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for kind, result in results.items():
+        print(f"{kind:<8}{result['requests_per_s']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['errors']:>8}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
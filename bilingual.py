@@ -0,0 +1,223 @@
+import os
+import re
+import inspect
+import logging
+import llm
+import translation
+import prompt_builder
+
+# Tokens reserved for an answer written in both languages; Devanagari costs several times more
+# tokens than the same English text, so this is well above the English-only 1500
+BILINGUAL_MAX_TOKENS = int(os.getenv("BILINGUAL_MAX_TOKENS", 2500))
+
+# Markers the model writes around each language; a reply missing them falls back to translation
+ENGLISH_MARKER = "[[ENGLISH]]"
+HINDI_MARKER = "[[HINDI]]"
+END_MARKER = "[[END]]"
+
+BILINGUAL_INSTRUCTIONS = f"""
+
+Write the complete answer twice, first in English and then in Hindi, using exactly this layout:
+{ENGLISH_MARKER}
+<the answer in English>
+{HINDI_MARKER}
+<the same answer translated into Hindi, with the same headings and numbering>
+{END_MARKER}"""
+
+# Text held back while streaming, so that a marker split across tokens is never shown
+_HOLDBACK = max(len(ENGLISH_MARKER), len(HINDI_MARKER), len(END_MARKER)) - 1
+# Without an English marker within this many characters, the reply is treated as unmarked English
+_PREAMBLE_CHARS = 200
+_devanagari_re = re.compile(r"[\u0900-\u097f]")
+_paragraph_re = re.compile(r"\n\s*\n")
+
+
+# Helper function to ask for both languages in one reply by extending the last user message
+def build_bilingual_messages(messages):
+    messages = [dict(message) for message in messages]
+    messages[-1]["content"] = messages[-1]["content"] + BILINGUAL_INSTRUCTIONS
+    return messages
+
+
+# Helper function to pack a prompt (see prompt_builder.pack_messages) with the bilingual layout
+# instructions appended to the template, so they are counted against the context window
+def pack_bilingual_messages(system_prompt, template, sections, max_new_tokens=BILINGUAL_MAX_TOKENS, caps=None):
+    return prompt_builder.pack_messages(
+        system_prompt, inspect.cleandoc(template) + BILINGUAL_INSTRUCTIONS, sections, max_new_tokens, caps
+    )
+
+
+# Incremental parser splitting a reply into its English and Hindi sections as text arrives.
+# feed() and close() return (language, text) pieces ready to display.
+class BilingualParser:
+    def __init__(self):
+        self.section = None
+        self.buffer = ""
+        self.english = ""
+        self.hindi = ""
+        self.marked = False
+
+    def feed(self, text):
+        self.buffer += text
+        pieces = []
+        while True:
+            if self.section is None:
+                index = self.buffer.find(ENGLISH_MARKER)
+                if index >= 0:
+                    self.buffer = self.buffer[index + len(ENGLISH_MARKER):]
+                    self.section = "en"
+                    self.marked = True
+                elif len(self.buffer) > _PREAMBLE_CHARS:
+                    self.section = "en"
+                else:
+                    break
+            elif self.section in ("en", "hi"):
+                marker = HINDI_MARKER if self.section == "en" else END_MARKER
+                index = self.buffer.find(marker)
+                if index >= 0:
+                    self._emit(pieces, self.buffer[:index])
+                    self.buffer = self.buffer[index + len(marker):]
+                    self.section = "hi" if self.section == "en" else "end"
+                else:
+                    self._emit(pieces, self.buffer[:max(0, len(self.buffer) - _HOLDBACK)])
+                    self.buffer = self.buffer[max(0, len(self.buffer) - _HOLDBACK):]
+                    break
+            else:
+                self.buffer = ""
+                break
+        return pieces
+
+    def close(self):
+        pieces = []
+        if self.section is None:
+            self.section = "en"
+        if self.section in ("en", "hi"):
+            self._emit(pieces, self.buffer)
+        self.buffer = ""
+        return pieces
+
+    def _emit(self, pieces, text):
+        if self.section == "en":
+            if not self.english:
+                text = text.lstrip()
+            self.english += text
+        else:
+            if not self.hindi:
+                text = text.lstrip()
+            self.hindi += text
+        if text:
+            pieces.append((self.section, text))
+
+    # True once the reply is in its marked Hindi section and that section is actually in Hindi
+    def in_hindi(self):
+        return self.marked and self.section in ("hi", "end") and bool(_devanagari_re.search(self.hindi))
+
+    # True when the Hindi section is in Hindi and was closed by the end marker; a reply cut off by
+    # the token limit never reaches the end marker, so its Hindi part is incomplete
+    def complete(self):
+        return self.in_hindi() and self.section == "end"
+
+
+# Helper function to split text into its non-empty paragraphs
+def split_paragraphs(text):
+    return [paragraph for paragraph in _paragraph_re.split(text) if paragraph.strip()]
+
+
+# Helper function to split a whole reply; returns (english, hindi, complete)
+def parse_bilingual(text):
+    parser = BilingualParser()
+    parser.feed(text)
+    parser.close()
+    return parser.english.strip(), parser.hindi.strip(), parser.complete()
+
+
+# Helper function to generate an answer in English and Hindi from one completion of bilingual
+# `messages` (see pack_bilingual_messages). If the reply cannot be split, its English part is
+# translated separately (the two-call path).
+def generate_bilingual(client, messages, max_tokens=BILINGUAL_MAX_TOKENS, backend=None):
+    english, hindi, complete = parse_bilingual(llm.generate(client, messages, max_tokens))
+    if complete:
+        return {"english": english, "hindi": hindi, "mode": "single"}
+    logging.warning("Bilingual reply was cut off or could not be parsed; translating the English answer separately.")
+    return {
+        "english": english,
+        "hindi": translation.translate(english, "en", "hi", backend or translation.LLMBackend(client)),
+        "mode": "fallback",
+    }
+
+
+# Helper function for the two-call path: generate in English, then translate the answer to Hindi
+def generate_then_translate(client, messages, max_tokens=1500, backend=None):
+    english = llm.generate(client, messages, max_tokens).strip()
+    return {
+        "english": english,
+        "hindi": translation.translate(english, "en", "hi", backend or translation.LLMBackend(client)),
+        "mode": "two_call",
+    }
+
+
+# Streams one completion of bilingual `messages` as two consecutive generators, english() then hindi(), so
+# the Streamlit apps can render each language in its own block. hindi() falls back to
+# translating the English answer when the reply could not be split. `stream_fn(client, messages,
+# max_tokens)` produces the reply; document_analysis.stream_analysis can be passed to cache it.
+class BilingualStream:
+    def __init__(self, client, messages, max_tokens=BILINGUAL_MAX_TOKENS, backend=None, stream_fn=None):
+        self.client = client
+        self.backend = backend or translation.LLMBackend(client)
+        self.parser = BilingualParser()
+        self.mode = None
+        self._tokens = iter((stream_fn or llm.stream_tokens)(client, messages, max_tokens))
+        self._pieces = []
+        self._finished = False
+
+    def _next_piece(self):
+        while not self._pieces:
+            if self._finished:
+                return None
+            token = next(self._tokens, None)
+            if token is None:
+                self._finished = True
+                self._pieces.extend(self.parser.close())
+            else:
+                self._pieces.extend(self.parser.feed(token))
+        return self._pieces.pop(0)
+
+    def english(self):
+        while True:
+            piece = self._next_piece()
+            if piece is None:
+                return
+            if piece[0] != "en":
+                self._pieces.insert(0, piece)
+                return
+            yield piece[1]
+
+    def hindi(self):
+        for _ in self.english():
+            pass
+        # Hindi text is shown a paragraph at a time once it is clearly Hindi, since the model sometimes
+        # repeats English here. If the reply is cut off before the end marker, the unfinished paragraph
+        # is dropped and the English paragraphs not yet shown in Hindi are translated instead.
+        held = ""
+        shown = 0
+        while True:
+            piece = self._next_piece()
+            if piece is None:
+                break
+            held += piece[1]
+            if self.parser.in_hindi():
+                cut = held.rfind("\n\n")
+                if cut >= 0:
+                    shown += len(split_paragraphs(held[:cut]))
+                    yield held[:cut + 2]
+                    held = held[cut + 2:]
+        if self.parser.complete():
+            self.mode = "single"
+            if held:
+                yield held
+            return
+        logging.warning("Bilingual reply was cut off or could not be parsed; translating the rest of the English answer.")
+        self.mode = "fallback"
+        remaining = "\n\n".join(split_paragraphs(self.parser.english)[shown:])
+        if remaining:
+            yield from translation.stream_translation(remaining, "en", "hi", self.backend)
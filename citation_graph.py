@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+import numpy as np
+import kanoon_client
+from judgment_store import judgment_store
+from entity_index import entity_index
+
+# Directory holding the citation graph's CSR arrays and authority scores
+graph_directory = os.path.abspath(os.getenv("CITATION_GRAPH_DIR", os.path.join("output_files", "index", "graph")))
+
+# PageRank damping factor, convergence tolerance (L1 change per iteration) and iteration cap
+CITATION_DAMPING = float(os.getenv("CITATION_DAMPING", 0.85))
+CITATION_TOLERANCE = float(os.getenv("CITATION_TOLERANCE", 1e-8))
+CITATION_MAX_ITERATIONS = int(os.getenv("CITATION_MAX_ITERATIONS", 100))
+# Share of the re-ranking score given to authority; the rest is the search engine's own order
+CITATION_AUTHORITY_WEIGHT = float(os.getenv("CITATION_AUTHORITY_WEIGHT", 0.3))
+# Search results considered for re-ranking before the top-k are fetched
+CITATION_RERANK_POOL = int(os.getenv("CITATION_RERANK_POOL", 10))
+CITATION_RERANK = os.getenv("CITATION_RERANK", "1") == "1"
+# New judgments are batched into one recompute: at most every CITATION_RECOMPUTE_SECONDS, or sooner
+# once CITATION_RECOMPUTE_BATCH judgments are waiting
+CITATION_RECOMPUTE_SECONDS = float(os.getenv("CITATION_RECOMPUTE_SECONDS", 30))
+CITATION_RECOMPUTE_BATCH = int(os.getenv("CITATION_RECOMPUTE_BATCH", 500))
+
+
+# Helper function to read "cites" edges from the entity index: /doc/ links to other judgments, and
+# citations in the text that resolve to a judgment we have fetched (by its equivalent citations).
+# Links to pages we have fetched that are statutes ("Central Government Act" and the like) are left out.
+def read_edges(connection, tids=None):
+    link_sql = (
+        "SELECT postings.tid, postings.key FROM postings LEFT JOIN documents ON documents.tid = postings.key "
+        "WHERE postings.field = 'link' AND (documents.court IS NULL OR (documents.court NOT LIKE '%Act%' "
+        "AND documents.court NOT LIKE '%Government%'))"
+    )
+    cites_sql = (
+        "SELECT cites.tid, reported.tid FROM postings AS cites JOIN postings AS reported "
+        "ON reported.field = 'citation' AND reported.key = cites.key WHERE cites.field = 'cites'"
+    )
+    parameters = ()
+    if tids is not None:
+        marks = ",".join("?" * len(tids))
+        link_sql += f" AND postings.tid IN ({marks})"
+        cites_sql += f" AND cites.tid IN ({marks})"
+        parameters = tuple(tids)
+    edges = {}
+    for sql in (link_sql, cites_sql):
+        for source, target in connection.execute(sql, parameters):
+            if source != target and source.isdigit() and target.isdigit():
+                edges.setdefault(int(source), set()).add(int(target))
+    return edges
+
+
+# Build the CSR arrays for an {int source tid: set(int target tids)} edge map: node tids sorted (so a tid is found
+# with one searchsorted), indptr[i]:indptr[i + 1] slicing node i's cited nodes out of indices
+def build_csr(edges):
+    count = sum(len(targets) for targets in edges.values())
+    sources = np.fromiter((source for source, targets in edges.items() for _ in targets), np.int64, count)
+    targets = np.fromiter((target for targets in edges.values() for target in targets), np.int64, count)
+    node_ids = np.unique(np.concatenate([sources, targets, np.fromiter(edges, np.int64, len(edges))]))
+    sources = np.searchsorted(node_ids, sources)
+    targets = np.searchsorted(node_ids, targets)
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+    return node_ids, indptr, targets[order].astype(np.int32)
+
+
+# PageRank by power iteration over CSR arrays. `start` warm-starts from the previous scores, so after
+# a few new judgments only a handful of iterations are needed. Nodes citing nothing spread their
+# score evenly over every node.
+def pagerank(indptr, indices, start=None, damping=CITATION_DAMPING, tolerance=CITATION_TOLERANCE,
+             max_iterations=CITATION_MAX_ITERATIONS):
+    count = len(indptr) - 1
+    if count == 0:
+        return np.zeros(0, dtype=np.float64), 0
+    out_degree = np.diff(indptr)
+    sources = np.repeat(np.arange(count), out_degree)
+    dangling = out_degree == 0
+    scores = np.full(count, 1.0 / count) if start is None else start / start.sum()
+    for iteration in range(1, max_iterations + 1):
+        shares = np.where(dangling, 0.0, scores / np.maximum(out_degree, 1))
+        updated = np.bincount(indices, weights=shares[sources], minlength=count)
+        updated = damping * (updated + scores[dangling].sum() / count) + (1 - damping) / count
+        change = np.abs(updated - scores).sum()
+        scores = updated
+        if change < tolerance:
+            break
+    return scores, iteration
+
+
+# Citation graph over cached judgments with precomputed authority (PageRank) scores. It is rebuilt
+# from the entity index on start, then updated as the judgment store writes new judgments: their
+# out-edges are replaced at once, and PageRank re-converges from the previous scores in one batched
+# recompute per CITATION_RECOMPUTE_SECONDS. Readers get an immutable snapshot, so re-ranking never
+# waits on an update.
+class CitationGraph:
+    def __init__(self, path=graph_directory):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._edges = None
+        self._snapshot = None
+        self._pending = 0
+        self._timer = None
+        self.updates = 0
+        self.last_iterations = 0
+        self.last_update_ms = 0.0
+        self.reranked = 0
+
+    # Helper function to read the edges from the entity index and the saved arrays (the warm start
+    # for the next update) on first use; returns True when it loaded them
+    def _load(self):
+        if self._edges is not None:
+            return False
+        self._edges = read_edges(entity_index._connection())
+        if os.path.exists(os.path.join(self.path, "node_ids.npy")):
+            node_ids, indptr, indices, scores = (
+                np.load(os.path.join(self.path, f"{name}.npy")) for name in ("node_ids", "indptr", "indices", "scores")
+            )
+            self._snapshot = (node_ids, indptr, indices, scores, np.sort(scores))
+        return True
+
+    # Rebuild the CSR arrays from the edge map and re-converge PageRank, warm-started from the last scores
+    def _recompute(self):
+        started = time.perf_counter()
+        node_ids, indptr, indices = build_csr(self._edges)
+        start = None
+        if self._snapshot is not None and len(node_ids):
+            previous_ids, _, _, previous_scores, _ = self._snapshot
+            start = np.full(len(node_ids), 1.0 / len(node_ids))
+            if len(previous_ids):
+                positions = np.clip(np.searchsorted(previous_ids, node_ids), 0, len(previous_ids) - 1)
+                known = previous_ids[positions] == node_ids
+                start[known] = previous_scores[positions[known]]
+        scores, iterations = pagerank(indptr, indices, start)
+        # Sorted scores give each node's percentile in the whole graph, used to scale authority when re-ranking
+        self._snapshot = (node_ids, indptr, indices, scores, np.sort(scores))
+        self._pending = 0
+        self.last_iterations = iterations
+        self.last_update_ms = (time.perf_counter() - started) * 1000
+        self.updates += 1
+        self._save()
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name, array in zip(("node_ids", "indptr", "indices", "scores"), self._snapshot[:4]):
+            temporary = os.path.join(self.path, f"{name}.tmp.npy")
+            np.save(temporary, array)
+            os.replace(temporary, os.path.join(self.path, f"{name}.npy"))
+
+    # Judgment store listener: replace the out-edges of new or changed judgments and schedule a recompute
+    def add_judgments(self, payloads):
+        tids = [str(payload["tid"]) for payload in payloads if str(payload.get("tid", "")).isdigit()]
+        if not tids:
+            return
+        with self._lock:
+            if not self._load():
+                edges = read_edges(entity_index._connection(), tids)
+                for tid in map(int, tids):
+                    if edges.get(tid):
+                        self._edges[tid] = edges[tid]
+                    else:
+                        self._edges.pop(tid, None)
+            self._pending += len(tids)
+            if self._pending >= CITATION_RECOMPUTE_BATCH:
+                self._recompute()
+            elif self._timer is None:
+                self._timer = threading.Timer(CITATION_RECOMPUTE_SECONDS, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    # Recompute now if judgments are waiting (called by the timer, and usable before shutdown or in tests)
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                self._recompute()
+
+    # Rebuild everything from the entity index
+    def rebuild(self):
+        with self._lock:
+            self._edges = read_edges(entity_index._connection())
+            self._snapshot = None
+            self._recompute()
+        return len(self._snapshot[0])
+
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._lock:
+                self._load()
+                if self._snapshot is None:
+                    self._recompute()
+        return self._snapshot
+
+    # Authority scores for tids in one vectorized lookup, with each score's percentile in the whole
+    # graph (the share of nodes with a lower score); tids outside the graph score 0
+    def authority(self, tids, percentiles=False):
+        node_ids, _, _, scores, sorted_scores = self.snapshot()
+        wanted = np.array([int(tid) if str(tid).isdigit() else -1 for tid in tids], dtype=np.int64)
+        if not len(node_ids) or not len(wanted):
+            zeros = np.zeros(len(wanted), dtype=np.float64)
+            return (zeros, zeros) if percentiles else zeros
+        positions = np.clip(np.searchsorted(node_ids, wanted), 0, len(node_ids) - 1)
+        authority = np.where(node_ids[positions] == wanted, scores[positions], 0.0)
+        if not percentiles:
+            return authority
+        percentile = np.where(authority > 0, np.searchsorted(sorted_scores, authority, side="left") / len(sorted_scores), 0.0)
+        return authority, percentile
+
+    # Re-order search results by blending their original rank with their authority, both scaled to 0..1.
+    # Authority is scaled by its percentile over the whole graph, not by the best score in this result
+    # pool, so a pool where one result happens to be cached is not reordered around it.
+    def rerank(self, docs, weight=CITATION_AUTHORITY_WEIGHT):
+        if len(docs) < 2 or weight <= 0:
+            return list(docs)
+        authority, percentile = self.authority([doc.get("tid") for doc in docs], percentiles=True)
+        if not percentile.any():
+            return list(docs)
+        relevance = 1.0 - np.arange(len(docs)) / len(docs)
+        combined = (1 - weight) * relevance + weight * percentile
+        order = np.argsort(-combined, kind="stable")
+        with self._stats_lock:
+            self.reranked += 1
+        return [dict(docs[i], authority=round(float(authority[i]), 6)) for i in order]
+
+    # Most-cited precedents in the graph, highest authority first
+    def top(self, k=10):
+        node_ids, indptr, indices, scores, _ = self.snapshot()
+        best = np.argsort(-scores)[:k]
+        cited_by = np.bincount(indices, minlength=len(node_ids))
+        return [{"tid": str(node_ids[i]), "authority": float(scores[i]), "cited_by": int(cited_by[i])} for i in best]
+
+    def stats(self):
+        node_ids, indptr = self._snapshot[:2] if self._snapshot is not None else (np.zeros(0), np.zeros(1))
+        return {
+            "nodes": len(node_ids),
+            "edges": int(indptr[-1]),
+            "pending_judgments": self._pending,
+            "updates": self.updates,
+            "last_iterations": self.last_iterations,
+            "last_update_ms": round(self.last_update_ms, 2),
+            "reranked": self.reranked,
+        }
+
+
+# Shared graph, updated after the entity index has indexed each batch of new judgments
+citation_graph = CitationGraph()
+judgment_store.add_listener(citation_graph.add_judgments)
+atexit.register(citation_graph.flush)
+
+
+# Helper function to pick the top-k search results, the most authoritative precedents first
+def top_docs_by_authority(search_data, top_k, pool=CITATION_RERANK_POOL):
+    candidates = kanoon_client.top_docs(search_data, max(pool, top_k) if CITATION_RERANK else top_k)
+    if not CITATION_RERANK:
+        return candidates
+    try:
+        return citation_graph.rerank(candidates)[:top_k]
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logging.warning(f"Citation re-ranking failed, keeping search order: {e}")
+        return candidates[:top_k]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        started = time.perf_counter()
+        nodes = citation_graph.rebuild()
+        print(f"Built citation graph with {nodes} nodes in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(json.dumps(citation_graph.stats(), indent=2))
+    elif len(sys.argv) > 1 and sys.argv[1] == "top":
+        print(json.dumps(citation_graph.top(int(sys.argv[2]) if len(sys.argv) > 2 else 10), indent=2))
+    else:
+        print("Usage: python citation_graph.py build | top [k]")
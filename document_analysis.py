@@ -0,0 +1,244 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import llm
+import prompt_builder
+from kanoon_cache import TTLCache
+
+# Documents whose text fits in this many tokens are analysed directly; longer ones are condensed
+# section by section (map) and the notes are analysed instead (reduce)
+ANALYSIS_DIRECT_TOKENS = int(os.getenv("ANALYSIS_DIRECT_TOKENS", 1500))
+# Size of each section sent to a map call, and bounds on the notes each call may write
+ANALYSIS_SECTION_TOKENS = int(os.getenv("ANALYSIS_SECTION_TOKENS", 2000))
+ANALYSIS_MIN_NOTE_TOKENS = int(os.getenv("ANALYSIS_MIN_NOTE_TOKENS", 120))
+ANALYSIS_MAX_NOTE_TOKENS = int(os.getenv("ANALYSIS_MAX_NOTE_TOKENS", 400))
+# Map calls in flight at once, and how many times notes may be condensed again before giving up
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 4))
+ANALYSIS_MAX_LEVELS = 3
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 60 * 60))
+
+MAP_SYSTEM_PROMPT = (
+    "You are a legal assistant preparing notes on one part of a longer Indian legal document. "
+    "Another step will analyse the notes from every part together, so record facts rather than advice."
+)
+
+MAP_TEMPLATE = """
+    Take notes on the part of a document below. Record, in the language of the text:
+    - parties, judges, courts, police stations and dates
+    - allegations, charges, and the sections and Acts invoked
+    - evidence, witness statements and arguments
+    - orders, findings or decisions
+    Skip boilerplate. Keep the notes short.
+
+    Text (part {position}):
+    {section}
+"""
+
+# Condensed notes (keyed by document hash) and final analyses (keyed by prompt hash)
+analysis_cache = TTLCache("analysis", ttl=ANALYSIS_CACHE_TTL)
+
+
+# Helper function to build a cache key from the text that determines a cached value
+def content_key(kind, *parts):
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"{kind}|{llm.MODEL_ID}|{digest}"
+
+
+# Helper function to split text into sections of at most `max_tokens`, breaking between paragraphs
+# where possible and cutting overlong paragraphs at word boundaries
+def split_sections(text, max_tokens=ANALYSIS_SECTION_TOKENS):
+    sections = []
+    current = []
+    current_tokens = 0
+    for paragraph in prompt_builder.compact_whitespace(text).split("\n"):
+        tokens = prompt_builder.count_tokens(paragraph)
+        if current and current_tokens + tokens > max_tokens:
+            sections.append("\n".join(current))
+            current, current_tokens = [], 0
+        while tokens > max_tokens:
+            head = prompt_builder.truncate_to_tokens(paragraph, max_tokens)
+            sections.append(head)
+            paragraph = paragraph[len(head):].lstrip()
+            tokens = prompt_builder.count_tokens(paragraph)
+        if paragraph:
+            current.append(paragraph)
+            current_tokens += tokens
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+# Helper function to size each section's notes so that all of them together fit the direct budget
+def note_tokens(section_count):
+    share = ANALYSIS_DIRECT_TOKENS // max(1, section_count)
+    return max(ANALYSIS_MIN_NOTE_TOKENS, min(ANALYSIS_MAX_NOTE_TOKENS, share))
+
+
+# Helper function to build the map-call messages for one section
+def build_map_messages(section, number, total, max_tokens):
+    messages, _ = prompt_builder.pack_messages(
+        MAP_SYSTEM_PROMPT,
+        MAP_TEMPLATE,
+        {"position": f"{number} of {total}", "section": section},
+        max_new_tokens=max_tokens,
+    )
+    return messages
+
+
+# Helper function to join section notes under numbered headings
+def join_notes(notes):
+    return "\n\n".join(f"[Part {number} of {len(notes)}]\n{note}" for number, note in enumerate(notes, start=1))
+
+
+# Helper function to stand in for a failed map call with the opening of the section itself
+def fallback_note(section, max_tokens, error):
+    logging.warning(f"Section summary failed, using the section text instead: {error}")
+    return prompt_builder.truncate_to_tokens(section, max_tokens)
+
+
+# Condense a document for analysis, yielding progress events as each section is summarised.
+# Short documents pass through unchanged. Otherwise the sections are summarised concurrently
+# (at most `max_workers` LLM calls in flight) and, if the joined notes are still too long, the
+# notes are condensed again. The last event carries the text to analyse under "text".
+def condense_events(client, document_text, max_workers=ANALYSIS_WORKERS):
+    key = content_key("notes", document_text)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        yield {"status": "condensed", "cached": True, "text": cached}
+        return
+
+    text = document_text
+    level = 0
+    while prompt_builder.count_tokens(text) > ANALYSIS_DIRECT_TOKENS and level < ANALYSIS_MAX_LEVELS:
+        level += 1
+        sections = split_sections(text)
+        max_tokens = note_tokens(len(sections))
+        notes = [None] * len(sections)
+        yield {"status": "summarizing", "level": level, "done": 0, "total": len(sections)}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(sections))) as executor:
+            futures = {
+                executor.submit(
+                    llm.generate, client, build_map_messages(section, number, len(sections), max_tokens), max_tokens
+                ): number - 1
+                for number, section in enumerate(sections, start=1)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                try:
+                    notes[index] = future.result().strip()
+                except Exception as e:
+                    notes[index] = fallback_note(sections[index], max_tokens, e)
+                yield {"status": "summarizing", "level": level, "done": done, "total": len(sections)}
+        text = join_notes(notes)
+
+    if level:
+        analysis_cache.set(key, text)
+    yield {"status": "condensed", "cached": False, "text": text}
+
+
+# Helper function to condense a document, reporting progress through `progress(event)`
+def condense_document(client, document_text, progress=None, max_workers=ANALYSIS_WORKERS):
+    for event in condense_events(client, document_text, max_workers):
+        if "text" in event:
+            return event["text"]
+        if progress is not None:
+            progress(event)
+
+
+# Async variant of condense_events() for the ASGI app, bounding map calls with a semaphore
+async def acondense_events(client, document_text, max_workers=ANALYSIS_WORKERS):
+    key = content_key("notes", document_text)
+    cached = await asyncio.to_thread(analysis_cache.get, key)
+    if cached is not None:
+        yield {"status": "condensed", "cached": True, "text": cached}
+        return
+
+    semaphore = asyncio.Semaphore(max_workers)
+    text = document_text
+    level = 0
+    while await asyncio.to_thread(prompt_builder.count_tokens, text) > ANALYSIS_DIRECT_TOKENS and level < ANALYSIS_MAX_LEVELS:
+        level += 1
+        sections = await asyncio.to_thread(split_sections, text)
+        max_tokens = note_tokens(len(sections))
+        notes = [None] * len(sections)
+
+        async def summarize(index):
+            messages = build_map_messages(sections[index], index + 1, len(sections), max_tokens)
+            async with semaphore:
+                try:
+                    notes[index] = (await llm.agenerate(client, messages, max_tokens)).strip()
+                except Exception as e:
+                    notes[index] = fallback_note(sections[index], max_tokens, e)
+
+        yield {"status": "summarizing", "level": level, "done": 0, "total": len(sections)}
+        for done, task in enumerate(asyncio.as_completed([summarize(i) for i in range(len(sections))]), start=1):
+            await task
+            yield {"status": "summarizing", "level": level, "done": done, "total": len(sections)}
+        text = join_notes(notes)
+
+    if level:
+        await asyncio.to_thread(analysis_cache.set, key, text)
+    yield {"status": "condensed", "cached": False, "text": text}
+
+
+# Helper function to build the cache key of a final (reduce) analysis
+def result_key(messages, max_tokens):
+    return content_key("result", json.dumps(messages, ensure_ascii=False, sort_keys=True), str(max_tokens))
+
+
+# Run the reduce call, serving a repeated analysis of the same document and context from the cache
+def generate_analysis(client, messages, max_tokens):
+    key = result_key(messages, max_tokens)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        return cached
+    analysis = llm.generate(client, messages, max_tokens=max_tokens)
+    analysis_cache.set(key, analysis)
+    return analysis
+
+
+# Streaming variant of generate_analysis(): a cached analysis is yielded in one piece
+def stream_analysis(client, messages, max_tokens):
+    key = result_key(messages, max_tokens)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    for token in llm.stream_tokens(client, messages, max_tokens=max_tokens):
+        tokens.append(token)
+        yield token
+    analysis_cache.set(key, "".join(tokens))
+
+
+# Async variant of generate_analysis() for the ASGI app
+async def agenerate_analysis(client, messages, max_tokens):
+    key = result_key(messages, max_tokens)
+    cached = await asyncio.to_thread(analysis_cache.get, key)
+    if cached is not None:
+        return cached
+    analysis = await llm.agenerate(client, messages, max_tokens=max_tokens)
+    await asyncio.to_thread(analysis_cache.set, key, analysis)
+    return analysis
+
+
+# Async variant of stream_analysis() for the ASGI app
+async def astream_analysis(client, messages, max_tokens):
+    key = result_key(messages, max_tokens)
+    cached = await asyncio.to_thread(analysis_cache.get, key)
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    async for token in llm.astream_tokens(client, messages, max_tokens=max_tokens):
+        tokens.append(token)
+        yield token
+    await asyncio.to_thread(analysis_cache.set, key, "".join(tokens))
+
+
+# Helper function to report analysis cache metrics
+def cache_stats():
+    return analysis_cache.stats()
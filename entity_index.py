@@ -0,0 +1,529 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import sqlite3
+import threading
+from judgment_store import judgment_store
+import judgment_parser
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# SQLite inverted index from citations, statutes, judges and courts to the judgments that mention them
+entity_index_path = os.path.abspath(
+    os.getenv("ENTITY_INDEX_DB", os.path.join("output_files", "index", "entities.sqlite3"))
+)
+# Bump when extraction changes, so `python entity_index.py build` re-extracts every judgment
+EXTRACTOR_VERSION = 2
+
+# Statutes cited by short or alternative names, mapped to one canonical name
+KNOWN_ACTS = {
+    "Code of Civil Procedure, 1908": ["code of civil procedure", "civil procedure code", "c.p.c", "c.p.c.", "cpc"],
+    "Code of Criminal Procedure, 1973": [
+        "code of criminal procedure", "criminal procedure code", "cr.p.c", "cr.p.c.", "crpc", "cr. p.c.",
+    ],
+    "Indian Penal Code, 1860": ["indian penal code", "penal code", "i.p.c", "i.p.c.", "ipc"],
+    "Constitution of India": ["constitution of india", "constitution"],
+    "Indian Evidence Act, 1872": ["indian evidence act", "evidence act"],
+    "Specific Relief Act, 1963": ["specific relief act"],
+    "Limitation Act, 1963": ["limitation act"],
+    "Transfer of Property Act, 1882": ["transfer of property act", "t.p. act"],
+    "Indian Contract Act, 1872": ["indian contract act", "contract act"],
+    "Negotiable Instruments Act, 1881": ["negotiable instruments act", "n.i. act"],
+    "Hindu Marriage Act, 1955": ["hindu marriage act"],
+    "Hindu Succession Act, 1956": ["hindu succession act"],
+    "Indian Succession Act, 1925": ["indian succession act"],
+    "Arbitration and Conciliation Act, 1996": ["arbitration and conciliation act"],
+    "Income-tax Act, 1961": ["income tax act", "income-tax act"],
+    "Motor Vehicles Act, 1988": ["motor vehicles act"],
+    "Industrial Disputes Act, 1947": ["industrial disputes act"],
+    "General Clauses Act, 1897": ["general clauses act"],
+    "Registration Act, 1908": ["registration act"],
+    "Dowry Prohibition Act, 1961": ["dowry prohibition act"],
+    "Information Technology Act, 2000": ["information technology act"],
+    "Right to Information Act, 2005": ["right to information act", "rti act"],
+    "Prevention of Corruption Act, 1988": ["prevention of corruption act"],
+    "Narcotic Drugs and Psychotropic Substances Act, 1985": [
+        "narcotic drugs and psychotropic substances act", "ndps act", "n.d.p.s. act",
+    ],
+    "Protection of Women from Domestic Violence Act, 2005": ["protection of women from domestic violence act"],
+    "Protection of Children from Sexual Offences Act, 2012": ["protection of children from sexual offences act", "pocso act"],
+    "Scheduled Castes and Scheduled Tribes (Prevention of Atrocities) Act, 1989": [
+        "scheduled castes and scheduled tribes (prevention of atrocities) act", "sc/st act",
+    ],
+    "Bharatiya Nyaya Sanhita, 2023": ["bharatiya nyaya sanhita", "bns"],
+    "Bharatiya Nagarik Suraksha Sanhita, 2023": ["bharatiya nagarik suraksha sanhita", "bnss"],
+    "Bharatiya Sakshya Adhiniyam, 2023": ["bharatiya sakshya adhiniyam"],
+}
+_act_aliases = {alias: act for act, aliases in KNOWN_ACTS.items() for alias in aliases}
+
+# Law reports cited under several spellings, so "AIR 1987 GAUHATI 73" and "AIR 1987 Gau 73" share a key
+REPORTER_ALIASES = {
+    "GAUHATI": "GAU", "CALCUTTA": "CAL", "ALLAHABAD": "ALL", "ORISSA": "ORI", "DELHI": "DEL", "BOMBAY": "BOM",
+    "MADRAS": "MAD", "PATNA": "PAT", "KERALA": "KER", "KARNATAKA": "KANT", "KAR": "KANT", "PUNJAB": "PUNJ",
+    "RAJASTHAN": "RAJ", "ANDHRA": "AP", "GUJARAT": "GUJ", "ORIS": "ORI", "CIVLJ": "CIV LJ", "CRILJ": "CRI LJ",
+}
+
+# Reported citations: AIR 1987 Gau 73, (1987) 2 GAU LR 109, [1962] 3 SCR 456, 2003 (2) SCC 45
+_citation_re = re.compile(
+    r"\bA\.?\s?I\.?\s?R\.?\s*\d{4}\s+[A-Z][A-Za-z\.&]*\s*\d+"
+    r"|[\(\[]\d{4}[\)\]]\s*(?:\d+\s+)?[A-Z][A-Za-z\.&]*(?:\s+[A-Z][A-Za-z\.&]*){0,3}\s+\d+"
+    r"|\b\d{4}\s*\(\d+\)\s*[A-Z][A-Za-z\.&]*(?:\s+[A-Z][A-Za-z\.&]*){0,2}\s+\d+"
+)
+_citation_token_re = re.compile(r"[A-Z]+|\d+")
+# Statutes named in full: "Specific Relief Act, 1963", "Hindu Adoptions and Maintenance Act 1956"
+_act_re = re.compile(r"\b((?:[A-Z][A-Za-z\-]+\s+(?:(?:and|of|for|the)\s+)?){1,7}Act),?\s*(\d{4})\b")
+# Section and Article references, possibly several at once: "Sections 10 and 151", "S. 28(3)", "u/s 302"
+_section_re = re.compile(
+    r"\b(sections?|secs?\.|s\.|u/s\.?|articles?|arts?\.)\s*"
+    r"(\d+[a-z]?(?:\(\w{1,4}\))*(?:\s*(?:,|and|&|/|or)\s*\d+[a-z]?(?:\(\w{1,4}\))*)*)",
+    re.IGNORECASE,
+)
+_section_number_re = re.compile(r"\d+[a-z]?(?:\(\w{1,4}\))*", re.IGNORECASE)
+# What may sit between a section reference and the statute it belongs to: "Section 10 of the C.P.C.",
+# "Section 151, C.P.C." or "Section 302 IPC"
+_section_gap_re = re.compile(r"^\s*(?:\(\w{1,4}\)\s*)*,?\s*(?:(?:of|under)\s+)?(?:the\s+)?$", re.IGNORECASE)
+_link_re = re.compile(r"""<a\s[^>]*href=["']/doc/(\d+)/?["'][^>]*>(.*?)</a>""", re.DOTALL | re.IGNORECASE)
+_link_tag_re = re.compile(r"<[^>]+>")
+# Link texts naming a statute rather than a judgment: "Section 151", "151", "of C.P.C", "Rent Act"
+_statute_word_re = re.compile(
+    r"\b(?:act|code|constitution|rules?|regulations?|ordinance|order\s+[ivxlc]+|schedule)\b", re.IGNORECASE
+)
+_party_re = re.compile(r"\bv(?:s)?\.?\s", re.IGNORECASE)
+_bench_link_re = re.compile(r"""benchid:([a-z0-9\-]+)""")
+_judge_title_re = re.compile(r"\b(?:hon'?ble|honourable|mr|mrs|ms|dr|chief justice|justice)\b\.?", re.IGNORECASE)
+_judge_suffix_re = re.compile(r"[,\s]+(?:c\.?\s?j|j)\.?\s*$", re.IGNORECASE)
+_key_token_re = re.compile(r"[a-z0-9]+")
+
+# Queries answered from the index: "cases citing AIR 1987 GAUHATI 73", "judgments by K.N. Saikia",
+# "judgments under Section 10 of CPC", or Kanoon-style field syntax such as "bench: K.N. Saikia"
+_query_patterns = [
+    ("citing", re.compile(r"^(?:(?:cases|judgments|decisions)\s+)?(?:citing|that cite|which cite|cites:?)\s+(.+)$", re.I)),
+    ("citation", re.compile(r"^citation:\s*(.+)$", re.I)),
+    ("judge", re.compile(
+        r"^(?:(?:cases|judgments|decisions|orders)\s+(?:by|of|authored by|delivered by|before)|bench:|judge:|author:)"
+        r"\s+(?:(?:hon'?ble\s+)?(?:mr\.?\s+|mrs\.?\s+|ms\.?\s+)?justice\s+)?(.+)$", re.I,
+    )),
+    ("section", re.compile(
+        r"^(?:(?:cases|judgments|decisions)\s+(?:under|on|interpreting)\s+)?"
+        r"((?:sections?|s\.|articles?)\s+\d.*)$", re.I,
+    )),
+    ("act", re.compile(r"^(?:(?:cases|judgments|decisions)\s+(?:under|on|interpreting)|act:)\s+(?:the\s+)?(.+)$", re.I)),
+    ("court", re.compile(r"^(?:(?:cases|judgments|decisions)\s+(?:from|of|in)|court:)\s+(?:the\s+)?(.+)$", re.I)),
+]
+
+
+# Helper function to normalize a citation into its lookup key: reporter spelling, spacing and dots ignored
+def citation_key(citation):
+    tokens = _citation_token_re.findall(citation.upper().replace(".", ""))
+    return " ".join(REPORTER_ALIASES.get(token, token) for token in tokens)
+
+
+# Helper function to normalize a statute name into its lookup key
+def act_key(name):
+    canonical = canonical_act(name)
+    return " ".join(_key_token_re.findall(canonical.lower()))
+
+
+# Helper function to map a statute name or abbreviation onto its canonical name
+def canonical_act(name):
+    name = re.sub(r"\s+", " ", name).strip()
+    lowered = re.sub(r"^the\s+", "", name.lower()).rstrip(" ,")
+    if lowered in _act_aliases:
+        return _act_aliases[lowered]
+    without_year = re.sub(r",?\s*\d{4}$", "", lowered)
+    if without_year in _act_aliases:
+        return _act_aliases[without_year]
+    return re.sub(r"^the\s+", "", name, flags=re.IGNORECASE).rstrip(" ,")
+
+
+# Helper function to normalize a judge's name into the same slug Kanoon uses for benchid links
+def judge_key(name):
+    return "-".join(_key_token_re.findall(_judge_title_re.sub(" ", _judge_suffix_re.sub("", name.lower()))))
+
+
+# Helper function to normalize a court name into its lookup key
+def court_key(name):
+    return " ".join(_key_token_re.findall(name.lower()))
+
+
+# Finds known statute names and abbreviations in lowercased text. One Aho-Corasick automaton when
+# pyahocorasick is installed, otherwise a single precompiled alternation; longest match wins either way.
+class ActMatcher:
+    def __init__(self, aliases=_act_aliases):
+        self.aliases = aliases
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for alias in aliases:
+                self._automaton.add_word(alias, alias)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._pattern = re.compile(
+                r"(?<!\w)(?:" + "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True)) + r")(?!\w)"
+            )
+
+    # Yield (start, end, canonical act) for every non-overlapping match
+    def finditer(self, lowered):
+        if self._automaton is None:
+            for match in self._pattern.finditer(lowered):
+                yield match.start(), match.end(), self.aliases[match.group(0)]
+            return
+        matches = []
+        for end, alias in self._automaton.iter(lowered):
+            start = end - len(alias) + 1
+            if (start > 0 and lowered[start - 1].isalnum()) or (end + 1 < len(lowered) and lowered[end + 1].isalnum()):
+                continue
+            matches.append((start, end + 1, alias))
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        position = 0
+        for start, end, alias in matches:
+            if start >= position:
+                position = end
+                yield start, end, self.aliases[alias]
+
+
+act_matcher = ActMatcher()
+
+
+# Helper function to tell Kanoon's links to bare-act pages ("Section 151", "of C.P.C") from links to judgments
+def is_statute_link(text):
+    text = " ".join(judgment_parser.clean_text(_link_tag_re.sub(" ", text)).split())
+    if not text or _citation_re.search(text) or _party_re.search(text):
+        return False
+    return bool(
+        _section_number_re.fullmatch(text) or _section_re.search(text) or _statute_word_re.search(text) or next(act_matcher.finditer(text.lower()), None)
+    )
+
+
+# Helper function to read a whole "Section 10 of the CPC" / "Article 226" reference into (number, act).
+# Returns None when anything besides the reference and its statute is left, so free-text questions
+# that merely mention a section are not treated as section lookups.
+def parse_section_reference(text):
+    match = _section_re.match(text.strip())
+    if match is None:
+        return None
+    number = _section_number_re.findall(match.group(2))[0]
+    rest = text.strip()[match.end():]
+    act = ""
+    if rest.strip(" .,?"):
+        lowered = rest.lower().rstrip(" .?")
+        known = next(act_matcher.finditer(lowered), None)
+        named = _act_re.search(rest)
+        if known is not None and known[1] == len(lowered) and _section_gap_re.match(lowered[:known[0]]):
+            act = known[2]
+        elif named is not None and not rest[named.end():].strip(" .?") and _section_gap_re.match(rest[:named.start()]):
+            act = canonical_act(f"{named.group(1)}, {named.group(2)}")
+        else:
+            return None
+    if not act and match.group(1).lower().startswith("art"):
+        act = "Constitution of India"
+    return number, act
+
+
+# Helper function to add one mention to an entities dict of {(field, key): [label, mentions]}
+def _add(entities, field, key, label):
+    if not key:
+        return
+    entry = entities.get((field, key))
+    if entry is None:
+        entities[(field, key)] = [label, 1]
+    else:
+        entry[1] += 1
+
+
+# Extract citations, statutes and sections, judges, court and linked judgments from a /doc/ payload
+def extract_entities(payload, cache=True):
+    parsed = judgment_parser.parse_payload(payload, cache)
+    entities = {}
+    own_citations = set()
+    for citation in parsed["citations"]:
+        for match in _citation_re.finditer(citation):
+            key = citation_key(match.group(0))
+            own_citations.add(key)
+            _add(entities, "citation", key, " ".join(match.group(0).split()))
+
+    for name in parsed["bench"] + ([parsed["author"]] if parsed["author"] else []):
+        _add(entities, "judge", judge_key(name), name)
+    document_html = payload.get("doc") or ""
+    for slug in _bench_link_re.findall(document_html):
+        if ("judge", slug) not in entities:
+            _add(entities, "judge", slug, slug.replace("-", " ").title())
+    if parsed.get("court"):
+        _add(entities, "court", court_key(parsed["court"]), parsed["court"])
+    # Only links to other judgments; links to statute sections are not citations of precedent
+    for linked, link_text in _link_re.findall(document_html):
+        if linked != str(parsed.get("tid")) and ("link", linked) not in entities and not is_statute_link(link_text):
+            _add(entities, "link", linked, linked)
+
+    text = judgment_parser.judgment_text(parsed, header=False)
+    for match in _citation_re.finditer(text):
+        key = citation_key(match.group(0))
+        if key not in own_citations:
+            _add(entities, "cites", key, " ".join(match.group(0).split()))
+
+    lowered = text.lower()
+    acts = list(act_matcher.finditer(lowered))
+    known_starts = [start for start, _, _ in acts]
+    for match in _act_re.finditer(text):
+        # Statutes the matcher already found are not counted twice
+        if any(match.start() <= start < match.end() for start in known_starts):
+            continue
+        acts.append((match.start(), match.end(), canonical_act(f"{match.group(1)}, {match.group(2)}")))
+    acts.sort()
+    for _, _, act in acts:
+        _add(entities, "act", act_key(act), act)
+
+    # A section belongs to the statute named right after it; bare Articles belong to the Constitution
+    starts = [start for start, _, _ in acts]
+    for match in _section_re.finditer(text):
+        act = ""
+        position = next((i for i, start in enumerate(starts) if start >= match.end()), None)
+        if position is not None and _section_gap_re.match(text[match.end():starts[position]]):
+            act = acts[position][2]
+        elif match.group(1).lower().startswith("art"):
+            act = "Constitution of India"
+        kind = "Article" if match.group(1).lower().startswith("art") else "Section"
+        for number in _section_number_re.findall(match.group(2)):
+            number = number.upper()
+            label = f"{kind} {number}" + (f", {act}" if act else "")
+            _add(entities, "section", f"{act_key(act) if act else ''}|{number}", label)
+            # Sub-sections are also indexed under their section: 28(3) -> 28
+            base = number.split("(")[0]
+            if base != number:
+                _add(entities, "section", f"{act_key(act) if act else ''}|{base}", f"{kind} {base}" + (f", {act}" if act else ""))
+    return entities
+
+
+# Inverted index over extracted entities, kept in SQLite so it is updated judgment by judgment as
+# they are fetched (via the judgment store's writer thread) and looked up with one indexed query
+class EntityIndex:
+    def __init__(self, db_path=entity_index_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+        self.indexed = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._connection().executescript(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "field TEXT NOT NULL, key TEXT NOT NULL, tid TEXT NOT NULL, label TEXT, mentions INTEGER NOT NULL, "
+            "PRIMARY KEY (field, key, tid)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_tid ON postings (tid);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "tid TEXT PRIMARY KEY, title TEXT, court TEXT, publishdate TEXT, version INTEGER NOT NULL, snippet TEXT);"
+        )
+        try:
+            self._connection().execute("ALTER TABLE documents ADD COLUMN snippet TEXT")
+        except sqlite3.OperationalError:
+            pass
+
+    # One connection per thread; WAL lets lookups run while judgments are being indexed
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Extract and (re)index a batch of /doc/ payloads in one transaction
+    def index_judgments(self, payloads, cache=True):
+        rows = []
+        for payload in payloads:
+            if payload.get("tid") is None:
+                continue
+            tid = str(payload["tid"])
+            entities = extract_entities(payload, cache)
+            snippet = " ".join(judgment_parser.judgment_text(judgment_parser.parse_payload(payload, cache), header=False).split()[:60])
+            document = (
+                tid, payload.get("title", ""), payload.get("docsource", ""), payload.get("publishdate", ""), snippet,
+            )
+            rows.append((tid, document, [(field, key, tid, label, mentions) for (field, key), (label, mentions) in entities.items()]))
+        connection = self._connection()
+        with connection:
+            for tid, document, postings in rows:
+                connection.execute("DELETE FROM postings WHERE tid = ?", (tid,))
+                connection.executemany(
+                    "INSERT INTO postings (field, key, tid, label, mentions) VALUES (?, ?, ?, ?, ?)", postings
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO documents (tid, title, court, publishdate, snippet, version) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (*document, EXTRACTOR_VERSION),
+                )
+        with self._lock:
+            self.indexed += len(rows)
+        return len(rows)
+
+    # Tids posted under one entity key, most mentions first
+    def lookup(self, field, key):
+        return [tid for tid, in self._connection().execute(
+            "SELECT tid FROM postings WHERE field = ? AND key = ? ORDER BY mentions DESC", (field, key)
+        )]
+
+    # Judgments reported under a citation
+    def by_citation(self, citation):
+        return self.lookup("citation", citation_key(citation))
+
+    # Judgments citing a judgment, by its reported citation or its tid: the citation in the text, or a link to it
+    def citing(self, citation_or_tid):
+        value = str(citation_or_tid).strip()
+        targets = [value] if value.isdigit() else self.by_citation(value)
+        tids = [] if value.isdigit() else self.lookup("cites", citation_key(value))
+        for target in targets:
+            tids.extend(self.lookup("link", target))
+        return [tid for tid in dict.fromkeys(tids) if tid not in targets]
+
+    # Judgments where a judge sat on the bench; a surname alone matches every judge with that surname
+    def by_judge(self, name):
+        key = judge_key(name)
+        tids = self.lookup("judge", key)
+        if not tids and "-" not in key:
+            tids = [tid for tid, in self._connection().execute(
+                "SELECT tid FROM postings WHERE field = 'judge' AND key LIKE ? ORDER BY mentions DESC", (f"%-{key}",)
+            )]
+        return list(dict.fromkeys(tids))
+
+    def by_act(self, name):
+        return self.lookup("act", act_key(name))
+
+    # Judgments referring to a section or Article, e.g. by_section("10", "CPC") or by_section("Section 10 of CPC")
+    def by_section(self, section, act=""):
+        if not act:
+            parsed = parse_section_reference(section)
+            if parsed is None:
+                return []
+            section, act = parsed
+        if act:
+            return self.lookup("section", f"{act_key(act)}|{section.upper()}")
+        # Without a statute, the section under any statute (or none named)
+        return list(dict.fromkeys(tid for tid, in self._connection().execute(
+            "SELECT tid FROM postings WHERE field = 'section' AND key LIKE ? ORDER BY mentions DESC",
+            (f"%|{section.upper()}",),
+        )))
+
+    def by_court(self, court):
+        return self.lookup("court", court_key(court))
+
+    # Every entity extracted from one judgment, grouped by field
+    def entities(self, tid):
+        grouped = {}
+        for field, label, mentions in self._connection().execute(
+            "SELECT field, label, mentions FROM postings WHERE tid = ? ORDER BY field, mentions DESC", (str(tid),)
+        ):
+            grouped.setdefault(field, []).append({"label": label, "mentions": mentions})
+        return grouped
+
+    # Helper function to attach title, court and date to tids, keeping their order
+    def _documents(self, tids, limit):
+        tids = tids[:limit]
+        if not tids:
+            return []
+        rows = self._connection().execute(
+            f"SELECT tid, title, court, publishdate, snippet FROM documents WHERE tid IN ({','.join('?' * len(tids))})",
+            tids,
+        ).fetchall()
+        documents = {
+            tid: {"tid": tid, "title": title, "docsource": court, "publishdate": publishdate, "snippet": snippet or ""}
+            for tid, title, court, publishdate, snippet in rows
+        }
+        return [documents[tid] for tid in tids if tid in documents]
+
+    # Answer a structured query ("cases citing ...", "judgments by ...") locally; returns a response shaped
+    # like a Kanoon /search/ response, or None when the query is not one the index can answer
+    def search(self, query, limit=10):
+        query = " ".join(query.split())
+        response = None
+        started = time.perf_counter()
+        # "judgments of X" may name a judge or a court, so the next matching form is tried when one finds nothing
+        for kind, pattern in _query_patterns:
+            match = pattern.match(query)
+            if match is None:
+                continue
+            value = match.group(1).strip(" \"'?.")
+            if kind == "citing":
+                tids = self.citing(value)
+            elif kind == "citation":
+                tids = self.by_citation(value)
+            elif kind == "judge":
+                tids = self.by_judge(value)
+            elif kind == "section":
+                # Only a whole section reference; "section 10 of the CPC stay of suit" goes to Kanoon search
+                if parse_section_reference(value) is None:
+                    continue
+                tids = self.by_section(value)
+            elif kind == "act":
+                tids = self.by_act(value)
+            else:
+                tids = self.by_court(value)
+            if response is None or tids:
+                response = {"source": "entities", "query_type": kind, "found": len(tids), "docs": self._documents(tids, limit)}
+            if tids:
+                break
+        if response is not None:
+            with self._lock:
+                self.lookups += 1
+                self.lookup_seconds += time.perf_counter() - started
+        return response
+
+    def stats(self):
+        connection = self._connection()
+        with self._lock:
+            lookups, lookup_seconds, indexed = self.lookups, self.lookup_seconds, self.indexed
+        return {
+            "documents": connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            "postings": connection.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+            "indexed_by_this_process": indexed,
+            "lookups": lookups,
+            "average_lookup_ms": round(lookup_seconds * 1000 / lookups, 3) if lookups else 0.0,
+            "aho_corasick": ahocorasick is not None,
+        }
+
+
+# Shared index, kept up to date as the judgment store writes new or changed judgments
+entity_index = EntityIndex()
+judgment_store.add_listener(entity_index.index_judgments)
+
+
+# Helper function to answer a structured query from the entity index; None when it cannot
+def entity_search(query, limit=10):
+    try:
+        return entity_index.search(query, limit)
+    except sqlite3.Error as e:
+        logging.warning(f"Entity index lookup failed: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from local_index import iter_cached_documents
+
+        count = 0
+        batch = []
+        for payload in iter_cached_documents():
+            batch.append(payload)
+            if len(batch) == 200:
+                count += entity_index.index_judgments(batch, cache=False)
+                batch = []
+        count += entity_index.index_judgments(batch, cache=False)
+        print(f"Indexed entities of {count} judgments into {entity_index.db_path}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "entities":
+        print(json.dumps(entity_index.entities(sys.argv[2]), indent=2, ensure_ascii=False))
+    elif len(sys.argv) > 2 and sys.argv[1] == "search":
+        started = time.perf_counter()
+        response = entity_search(" ".join(sys.argv[2:]))
+        elapsed = (time.perf_counter() - started) * 1000
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+        print(f"Lookup took {elapsed:.2f} ms")
+    elif len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print(json.dumps(entity_index.stats(), indent=2))
+    else:
+        print("Usage: python entity_index.py build | entities <tid> | search <query> | stats")
@@ -1,14 +1,18 @@
-from googletrans import Translator  # Add a translator for language translation
 import os
 import json
-import requests
-import tempfile
-import PyPDF2
 import docx
 import streamlit as st
 import logging
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+import kanoon_client
+from kanoon_client import KanoonError
+from pdf_text import extract_pdf_text
+from uploads import open_upload, read_upload, iter_decoded
+import llm
+import semantic_cache
+import prompt_builder
+import document_analysis
+import translation
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -20,8 +24,8 @@ load_dotenv()
 hf_api_key = os.getenv("HF_API_KEY")
 indian_kanoon_api_key = os.getenv("INDIAN_KANOON_API_KEY")
 
-# Initialize Hugging Face Inference Client
-client = InferenceClient(api_key=hf_api_key)
+# Initialize the inference client for the configured LLM backend
+client = llm.create_client()
 
 # System prompt for the chatbot
 SYSTEM_PROMPT = (
@@ -37,18 +41,14 @@ def extract_text_from_file(file, filename):
     logging.info("Extracting text from file...")
     try:
         file_extension = filename.rsplit('.', 1)[-1].lower()
+        upload = open_upload(file)
         if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = "".join([page.extract_text() for page in pdf_reader.pages])
+            text = extract_pdf_text(read_upload(upload))
         elif file_extension in ['doc', 'docx']:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-                temp_file.write(file.read())
-                temp_file.close()
-                doc = docx.Document(temp_file.name)
-                text = "\n".join([para.text for para in doc.paragraphs])
-            os.unlink(temp_file.name)
+            doc = docx.Document(upload)
+            text = "\n".join([para.text for para in doc.paragraphs])
         elif file_extension == 'txt':
-            text = file.read().decode('utf-8')
+            text = "".join(iter_decoded(upload))
         else:
             raise ValueError("Unsupported file format")
         logging.info("Text extraction successful.")
@@ -61,27 +61,34 @@ def extract_text_from_file(file, filename):
 def fetch_indian_kanoon_info(query):
     logging.info(f"Fetching Indian Kanoon info for query: {query[:100]}...")
     try:
-        url = "https://api.indiankanoon.org/search/"
-        params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-        response = requests.post(url, params=params, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            relevant_info = [
-                f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
-                for doc in data.get('docs', [])[:1]
-            ]
-            logging.info("Fetched Indian Kanoon data successfully.")
-            return "\n".join(relevant_info)
-        else:
-            logging.warning("Failed to fetch Indian Kanoon data. Non-200 response.")
-            return "Unable to fetch information from Indian Kanoon API."
+        data = kanoon_client.search(query)
+        relevant_info = [
+            f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
+            for doc in kanoon_client.top_docs(data)
+        ]
+        logging.info("Fetched Indian Kanoon data successfully.")
+        return "\n".join(relevant_info)
+    except KanoonError as e:
+        logging.warning(f"Failed to fetch Indian Kanoon data: {e}")
+        return "Unable to fetch information from Indian Kanoon API."
     except Exception as e:
         logging.error(f"Error fetching Indian Kanoon info: {e}")
         return f"Error fetching Indian Kanoon info: {e}"
 
-# Initialize the translator
-translator = Translator()
+# Helper function to summarise a long document section by section, showing progress as sections finish
+def condense_with_progress(document_text):
+    progress_bar = None
+
+    def progress(event):
+        nonlocal progress_bar
+        if progress_bar is None:
+            progress_bar = st.progress(0.0)
+        progress_bar.progress(event["done"] / event["total"], text=f"अनुभाग पढ़ा जा रहा है {event['done']} / {event['total']}")
+
+    document_text = document_analysis.condense_document(client, document_text, progress=progress)
+    if progress_bar is not None:
+        progress_bar.empty()
+    return document_text
 
 def main():
     st.title("KanoonSetu (Hindi Edition)")
@@ -100,52 +107,53 @@ def main():
                 st.error("कृपया एक प्रश्न दर्ज करें।")
             else:
                 try:
-                    # Translate user query from Hindi to English
-                    user_query_english = translator.translate(user_query_hindi, src="hi", dest="en").text
-
-                    # Fetch Indian Kanoon context using translated query
-                    kanoon_context_english = fetch_indian_kanoon_info(user_query_english)
-
-                    # Translate Kanoon context back to Hindi
-                    kanoon_context_hindi = translator.translate(kanoon_context_english, src="en", dest="hi").text
-
-                    # Translate prompt to Hindi
-                    text_query_prompt_hindi = f"""
-                    आप एक कानूनी प्रश्न का उत्तर एक संरचित और व्यवस्थित प्रारूप में देने के लिए जिम्मेदार हैं। निम्नलिखित दिशानिर्देशों का उपयोग करें:
-
-                    उपयोगकर्ता का प्रश्न:
-                    {user_query_hindi}
-
-                    संबंधित भारतीय कानून संदर्भ:
-                    {kanoon_context_hindi}
-
-                    कृपया उत्तर निम्नलिखित प्रारूप में प्रदान करें:
-                    1. **मुख्य बचाव बिंदु**: किसी भी कानूनी आरोपों या चुनौतियों का सामना करने के लिए मुख्य तर्क।
-                    2. **सहायक बिंदु**: प्रासंगिक कानून, साक्ष्य, या नजीरें जो मामले को मजबूत करती हैं।
-                    3. **मामले का अवलोकन**: किसी प्रासंगिक न्यायाधीश, अदालत का नाम, और मामले का विवरण (यदि लागू हो)।
-                    4. **विवाद का कारण**: विवाद या कानूनी मुद्दे का प्राथमिक कारण।
-                    5. **कानूनी नजीरें**: इसी तरह के मामले, उनके निर्णय, और इस मामले से उनकी प्रासंगिकता।
-                    6. **सिफारिशें**: संभावित कानूनी रणनीतियाँ, अगले कदम, या कार्य।
-
-                    सुनिश्चित करें कि उत्तर संक्षिप्त, तथ्यात्मक और क्रियान्वयन योग्य हो।
-                    """
-
-                    # Prepare messages for API call
-                    messages = [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": text_query_prompt_hindi}
-                    ]
-
-                    # Call Hugging Face API
-                    completion = client.chat.completions.create(
-                        model="meta-llama/Llama-3.2-3B-Instruct",
-                        messages=messages,
-                        max_tokens=1500
-                    )
-
-                    response_content_hindi = completion.choices[0].message["content"]
-                    st.success("उत्तर:")
-                    st.markdown(response_content_hindi)  # Display response in Hindi
+                    # Answer near-duplicate questions from the Hindi partition of the semantic cache
+                    cached_response, query_vector = semantic_cache.lookup(user_query_hindi, language="hi")
+                    if cached_response is not None:
+                        st.success("उत्तर:")
+                        st.markdown(cached_response)
+                    else:
+                        # Translate user query from Hindi to English (cached per segment)
+                        user_query_english = translation.translate(user_query_hindi, "hi", "en")
+
+                        # Fetch Indian Kanoon context using translated query
+                        kanoon_context_english = fetch_indian_kanoon_info(user_query_english)
+
+                        # Translate Kanoon context back to Hindi; recurring titles and snippets come from the cache
+                        kanoon_context_hindi = translation.translate(kanoon_context_english, "en", "hi")
+
+                        # Translate prompt to Hindi
+                        text_query_prompt_hindi = """
+                        आप एक कानूनी प्रश्न का उत्तर एक संरचित और व्यवस्थित प्रारूप में देने के लिए जिम्मेदार हैं। निम्नलिखित दिशानिर्देशों का उपयोग करें:
+
+                        कृपया उत्तर निम्नलिखित प्रारूप में प्रदान करें:
+                        1. **मुख्य बचाव बिंदु**: किसी भी कानूनी आरोपों या चुनौतियों का सामना करने के लिए मुख्य तर्क।
+                        2. **सहायक बिंदु**: प्रासंगिक कानून, साक्ष्य, या नजीरें जो मामले को मजबूत करती हैं।
+                        3. **मामले का अवलोकन**: किसी प्रासंगिक न्यायाधीश, अदालत का नाम, और मामले का विवरण (यदि लागू हो)।
+                        4. **विवाद का कारण**: विवाद या कानूनी मुद्दे का प्राथमिक कारण।
+                        5. **कानूनी नजीरें**: इसी तरह के मामले, उनके निर्णय, और इस मामले से उनकी प्रासंगिकता।
+                        6. **सिफारिशें**: संभावित कानूनी रणनीतियाँ, अगले कदम, या कार्य।
+
+                        सुनिश्चित करें कि उत्तर संक्षिप्त, तथ्यात्मक और क्रियान्वयन योग्य हो।
+
+                        उपयोगकर्ता का प्रश्न:
+                        {user_query_hindi}
+
+                        संबंधित भारतीय कानून संदर्भ:
+                        {kanoon_context_hindi}
+                        """
+
+                        # Pack the prompt sections into the model's context window, highest priority first
+                        messages, _ = prompt_builder.pack_messages(
+                            SYSTEM_PROMPT,
+                            text_query_prompt_hindi,
+                            {"user_query_hindi": user_query_hindi, "kanoon_context_hindi": kanoon_context_hindi},
+                        )
+
+                        # Call Hugging Face API and stream the Hindi response as it is generated
+                        st.success("उत्तर:")
+                        response_content_hindi = st.write_stream(llm.stream_tokens(client, messages, max_tokens=1500))
+                        semantic_cache.store(user_query_hindi, response_content_hindi, language="hi", vector=query_vector)
                 except Exception as e:
                     st.error(f"त्रुटि: {e}")
 
@@ -159,24 +167,21 @@ def main():
                 document_text = extract_text_from_file(uploaded_file, filename)
 
                 # Translate document text to English for Indian Kanoon API
-                document_text_english = translator.translate(document_text[:500], src="hi", dest="en").text
+                document_text_english = translation.translate(prompt_builder.lead_excerpt(document_text), "hi", "en")
                 kanoon_info_english = fetch_indian_kanoon_info(document_text_english)
 
                 # Translate Kanoon context to Hindi
-                kanoon_info_hindi = translator.translate(kanoon_info_english, src="en", dest="hi").text
+                kanoon_info_hindi = translation.translate(kanoon_info_english, "en", "hi")
 
                 st.write("भारतीय कानून संदर्भ:", kanoon_info_hindi)
 
+                # Long documents are summarised section by section (map) before the analysis (reduce)
+                document_text = condense_with_progress(document_text)
+
                 # Prepare analysis prompt in Hindi
-                analysis_prompt_hindi = f"""
+                analysis_prompt_hindi = """
                 निम्नलिखित कानूनी दस्तावेज़ का विश्लेषण करें और निम्नलिखित प्रमुख बिंदुओं के आधार पर एक संरचित, विस्तृत सारांश प्रदान करें:
 
-                दस्तावेज़ सामग्री:
-                {document_text[:2000]}
-
-                संबंधित भारतीय कानून जानकारी:
-                {kanoon_info_hindi}
-
                 कृपया उत्तर निम्नलिखित प्रारूप में प्रदान करें:
                 1. **मुख्य बचाव बिंदु**: किसी भी आरोपों या कानूनी चुनौतियों का सामना करने के लिए मुख्य तर्क।
                 2. **सहायक बिंदु**: साक्ष्य, कानून, या नजीरें जो मामले को मजबूत करती हैं।
@@ -186,26 +191,24 @@ def main():
                 6. **सिफारिशें**: संभावित कानूनी रणनीतियाँ या अगले कदम।
 
                 सुनिश्चित करें कि उत्तर संक्षिप्त, तथ्यात्मक और क्रियान्वयन योग्य हो।
+
+                दस्तावेज़ सामग्री:
+                {document_text}
+
+                संबंधित भारतीय कानून जानकारी:
+                {kanoon_info_hindi}
                 """
 
-                # Call Hugging Face API
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": analysis_prompt_hindi}
-                ]
-
-                max_allowed_tokens = 4096 - len(analysis_prompt_hindi.split())
-                max_new_tokens = min(1500, max_allowed_tokens)
-                completion = client.chat.completions.create(
-                    model="meta-llama/Llama-3.2-3B-Instruct",
-                    messages=messages,
-                    max_tokens=max_new_tokens
+                # Pack the prompt sections into the model's context window, highest priority first
+                messages, max_new_tokens = prompt_builder.pack_messages(
+                    SYSTEM_PROMPT,
+                    analysis_prompt_hindi,
+                    {"kanoon_info_hindi": kanoon_info_hindi, "document_text": document_text},
+                    max_new_tokens=1500,
                 )
-
-                analysis_content_hindi = completion.choices[0].message["content"]
-                logging.info("Document analysis completed in Hindi.")
                 st.success("विश्लेषण:")
-                st.markdown(analysis_content_hindi)  # Display response in Hindi
+                st.write_stream(document_analysis.stream_analysis(client, messages, max_new_tokens))
+                logging.info("Document analysis completed in Hindi.")
             except Exception as e:
                 logging.error(f"Error analyzing document: {e}")
                 st.error(f"त्रुटि: {e}")
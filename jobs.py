@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+
+# Queue database, worker threads per process, and the most jobs allowed to wait at once
+jobs_db_path = os.path.abspath(os.getenv("JOBS_DB", os.path.join("output_files", "jobs", "jobs.sqlite3")))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 2))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", 100))
+# A running job whose worker has not finished it within this many seconds is handed out again, up
+# to JOBS_MAX_ATTEMPTS claims in all; after that it is marked failed
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", 30 * 60))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+# Finished jobs (and their results) are deleted after this many seconds
+JOBS_RETENTION_SECONDS = int(os.getenv("JOBS_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1.0))
+JOBS_WEBHOOK_TIMEOUT = float(os.getenv("JOBS_WEBHOOK_TIMEOUT", 10))
+# Comma-separated hosts webhooks may be sent to; ".example.com" also allows its subdomains. Empty
+# (the default) disables webhooks, so a job cannot make the server call arbitrary internal addresses.
+JOBS_WEBHOOK_ALLOWED_HOSTS = [
+    host.strip().lower() for host in os.getenv("JOBS_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+]
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Helper function to check a webhook URL is http(s) and on an allowed host; raises ValueError otherwise
+def validate_webhook(webhook, allowed_hosts=None):
+    allowed_hosts = JOBS_WEBHOOK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    try:
+        parts = urlsplit(webhook)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        raise ValueError("Webhook is not a valid URL")
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError("Webhook must be an http(s) URL")
+    for allowed in allowed_hosts:
+        if host == allowed.lstrip(".") or (allowed.startswith(".") and host.endswith(allowed)):
+            return webhook
+    raise ValueError(f"Webhook host '{host}' is not allowed")
+
+
+# SQLite-backed job queue with a pool of worker threads. Jobs are claimed inside an immediate
+# transaction, so several processes (e.g. gunicorn workers) can share one database safely. Each
+# claim records the worker and counts an attempt; only the worker holding the claim can finish a job.
+class JobQueue:
+    def __init__(self, db_path=jobs_db_path, workers=JOBS_WORKERS, max_queued=JOBS_MAX_QUEUED):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_queued = max_queued
+        self.handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self.completed = 0
+        self.failed = 0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, filename TEXT, payload BLOB, "
+            "webhook TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        for column in ("attempts INTEGER NOT NULL DEFAULT 0", "claimed_by TEXT"):
+            try:
+                connection.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        connection.commit()
+
+    # One connection per thread; WAL lets the pollers read while a worker writes
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    # Register the function that runs jobs of `kind`: handler(payload, filename) -> JSON-serialisable result.
+    # With no handler the kind is only accepted by submit(); its jobs are run by a process that has one.
+    def register(self, kind, handler=None):
+        self.handlers[kind] = handler
+        return self
+
+    # Start the worker threads; called by the app at startup so queued jobs run without waiting for a request
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logging.info(f"Started {self.workers} job workers on {self.db_path}.")
+
+    def submit(self, kind, filename, payload, webhook=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        if webhook:
+            validate_webhook(webhook)
+        job_id = uuid.uuid4().hex
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            queued = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({queued} jobs waiting)")
+            connection.execute(
+                "INSERT INTO jobs (id, kind, status, filename, payload, webhook, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, filename, payload, webhook, time.time()),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+        return job_id
+
+    # Job status as a dict (result decoded, payload omitted), or None for an unknown id
+    def get(self, job_id):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT id, kind, status, filename, result, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == "queued":
+            job["queue_position"] = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (row["created_at"],)
+            ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    # Claim the oldest queued job (or one whose lease expired) for `worker`; returns the row or None.
+    # Expired jobs that have used up their attempts are marked failed instead and returned in `abandoned`.
+    def _claim(self, worker, abandoned):
+        now = time.time()
+        kinds = [kind for kind, handler in self.handlers.items() if handler is not None]
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = connection.execute(
+                    "SELECT id, kind, filename, payload, webhook, attempts FROM jobs "
+                    f"WHERE kind IN ({', '.join('?' * len(kinds))}) "
+                    "AND (status = 'queued' OR (status = 'running' AND started_at < ?)) "
+                    "ORDER BY created_at LIMIT 1",
+                    (*kinds, now - JOBS_LEASE_SECONDS),
+                ).fetchone()
+                if row is None or row["attempts"] < JOBS_MAX_ATTEMPTS:
+                    break
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, claimed_by = NULL, finished_at = ? "
+                    "WHERE id = ?",
+                    (f"Job did not finish after {row['attempts']} attempts", now, row["id"]),
+                )
+                abandoned.append(row)
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, claimed_by = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (now, worker, row["id"]),
+                )
+            connection.execute("COMMIT")
+            return row
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    # Record a job's outcome if `worker` still holds its claim; returns False when the lease was lost
+    # and the job handed to another worker, whose result is the one kept
+    def _finish(self, job_id, worker, result=None, error=None):
+        connection = self._connection()
+        now = time.time()
+        finished = connection.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, finished_at = ? "
+            "WHERE id = ? AND claimed_by = ? AND status = 'running'",
+            ("failed" if error else "done", None if error else json.dumps(result, ensure_ascii=False), error, now,
+             job_id, worker),
+        ).rowcount
+        connection.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - JOBS_RETENTION_SECONDS,)
+        )
+        if not finished:
+            logging.warning(f"Job {job_id} was claimed by another worker after its lease expired; result discarded.")
+        return bool(finished)
+
+    def _notify(self, job_id, webhook):
+        try:
+            # Redirects are not followed, so an allowed host cannot bounce the request elsewhere
+            requests.post(webhook, json=self.get(job_id), timeout=JOBS_WEBHOOK_TIMEOUT, allow_redirects=False)
+        except requests.RequestException as e:
+            logging.warning(f"Webhook for job {job_id} failed: {e}")
+
+    def _work(self):
+        worker = f"{os.getpid()}-{threading.current_thread().name}-{uuid.uuid4().hex[:8]}"
+        while True:
+            abandoned = []
+            try:
+                row = self._claim(worker, abandoned)
+            except sqlite3.Error as e:
+                logging.warning(f"Job queue claim failed: {e}")
+                row = None
+            for job in abandoned:
+                logging.error(f"Job {job['id']} failed after {job['attempts']} attempts.")
+                self.failed += 1
+                if job["webhook"]:
+                    self._notify(job["id"], job["webhook"])
+            if row is None:
+                self._wakeup.wait(JOBS_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            logging.info(f"Running {row['kind']} job {row['id']} ({row['filename']}, attempt {row['attempts'] + 1})...")
+            try:
+                result = self.handlers[row["kind"]](row["payload"], row["filename"])
+                finished = self._finish(row["id"], worker, result=result)
+                self.completed += finished
+            except Exception as e:
+                logging.error(f"Job {row['id']} failed: {e}")
+                finished = self._finish(row["id"], worker, error=str(e))
+                self.failed += finished
+            if finished and row["webhook"]:
+                self._notify(row["id"], row["webhook"])
+
+    # Queue depth and throughput metrics
+    def stats(self):
+        connection = self._connection()
+        counts = dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        oldest = connection.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        recent = connection.execute(
+            "SELECT AVG(finished_at - started_at) FROM jobs WHERE status = 'done' AND finished_at > ?",
+            (time.time() - 60 * 60,),
+        ).fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "max_queued": self.max_queued,
+            "workers": self.workers,
+            "oldest_queued_s": round(time.time() - oldest, 2) if oldest else 0.0,
+            "avg_run_s_last_hour": round(recent, 2) if recent else None,
+            "completed_by_this_process": self.completed,
+            "failed_by_this_process": self.failed,
+        }
+
+
+# Shared queue used by the web apps; handlers are registered by the app that owns the job kind
+job_queue = JobQueue()
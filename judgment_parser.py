@@ -0,0 +1,167 @@
+import re
+import sys
+import html
+import json
+import time
+import hashlib
+from kanoon_cache import TTLCache, KANOON_DOC_TTL
+
+# Bump when the parsed structure changes, so judgments cached by an older parser are parsed again
+PARSER_VERSION = 1
+
+# Parsed judgments keyed by tid and a hash of the judgment body
+parsed_cache = TTLCache("parsed_doc", ttl=KANOON_DOC_TTL)
+
+# One regex walks the whole document: each match is a tag, and the text between matches is content
+_tag_re = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)([^>]*)>|<!--.*?-->", re.DOTALL)
+_class_re = re.compile(r"""class\s*=\s*["']([^"']*)["']""")
+_structure_re = re.compile(r"""data-structure\s*=\s*["']([^"']*)["']""")
+_whitespace_re = re.compile(r"\s+")
+_paragraph_number_re = re.compile(r"^(\d+)\s*\.\s+")
+_issue_re = re.compile(r"\bISSUE NO\.\s*\(\d+\)")
+_section_re = re.compile(r"\bISSUE NO\.\s*\(\d+\)|(?<!\S)\d+\.(?=\s)")
+_label_re = re.compile(r"^(?:Equivalent citations|Bench|Author)\s*:\s*", re.IGNORECASE)
+_list_split_re = re.compile(r"\s*,\s*(?![^()]*\))")
+
+# Elements that start or end a block of judgment text; scripts and styles are skipped
+_BLOCK_TAGS = frozenset({"h1", "h2", "h3", "h4", "p", "blockquote", "pre", "li", "div"})
+_BREAK_TAGS = frozenset({"br", "hr"})
+_SKIP_TAGS = frozenset({"script", "style"})
+
+
+# Helper function to collapse whitespace and decode entities in one block of text
+def clean_text(text):
+    return _whitespace_re.sub(" ", html.unescape(text)).strip()
+
+
+# Helper function to split "Equivalent citations: A, B" / "Bench: X, Y" headers into their items
+def header_items(text):
+    return [item for item in _list_split_re.split(_label_re.sub("", text)) if item]
+
+
+# Tokenize Kanoon /doc/ HTML in one pass into (tag, class, data-structure, text) blocks. Text
+# outside any block element (or plain text without markup) comes out as "p" blocks.
+def iter_blocks(document_html):
+    stack = [("p", "", "")]
+    parts = []
+    skip = 0
+    position = 0
+    for match in _tag_re.finditer(document_html):
+        if not skip:
+            parts.append(document_html[position:match.start()])
+        position = match.end()
+        closing, tag, attributes = match.group(1), (match.group(2) or "").lower(), match.group(3) or ""
+        if tag in _SKIP_TAGS:
+            skip = max(0, skip - 1) if closing else skip + 1
+        elif tag in _BREAK_TAGS:
+            parts.append("\n")
+        elif tag in _BLOCK_TAGS and (not closing or (len(stack) > 1 and stack[-1][0] == tag)):
+            # Every block boundary ends the text collected so far
+            text = clean_text("".join(parts))
+            parts = []
+            if text:
+                yield stack[-1] + (text,)
+            if closing:
+                stack.pop()
+            else:
+                class_match = _class_re.search(attributes)
+                structure_match = _structure_re.search(attributes)
+                stack.append((
+                    tag,
+                    class_match.group(1) if class_match else "",
+                    structure_match.group(1) if structure_match else "",
+                ))
+    if not skip:
+        parts.append(document_html[position:])
+    text = clean_text("".join(parts))
+    if text:
+        yield stack[-1] + (text,)
+
+
+# Parse a Kanoon judgment into title, citations, bench, numbered paragraphs and issues
+def parse_judgment(document_html, title=""):
+    parsed = {"title": title, "citations": [], "bench": [], "author": "", "paragraphs": [], "issues": []}
+    for tag, block_class, structure, text in iter_blocks(document_html or ""):
+        if block_class == "doc_title":
+            parsed["title"] = text
+        elif block_class == "doc_citations":
+            parsed["citations"] = header_items(text)
+        elif block_class == "doc_bench":
+            parsed["bench"] = header_items(text)
+        elif block_class == "doc_author":
+            parsed["author"] = _label_re.sub("", text)
+        else:
+            number_match = _paragraph_number_re.match(text)
+            paragraph = {
+                "number": int(number_match.group(1)) if number_match else None,
+                "structure": structure or ("Quote" if tag == "blockquote" else ""),
+                "text": text,
+            }
+            parsed["paragraphs"].append(paragraph)
+            if structure == "Issue" or _issue_re.search(text):
+                parsed["issues"].append(text)
+    return parsed
+
+
+# Helper function to parse a /doc/ payload, cached per tid and content: a re-fetched judgment whose
+# body changed (an amended judgment, or a stale copy replaced) is parsed again
+def parse_payload(payload, cache=True):
+    tid = payload.get("tid")
+    body = payload.get("doc") or payload.get("content") or ""
+    title = payload.get("title", "")
+    key = None
+    if cache and tid is not None:
+        digest = hashlib.sha256(f"{title}\0{body}".encode("utf-8")).hexdigest()[:16]
+        key = f"{tid}|{PARSER_VERSION}|{digest}"
+        parsed = parsed_cache.get(key)
+        if parsed is not None:
+            return parsed
+    parsed = parse_judgment(body, title)
+    parsed["tid"] = tid
+    parsed["court"] = payload.get("docsource", "")
+    parsed["publishdate"] = payload.get("publishdate", "")
+    if key is not None:
+        parsed_cache.set(key, parsed)
+    return parsed
+
+
+# Helper function to render a parsed judgment as compact text: a short header, then one paragraph per line
+def judgment_text(parsed, header=True):
+    lines = []
+    if header:
+        if parsed.get("citations"):
+            lines.append(f"Citations: {'; '.join(parsed['citations'])}")
+        if parsed.get("bench"):
+            lines.append(f"Bench: {', '.join(parsed['bench'])}")
+    lines.extend(paragraph["text"] for paragraph in parsed["paragraphs"])
+    return "\n".join(lines)
+
+
+# Helper function to get the prompt-ready text of a /doc/ payload
+def payload_text(payload, cache=True):
+    return judgment_text(parse_payload(payload, cache))
+
+
+# Split plain or HTML judgment text into sections at block boundaries, numbered paragraphs and
+# "ISSUE NO.(n)" markers
+def clean_and_structure_text(input_text):
+    sections = []
+    for paragraph in parse_judgment(input_text)["paragraphs"]:
+        text = paragraph["text"]
+        starts = [match.start() for match in _section_re.finditer(text) if match.start() > 0]
+        for start, stop in zip([0] + starts, starts + [len(text)]):
+            sections.append(text[start:stop].strip())
+    return "\n\n".join(section for section in sections if section)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as file:
+            payload = json.load(file)
+        started = time.perf_counter()
+        parsed = parse_payload(payload, cache=False)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(json.dumps(dict(parsed, paragraphs=len(parsed["paragraphs"])), indent=2, ensure_ascii=False))
+        print(f"Parsed {len(payload.get('doc') or '')} characters in {elapsed:.2f} ms")
+    else:
+        print("Usage: python judgment_parser.py <doc.json>")
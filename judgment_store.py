@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import atexit
+import hashlib
+import logging
+import sqlite3
+import threading
+
+# Append-only store of fetched judgments and search responses, replacing the JSON files that
+# used to be overwritten in output_files on every request
+judgment_store_path = os.path.abspath(
+    os.getenv("JUDGMENT_STORE_DB", os.path.join("output_files", "store", "judgments.sqlite3"))
+)
+# Records written per transaction, how long the writer waits to fill a batch, and the most records waiting
+JUDGMENT_STORE_BATCH = int(os.getenv("JUDGMENT_STORE_BATCH", 200))
+JUDGMENT_STORE_FLUSH_SECONDS = float(os.getenv("JUDGMENT_STORE_FLUSH_SECONDS", 0.5))
+JUDGMENT_STORE_MAX_PENDING = int(os.getenv("JUDGMENT_STORE_MAX_PENDING", 10000))
+JUDGMENT_STORE_ENABLED = os.getenv("JUDGMENT_STORE_ENABLED", "1") == "1"
+# Stored search responses are kept for this many days and up to this many rows; the oldest are
+# purged every JUDGMENT_STORE_PURGE_EVERY written searches
+JUDGMENT_STORE_SEARCH_DAYS = float(os.getenv("JUDGMENT_STORE_SEARCH_DAYS", 30))
+JUDGMENT_STORE_MAX_SEARCHES = int(os.getenv("JUDGMENT_STORE_MAX_SEARCHES", 100000))
+JUDGMENT_STORE_PURGE_EVERY = int(os.getenv("JUDGMENT_STORE_PURGE_EVERY", 1000))
+
+
+# Helper function to serialize and compress a payload for storage
+def pack(payload):
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+# Helper function to decompress and parse a stored payload
+def unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+# SQLite store with one row per fetched version of a judgment and per live search response. Judgment
+# rows are only ever appended (a judgment is skipped when its content is unchanged), so concurrent
+# requests no longer overwrite each other and the history is kept; search rows are purged by age
+# and count. Requests hand records to a queue;
+# a writer thread commits them in batches, off the request path.
+class JudgmentStore:
+    def __init__(self, db_path=judgment_store_path):
+        self.db_path = db_path
+        self._queue = queue.Queue(maxsize=JUDGMENT_STORE_MAX_PENDING)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self.written = 0
+        self.unchanged = 0
+        self.dropped = 0
+        self.purged = 0
+        self._searches_since_purge = 0
+        self._listeners = []
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = self._connection()
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS judgments ("
+            "id INTEGER PRIMARY KEY, tid TEXT NOT NULL, fetched_at REAL NOT NULL, payload BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS judgments_tid ON judgments (tid, id);"
+            # Latest version of each judgment with the fields it is looked up by
+            "CREATE TABLE IF NOT EXISTS judgment_index ("
+            "tid TEXT PRIMARY KEY, judgment_id INTEGER NOT NULL, title TEXT, court TEXT, publishdate TEXT, "
+            "content_hash TEXT NOT NULL, fetched_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS judgment_index_court ON judgment_index (court, publishdate);"
+            "CREATE INDEX IF NOT EXISTS judgment_index_date ON judgment_index (publishdate);"
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "id INTEGER PRIMARY KEY, query TEXT NOT NULL, found TEXT, tids TEXT, fetched_at REAL NOT NULL, "
+            "payload BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS searches_query ON searches (query, id);"
+            "CREATE INDEX IF NOT EXISTS searches_fetched ON searches (fetched_at);"
+        )
+
+    # One connection per thread; WAL lets readers run while the writer commits
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _start(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="judgment-store", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush, 5)
+
+    def _enqueue(self, record):
+        if not JUDGMENT_STORE_ENABLED:
+            return
+        self._start()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._idle:
+                self._pending -= 1
+                self.dropped += 1
+            logging.warning("Judgment store queue is full; dropping a record.")
+
+    # Register a callback run on the writer thread with each batch of new or changed judgments
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    # Queue a Kanoon /doc/ payload for storage; returns immediately
+    def record_judgment(self, payload):
+        if payload and payload.get("tid") is not None:
+            self._enqueue(("judgment", payload, time.time()))
+
+    def record_judgments(self, payloads):
+        for payload in payloads:
+            self.record_judgment(payload)
+
+    # Queue a live Kanoon /search/ response for storage; returns immediately
+    def record_search(self, query, data):
+        if data:
+            self._enqueue(("search", (query, data), time.time()))
+
+    def _write_loop(self):
+        connection = self._connection()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + JUDGMENT_STORE_FLUSH_SECONDS
+            while len(batch) < JUDGMENT_STORE_BATCH:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                changed = self._write(connection, batch)
+            except sqlite3.Error as e:
+                logging.error(f"Judgment store write of {len(batch)} records failed: {e}")
+                changed = []
+            for callback in self._listeners if changed else ():
+                try:
+                    callback(changed)
+                except Exception as e:
+                    logging.error(f"Judgment store listener failed on {len(changed)} judgments: {e}")
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+    def _write(self, connection, batch):
+        judgments, searches = [], []
+        for kind, record, fetched_at in batch:
+            if kind == "judgment":
+                blob = pack(record)
+                judgments.append((
+                    str(record["tid"]), record.get("title", ""), record.get("docsource", ""),
+                    record.get("publishdate", ""), hashlib.sha256(blob).hexdigest(), fetched_at, blob, record,
+                ))
+            else:
+                query, data = record
+                tids = ",".join(str(doc.get("tid")) for doc in data.get("docs") or [])
+                searches.append((query, str(data.get("found", "")), tids, fetched_at, pack(data)))
+
+        changed = []
+        with connection:
+            for tid, title, court, publishdate, content_hash, fetched_at, blob, record in judgments:
+                latest = connection.execute(
+                    "SELECT content_hash FROM judgment_index WHERE tid = ?", (tid,)
+                ).fetchone()
+                if latest is not None and latest[0] == content_hash:
+                    self.unchanged += 1
+                    continue
+                judgment_id = connection.execute(
+                    "INSERT INTO judgments (tid, fetched_at, payload) VALUES (?, ?, ?)", (tid, fetched_at, blob)
+                ).lastrowid
+                connection.execute(
+                    "INSERT OR REPLACE INTO judgment_index "
+                    "(tid, judgment_id, title, court, publishdate, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (tid, judgment_id, title, court, publishdate, content_hash, fetched_at),
+                )
+                changed.append(record)
+            connection.executemany(
+                "INSERT INTO searches (query, found, tids, fetched_at, payload) VALUES (?, ?, ?, ?, ?)", searches
+            )
+            self._searches_since_purge += len(searches)
+            if self._searches_since_purge >= JUDGMENT_STORE_PURGE_EVERY:
+                self._purge_searches(connection)
+        self.written += len(changed) + len(searches)
+        return changed
+
+    # Drop search responses older than the retention period, then the oldest above the row cap
+    def _purge_searches(self, connection, now=None):
+        self._searches_since_purge = 0
+        cutoff = (now or time.time()) - JUDGMENT_STORE_SEARCH_DAYS * 24 * 60 * 60
+        purged = connection.execute("DELETE FROM searches WHERE fetched_at < ?", (cutoff,)).rowcount
+        purged += connection.execute(
+            "DELETE FROM searches WHERE id <= (SELECT id FROM searches ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (JUDGMENT_STORE_MAX_SEARCHES,),
+        ).rowcount
+        self.purged += purged
+        return purged
+
+    # Block until every queued record is written (or `timeout` seconds pass); returns True when idle
+    def flush(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    # Latest stored version of a judgment, or None
+    def get(self, tid):
+        row = self._connection().execute(
+            "SELECT payload FROM judgment_index JOIN judgments ON judgments.id = judgment_id "
+            "WHERE judgment_index.tid = ?", (str(tid),)
+        ).fetchone()
+        return unpack(row[0]) if row else None
+
+    # Every stored version of a judgment, oldest first, as (fetched_at, payload) pairs
+    def history(self, tid):
+        rows = self._connection().execute(
+            "SELECT fetched_at, payload FROM judgments WHERE tid = ? ORDER BY id", (str(tid),)
+        ).fetchall()
+        return [(fetched_at, unpack(payload)) for fetched_at, payload in rows]
+
+    # Latest versions of the judgments from one court, newest decisions first; metadata only unless `payloads`
+    def by_court(self, court, limit=100, payloads=False):
+        return self._select("court = ?", (court,), limit, payloads)
+
+    # Latest versions of the judgments published between two ISO dates (inclusive)
+    def by_date(self, start, end, limit=100, payloads=False):
+        return self._select("publishdate BETWEEN ? AND ?", (start, end), limit, payloads)
+
+    def _select(self, condition, parameters, limit, payloads):
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT tid, judgment_id, title, court, publishdate, fetched_at FROM judgment_index "
+            f"WHERE {condition} ORDER BY publishdate DESC LIMIT ?",
+            (*parameters, limit),
+        ).fetchall()
+        results = []
+        for tid, judgment_id, title, court, publishdate, fetched_at in rows:
+            result = {"tid": tid, "title": title, "docsource": court, "publishdate": publishdate, "fetched_at": fetched_at}
+            if payloads:
+                payload = connection.execute("SELECT payload FROM judgments WHERE id = ?", (judgment_id,)).fetchone()[0]
+                result["payload"] = unpack(payload)
+            results.append(result)
+        return results
+
+    # Generator over the latest version of every stored judgment
+    def iter_judgments(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            for (payload,) in connection.execute(
+                "SELECT payload FROM judgment_index JOIN judgments ON judgments.id = judgment_id"
+            ):
+                yield unpack(payload)
+        finally:
+            connection.close()
+
+    # Latest stored response for a search query, or None
+    def last_search(self, query):
+        row = self._connection().execute(
+            "SELECT payload FROM searches WHERE query = ? ORDER BY id DESC LIMIT 1", (query,)
+        ).fetchone()
+        return unpack(row[0]) if row else None
+
+    def stats(self):
+        connection = self._connection()
+        return {
+            "judgments": connection.execute("SELECT COUNT(*) FROM judgment_index").fetchone()[0],
+            "versions": connection.execute("SELECT COUNT(*) FROM judgments").fetchone()[0],
+            "searches": connection.execute("SELECT COUNT(*) FROM searches").fetchone()[0],
+            "pending": self._pending,
+            "written_by_this_process": self.written,
+            "unchanged": self.unchanged,
+            "dropped": self.dropped,
+            "purged_searches": self.purged,
+        }
+
+
+# Shared store used by the web apps
+judgment_store = JudgmentStore()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "get":
+        print(json.dumps(judgment_store.get(sys.argv[2]), indent=2, ensure_ascii=False))
+    elif len(sys.argv) > 2 and sys.argv[1] == "court":
+        print(json.dumps(judgment_store.by_court(" ".join(sys.argv[2:])), indent=2, ensure_ascii=False))
+    elif len(sys.argv) > 3 and sys.argv[1] == "dates":
+        print(json.dumps(judgment_store.by_date(sys.argv[2], sys.argv[3]), indent=2, ensure_ascii=False))
+    elif len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print(json.dumps(judgment_store.stats(), indent=2))
+    else:
+        print("Usage: python judgment_store.py get <tid> | court <name> | dates <from> <to> | stats")
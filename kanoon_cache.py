@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Directory and database used for the on-disk cache layer
+cache_directory = os.path.abspath(os.getenv("KANOON_CACHE_DIR", os.path.join("output_files", "cache")))
+os.makedirs(cache_directory, exist_ok=True)
+cache_db_path = os.path.join(cache_directory, "kanoon_cache.sqlite3")
+
+# Cache limits (seconds / entries / bytes), overridable from the environment
+KANOON_SEARCH_TTL = int(os.getenv("KANOON_SEARCH_TTL", 6 * 60 * 60))
+KANOON_DOC_TTL = int(os.getenv("KANOON_DOC_TTL", 7 * 24 * 60 * 60))
+KANOON_CACHE_MEMORY_ENTRIES = int(os.getenv("KANOON_CACHE_MEMORY_ENTRIES", 256))
+KANOON_CACHE_MEMORY_BYTES = int(os.getenv("KANOON_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+KANOON_CACHE_DISK_ENTRIES = int(os.getenv("KANOON_CACHE_DISK_ENTRIES", 20000))
+# How long expired entries are kept to be served while the upstream is down, and how many writes
+# pass between disk eviction sweeps
+KANOON_STALE_GRACE = int(os.getenv("KANOON_STALE_GRACE", 7 * 24 * 60 * 60))
+KANOON_CACHE_EVICT_EVERY = int(os.getenv("KANOON_CACHE_EVICT_EVERY", 100))
+
+_whitespace_re = re.compile(r"\s+")
+
+
+# Helper function to normalize query text so equivalent queries share a cache key
+def normalize_query(query):
+    return _whitespace_re.sub(" ", str(query)).strip().lower()
+
+
+# Two-level (memory + SQLite) cache with TTL expiry, LRU eviction and size caps. Expired entries
+# are not served by get() but are kept for `stale_grace` seconds for get_stale(); entries are
+# removed by the LRU size caps and by a periodic sweep of entries past their grace period.
+class TTLCache:
+    def __init__(self, name, ttl, max_entries=KANOON_CACHE_MEMORY_ENTRIES,
+                 max_bytes=KANOON_CACHE_MEMORY_BYTES, max_disk_entries=KANOON_CACHE_DISK_ENTRIES,
+                 db_path=cache_db_path, stale_grace=KANOON_STALE_GRACE):
+        self.name = name
+        self.ttl = ttl
+        self.stale_grace = stale_grace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self._writes = 0
+        self._connection = None
+        if db_path:
+            self._init_disk()
+
+    def _init_disk(self):
+        try:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS cache_{self.name} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS cache_{self.name}_accessed ON cache_{self.name} (accessed_at)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS cache_{self.name}_expires ON cache_{self.name} (expires_at)"
+            )
+            self._connection.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Disk cache '{self.name}' disabled: {e}")
+            self._connection = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+            if self._connection is not None:
+                try:
+                    row = self._connection.execute(
+                        f"SELECT value, expires_at FROM cache_{self.name} WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] > now:
+                        self._connection.execute(
+                            f"UPDATE cache_{self.name} SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._connection.commit()
+                        value = json.loads(row[0])
+                        self._store_memory(key, value, len(row[0]), row[1])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                except sqlite3.Error as e:
+                    logging.warning(f"Disk cache '{self.name}' read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    # Return a value even if its TTL has expired (within the stale grace period); used to serve
+    # stale data while the upstream is down
+    def get_stale(self, key):
+        oldest = time.time() - self.stale_grace
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > oldest:
+                self.stale_hits += 1
+                return entry[1]
+            if self._connection is not None:
+                try:
+                    row = self._connection.execute(
+                        f"SELECT value FROM cache_{self.name} WHERE key = ? AND expires_at > ?", (key, oldest)
+                    ).fetchone()
+                    if row is not None:
+                        self.stale_hits += 1
+                        return json.loads(row[0])
+                except sqlite3.Error as e:
+                    logging.warning(f"Disk cache '{self.name}' read failed: {e}")
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        serialized = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._store_memory(key, value, len(serialized), expires_at)
+            if self._connection is not None:
+                try:
+                    self._connection.execute(
+                        f"INSERT OR REPLACE INTO cache_{self.name} (key, value, expires_at, accessed_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, serialized, expires_at, now),
+                    )
+                    self._writes += 1
+                    if self._writes % KANOON_CACHE_EVICT_EVERY == 0:
+                        self._evict_disk(now)
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"Disk cache '{self.name}' write failed: {e}")
+
+    def _store_memory(self, key, value, size, expires_at):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[2]
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.evictions += 1
+
+    # Drop entries past their stale grace period, then the least recently used ones above the size cap
+    def _evict_disk(self, now):
+        self._connection.execute(f"DELETE FROM cache_{self.name} WHERE expires_at <= ?", (now - self.stale_grace,))
+        count = self._connection.execute(f"SELECT COUNT(*) FROM cache_{self.name}").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._connection.execute(
+                f"DELETE FROM cache_{self.name} WHERE key IN ("
+                f"SELECT key FROM cache_{self.name} ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+            self.evictions += count - self.max_disk_entries
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._connection is not None:
+                self._connection.execute(f"DELETE FROM cache_{self.name}")
+                self._connection.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale_hits": self.stale_hits,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+# Shared caches for Kanoon search results (keyed on normalized query) and documents (keyed on docid)
+search_cache = TTLCache("search", ttl=KANOON_SEARCH_TTL)
+doc_cache = TTLCache("doc", ttl=KANOON_DOC_TTL)
+
+
+# Helper function to build the search cache key
+def search_cache_key(query, pagenum=1):
+    return f"{normalize_query(query)}|{pagenum}"
+
+
+# Helper function to report hit/miss counters for every shared cache
+def cache_stats():
+    return {"search": search_cache.stats(), "doc": doc_cache.stats()}
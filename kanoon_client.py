@@ -0,0 +1,417 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from kanoon_cache import search_cache, doc_cache, search_cache_key
+from local_index import local_search
+from entity_index import entity_search
+from singleflight import SingleFlight, AsyncSingleFlight
+from judgment_store import judgment_store
+
+# Load environment variables
+load_dotenv()
+
+KANOON_BASE_URL = os.getenv("KANOON_BASE_URL", "https://api.indiankanoon.org")
+
+# Connection pool, timeout (seconds) and retry settings
+KANOON_POOL_SIZE = int(os.getenv("KANOON_POOL_SIZE", 20))
+KANOON_ASYNC_POOL_SIZE = int(os.getenv("KANOON_ASYNC_POOL_SIZE", 100))
+KANOON_CONNECT_TIMEOUT = float(os.getenv("KANOON_CONNECT_TIMEOUT", 3.05))
+KANOON_READ_TIMEOUT = float(os.getenv("KANOON_READ_TIMEOUT", 15))
+KANOON_MAX_RETRIES = int(os.getenv("KANOON_MAX_RETRIES", 3))
+KANOON_BACKOFF_FACTOR = float(os.getenv("KANOON_BACKOFF_FACTOR", 0.5))
+
+# Number of search results used per query and the bound on concurrent document fetches
+KANOON_TOP_K = int(os.getenv("KANOON_TOP_K", 3))
+KANOON_FETCH_WORKERS = int(os.getenv("KANOON_FETCH_WORKERS", 4))
+
+# Local BM25 index usage: "fallback" (only when the API fails), "first" (use confident local
+# matches before calling the API) or "off"
+KANOON_LOCAL_MODE = os.getenv("KANOON_LOCAL_MODE", "fallback")
+KANOON_LOCAL_MIN_SCORE = float(os.getenv("KANOON_LOCAL_MIN_SCORE", 10))
+# Answer structured queries ("cases citing AIR 1987 GAUHATI 73", "judgments by K.N. Saikia") from the
+# local citation/statute/judge index when it has matches, instead of calling Kanoon search (opt-in)
+KANOON_ENTITY_LOOKUP = os.getenv("KANOON_ENTITY_LOOKUP", "0") == "1"
+
+# Statuses retried with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Circuit breaker settings
+KANOON_BREAKER_THRESHOLD = int(os.getenv("KANOON_BREAKER_THRESHOLD", 5))
+KANOON_BREAKER_RESET = float(os.getenv("KANOON_BREAKER_RESET", 30))
+
+
+class KanoonError(Exception):
+    pass
+
+
+class CircuitOpenError(KanoonError):
+    pass
+
+
+# Circuit breaker: opens after consecutive failures, lets one trial call through after the reset timeout
+class CircuitBreaker:
+    def __init__(self, failure_threshold=KANOON_BREAKER_THRESHOLD, reset_timeout=KANOON_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError("Indian Kanoon API is unavailable (circuit open).")
+
+    # Context manager around one upstream call. A call that ends without recording an outcome (an
+    # unexpected error, or a cancelled request) still releases the half-open trial, so the breaker
+    # cannot stay half-open and reject every later call.
+    @contextmanager
+    def call(self):
+        self.before_call()
+        try:
+            yield
+        except KanoonError:
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (or interrupted): the upstream was not at fault, so only free the trial slot
+            self.release_trial()
+            raise
+
+    def release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                logging.warning("Indian Kanoon circuit breaker opened.")
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+# Helper function to build a pooled keep-alive session with bounded exponential-backoff retries
+def create_session():
+    retry = Retry(
+        total=KANOON_MAX_RETRIES,
+        connect=KANOON_MAX_RETRIES,
+        read=KANOON_MAX_RETRIES,
+        status=KANOON_MAX_RETRIES,
+        backoff_factor=KANOON_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=KANOON_POOL_SIZE, pool_maxsize=KANOON_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = create_session()
+breaker = CircuitBreaker()
+
+
+# Helper function to POST to the Kanoon API through the shared session and circuit breaker
+def _post(path, params=None):
+    headers = {"Authorization": f"Token {os.getenv('INDIAN_KANOON_API_KEY')}"}
+    with breaker.call():
+        try:
+            response = session.post(
+                f"{KANOON_BASE_URL}{path}",
+                params=params,
+                headers=headers,
+                timeout=(KANOON_CONNECT_TIMEOUT, KANOON_READ_TIMEOUT),
+            )
+        except requests.RequestException as e:
+            breaker.record_failure()
+            raise KanoonError(f"Request to Indian Kanoon failed: {e}") from e
+
+        return _handle_response(response)
+
+
+# Helper function to update the circuit breaker from a response and decode its JSON body
+def _handle_response(response):
+    if response.status_code == 429 or response.status_code >= 500:
+        breaker.record_failure()
+        raise KanoonError(f"Indian Kanoon API returned status {response.status_code}")
+    if response.status_code != 200:
+        breaker.record_success()
+        raise KanoonError(f"Indian Kanoon API returned status {response.status_code}")
+    # A 200 with a body that is not JSON (e.g. a proxy error page) counts as a failed call
+    try:
+        data = response.json()
+    except ValueError as e:
+        breaker.record_failure()
+        raise KanoonError(f"Indian Kanoon API returned an invalid response: {e}") from e
+    breaker.record_success()
+    return data
+
+
+# Concurrent cache misses for the same search (normalized query) or document share one upstream call
+search_flights = SingleFlight("kanoon_search")
+doc_flights = SingleFlight("kanoon_doc")
+async_search_flights = AsyncSingleFlight("kanoon_search")
+async_doc_flights = AsyncSingleFlight("kanoon_doc")
+
+
+# Helper function to answer a query from the local entity or BM25 index before calling the API
+def _local_first(query, pagenum):
+    if pagenum != 1:
+        return None
+    if KANOON_ENTITY_LOOKUP:
+        entities = entity_search(query, KANOON_TOP_K)
+        if entities and entities["docs"]:
+            return entities
+    if KANOON_LOCAL_MODE != "first":
+        return None
+    local = local_search(query, KANOON_TOP_K)
+    if local and local["docs"] and local["docs"][0]["score"] >= KANOON_LOCAL_MIN_SCORE:
+        return local
+    return None
+
+
+# Helper function to answer a query from the local BM25 index when the API has failed
+def _local_fallback(query, error):
+    if KANOON_LOCAL_MODE == "off":
+        return None
+    local = local_search(query)
+    if local and local["docs"]:
+        logging.warning(f"Indian Kanoon search failed ({error}); serving local index results.")
+        return local
+    return None
+
+
+# Helper function to run a live Kanoon search; only these responses go to the judgment store, not
+# cache hits or local results
+def _fetch_search(query, pagenum):
+    data = _post("/search/", params={"formInput": query, "filter": "on", "pagenum": pagenum})
+    judgment_store.record_search(query, data)
+    return data
+
+
+# Search Indian Kanoon, serving repeated queries from the cache and the local index
+def search(query, pagenum=1):
+    cache_key = search_cache_key(query, pagenum)
+    data = search_cache.get(cache_key)
+    if data is not None:
+        return data
+    local = _local_first(query, pagenum)
+    if local is not None:
+        return local
+    try:
+        data = search_flights.do(cache_key, _fetch_search, query, pagenum)
+    except KanoonError as e:
+        local = _local_fallback(query, e)
+        if local is None:
+            raise
+        return local
+    search_cache.set(cache_key, data)
+    return data
+
+
+# Fetch a single Kanoon document by docid (tid), serving hot documents from the cache
+# and falling back to an expired cached copy when the API fails
+def fetch_doc(docid):
+    data = doc_cache.get(str(docid))
+    if data is None:
+        try:
+            data = doc_flights.do(str(docid), _post, f"/doc/{docid}/")
+        except KanoonError:
+            data = doc_cache.get_stale(str(docid))
+            if data is None:
+                raise
+            return data
+        doc_cache.set(str(docid), data)
+    return data
+
+
+# Helper function to take the first k search results, dropping duplicate tids
+def top_docs(search_data, k=KANOON_TOP_K):
+    seen = set()
+    docs = []
+    for doc in search_data.get("docs", []):
+        tid = doc.get("tid")
+        if tid in seen:
+            continue
+        seen.add(tid)
+        docs.append(doc)
+        if len(docs) == k:
+            break
+    return docs
+
+
+# Fetch several documents concurrently on a bounded pool; documents that fail are skipped
+def fetch_docs(docids, max_workers=KANOON_FETCH_WORKERS):
+    docids = list(dict.fromkeys(docids))
+
+    def fetch(docid):
+        try:
+            return fetch_doc(docid)
+        except KanoonError as e:
+            logging.warning(f"Skipping Indian Kanoon document {docid}: {e}")
+            return None
+
+    if len(docids) <= 1:
+        results = [fetch(docid) for docid in docids]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(docids))) as executor:
+            results = list(executor.map(fetch, docids))
+    return [data for data in results if data is not None]
+
+
+_async_client = None
+
+
+# Helper function to get the shared pooled httpx client used by the ASGI app
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=KANOON_BASE_URL,
+            limits=httpx.Limits(max_connections=KANOON_ASYNC_POOL_SIZE, max_keepalive_connections=KANOON_ASYNC_POOL_SIZE),
+            timeout=httpx.Timeout(KANOON_READ_TIMEOUT, connect=KANOON_CONNECT_TIMEOUT),
+        )
+    return _async_client
+
+
+# Helper function to close the shared httpx client on shutdown
+async def aclose():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+# Async variant of _post() with the same bounded exponential-backoff retries and circuit breaker
+async def _apost(path, params=None):
+    headers = {"Authorization": f"Token {os.getenv('INDIAN_KANOON_API_KEY')}"}
+    with breaker.call():
+        client = get_async_client()
+        for attempt in range(KANOON_MAX_RETRIES + 1):
+            delay = KANOON_BACKOFF_FACTOR * (2 ** attempt)
+            try:
+                response = await client.post(path, params=params, headers=headers)
+            except httpx.HTTPError as e:
+                if attempt < KANOON_MAX_RETRIES:
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.record_failure()
+                raise KanoonError(f"Request to Indian Kanoon failed: {e}") from e
+            if response.status_code in RETRY_STATUSES and attempt < KANOON_MAX_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else delay)
+                continue
+            break
+        return _handle_response(response)
+
+
+# Async variant of _fetch_search()
+async def _afetch_search(query, pagenum):
+    data = await _apost("/search/", params={"formInput": query, "filter": "on", "pagenum": pagenum})
+    judgment_store.record_search(query, data)
+    return data
+
+
+# Async variant of search(). The cache (SQLite) and the local indexes (SQLite and memory-mapped
+# BM25 scans) block, so they run in a thread instead of on the event loop.
+async def async_search(query, pagenum=1):
+    cache_key = search_cache_key(query, pagenum)
+    data = await asyncio.to_thread(search_cache.get, cache_key)
+    if data is not None:
+        return data
+    local = await asyncio.to_thread(_local_first, query, pagenum)
+    if local is not None:
+        return local
+    try:
+        data = await async_search_flights.do(cache_key, _afetch_search, query, pagenum)
+    except KanoonError as e:
+        local = await asyncio.to_thread(_local_fallback, query, e)
+        if local is None:
+            raise
+        return local
+    await asyncio.to_thread(search_cache.set, cache_key, data)
+    return data
+
+
+# Async variant of fetch_doc(); cache reads and writes run in a thread
+async def async_fetch_doc(docid):
+    data = await asyncio.to_thread(doc_cache.get, str(docid))
+    if data is None:
+        try:
+            data = await async_doc_flights.do(str(docid), _apost, f"/doc/{docid}/")
+        except KanoonError:
+            data = await asyncio.to_thread(doc_cache.get_stale, str(docid))
+            if data is None:
+                raise
+            return data
+        await asyncio.to_thread(doc_cache.set, str(docid), data)
+    return data
+
+
+# Async variant of fetch_docs(), bounded by a semaphore
+async def async_fetch_docs(docids, max_workers=KANOON_FETCH_WORKERS):
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch(docid):
+        async with semaphore:
+            try:
+                return await async_fetch_doc(docid)
+            except KanoonError as e:
+                logging.warning(f"Skipping Indian Kanoon document {docid}: {e}")
+                return None
+
+    results = await asyncio.gather(*(fetch(docid) for docid in dict.fromkeys(docids)))
+    return [data for data in results if data is not None]
+
+
+# Helper function to report circuit breaker and request coalescing state
+def client_stats():
+    return {
+        "circuit_breaker": breaker.stats(),
+        "single_flight": {
+            "search": search_flights.stats(),
+            "doc": doc_flights.stats(),
+            "async_search": async_search_flights.stats(),
+            "async_doc": async_doc_flights.stats(),
+        },
+    }
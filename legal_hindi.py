@@ -1,13 +1,19 @@
 import os
 import json
-import requests
-import tempfile
-import PyPDF2
 import docx
 import streamlit as st
 import logging
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+import kanoon_client
+from kanoon_client import KanoonError
+from pdf_text import extract_pdf_text
+from uploads import open_upload, read_upload, iter_decoded
+import llm
+import semantic_cache
+import prompt_builder
+import document_analysis
+import translation
+import bilingual
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -19,8 +25,8 @@ load_dotenv()
 hf_api_key = os.getenv("HF_API_KEY")
 indian_kanoon_api_key = os.getenv("INDIAN_KANOON_API_KEY")
 
-# Initialize Hugging Face Inference Client
-client = InferenceClient(api_key=hf_api_key)
+# Initialize the inference client for the configured LLM backend
+client = llm.create_client()
 
 # System prompt for the chatbot
 SYSTEM_PROMPT = (
@@ -33,18 +39,14 @@ def extract_text_from_file(file, filename):
     logging.info("Extracting text from file...")
     try:
         file_extension = filename.rsplit('.', 1)[-1].lower()
+        upload = open_upload(file)
         if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = "".join([page.extract_text() for page in pdf_reader.pages])
+            text = extract_pdf_text(read_upload(upload))
         elif file_extension in ['doc', 'docx']:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-                temp_file.write(file.read())
-                temp_file.close()
-                doc = docx.Document(temp_file.name)
-                text = "\n".join([para.text for para in doc.paragraphs])
-            os.unlink(temp_file.name)
+            doc = docx.Document(upload)
+            text = "\n".join([para.text for para in doc.paragraphs])
         elif file_extension == 'txt':
-            text = file.read().decode('utf-8')
+            text = "".join(iter_decoded(upload))
         else:
             raise ValueError("Unsupported file format")
         logging.info("Text extraction successful.")
@@ -57,46 +59,53 @@ def extract_text_from_file(file, filename):
 def fetch_indian_kanoon_info(query):
     logging.info(f"Fetching Indian Kanoon info for query: {query[:100]}...")
     try:
-        url = "https://api.indiankanoon.org/search/"
-        params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-        response = requests.post(url, params=params, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            relevant_info = [
-                f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
-                for doc in data.get('docs', [])[:1]
-            ]
-            logging.info("Fetched Indian Kanoon data successfully.")
-            return "\n".join(relevant_info)
-        else:
-            logging.warning("Failed to fetch Indian Kanoon data. Non-200 response.")
-            return "Unable to fetch information from Indian Kanoon API."
+        data = kanoon_client.search(query)
+        relevant_info = [
+            f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
+            for doc in kanoon_client.top_docs(data)
+        ]
+        logging.info("Fetched Indian Kanoon data successfully.")
+        return "\n".join(relevant_info)
+    except KanoonError as e:
+        logging.warning(f"Failed to fetch Indian Kanoon data: {e}")
+        return "Unable to fetch information from Indian Kanoon API."
     except Exception as e:
         logging.error(f"Error fetching Indian Kanoon info: {e}")
         return f"Error fetching Indian Kanoon info: {e}"
 
+# "single" asks for the English and Hindi answers in one completion (falling back to translation when
+# the reply cannot be split); "two_call" generates in English and translates it in a second step
+LEGAL_HINDI_MODE = os.getenv("LEGAL_HINDI_MODE", "single")
+
+# Translations go through the segment cache; only uncached lines are sent to the model, in numbered batches
+translation_backend = translation.LLMBackend(client)
+
 # Helper function to translate text to Hindi using Hugging Face API
 def translate_to_hindi(text):
     logging.info("Translating text to Hindi...")
     try:
-        translation_prompt = f"Summarize and Translate the following text into Hindi:\n{text}"
-        messages = [
-            {"role": "system", "content": "You are a professional translator in hindi language."},
-            {"role": "user", "content": translation_prompt},
-        ]
-        completion = client.chat.completions.create(
-            model="meta-llama/Llama-3.2-3B-Instruct",
-            messages=messages,
-            max_tokens=1000
-        )
-        hindi_translation = completion.choices[0].message["content"]
+        hindi_translation = translation.translate(text, "en", "hi", translation_backend)
         logging.info("Translation to Hindi completed.")
         return hindi_translation
     except Exception as e:
         logging.error(f"Error during translation: {e}")
         return f"Error during translation: {e}"
 
+# Helper function to summarise a long document section by section, showing progress as sections finish
+def condense_with_progress(document_text):
+    progress_bar = None
+
+    def progress(event):
+        nonlocal progress_bar
+        if progress_bar is None:
+            progress_bar = st.progress(0.0)
+        progress_bar.progress(event["done"] / event["total"], text=f"Reading section {event['done']} / {event['total']}")
+
+    document_text = document_analysis.condense_document(client, document_text, progress=progress)
+    if progress_bar is not None:
+        progress_bar.empty()
+    return document_text
+
 # Streamlit app
 def main():
     st.title("KanoonSetu")
@@ -115,53 +124,64 @@ def main():
                 st.error("Please enter a query.")
             else:
                 try:
-                    # Fetch Indian Kanoon context
-                    kanoon_context = fetch_indian_kanoon_info(user_query)
-
-                    # Updated prompt for structured response
-                    text_query_prompt = f"""
-                    You are tasked with answering a legal query in a structured and organized format. Use the following guidelines:
-
-                    User Query:
-                    {user_query}
-
-                    Relevant Indian Kanoon Context:
-                    {kanoon_context}
-
-                    Please provide the response in the following format:
-                    1. **Key Defense Points**: Outline key arguments to defend against any legal allegations or challenges.
-                    2. **Supportive Points**: Highlight relevant laws, evidence, or precedents that strengthen the case.
-                    3. **Case Overview**: Mention any relevant judge(s), court name, and case details (if applicable).
-                    4. **Reason for Dispute**: Summarize the primary cause of the dispute or legal issue.
-                    5. **Legal Precedents**: Provide similar case precedents, their decisions, and relevance to this case.
-                    6. **Recommendations**: Suggest potential legal strategies, next steps, or actions.
-
-                    Ensure the response is concise, factual, and actionable.
-                    """
-
-                    # Prepare messages for API call
-                    messages = [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": text_query_prompt}
-                    ]
-
-                    # Call Hugging Face API
-                    completion = client.chat.completions.create(
-                        model="meta-llama/Llama-3.2-3B-Instruct",
-                        messages=messages,
-                        max_tokens=1500
-                    )
-
-                    response_content = completion.choices[0].message["content"]
-
-                    # Translate the response to Hindi
-                    hindi_translation = translate_to_hindi(response_content)
-
-                    # Display original and translated responses
-                    st.success("Response:")
-                    st.markdown(response_content)
-                    st.success("Translated Response (Hindi):")
-                    st.markdown(hindi_translation)
+                    # Answer near-duplicate questions (with their translation) from the semantic cache
+                    cached_response, query_vector = semantic_cache.lookup(user_query, language="en+hi")
+                    if cached_response is not None:
+                        st.success("Response:")
+                        st.markdown(cached_response["response"])
+                        st.success("Translated Response (Hindi):")
+                        st.markdown(cached_response["hindi"])
+                    else:
+                        # Fetch Indian Kanoon context
+                        kanoon_context = fetch_indian_kanoon_info(user_query)
+
+                        # Updated prompt for structured response
+                        text_query_prompt = """
+                        You are tasked with answering a legal query in a structured and organized format. Use the following guidelines:
+
+                        Please provide the response in the following format:
+                        1. **Key Defense Points**: Outline key arguments to defend against any legal allegations or challenges.
+                        2. **Supportive Points**: Highlight relevant laws, evidence, or precedents that strengthen the case.
+                        3. **Case Overview**: Mention any relevant judge(s), court name, and case details (if applicable).
+                        4. **Reason for Dispute**: Summarize the primary cause of the dispute or legal issue.
+                        5. **Legal Precedents**: Provide similar case precedents, their decisions, and relevance to this case.
+                        6. **Recommendations**: Suggest potential legal strategies, next steps, or actions.
+
+                        Ensure the response is concise, factual, and actionable.
+
+                        User Query:
+                        {user_query}
+
+                        Relevant Indian Kanoon Context:
+                        {kanoon_context}
+                        """
+
+                        sections = {"user_query": user_query, "kanoon_context": kanoon_context}
+                        if LEGAL_HINDI_MODE == "single":
+                            # One completion writes the English answer and then its Hindi version
+                            messages, max_new_tokens = bilingual.pack_bilingual_messages(SYSTEM_PROMPT, text_query_prompt, sections)
+                            stream = bilingual.BilingualStream(client, messages, max_new_tokens, translation_backend)
+                            st.success("Response:")
+                            response_content = st.write_stream(stream.english())
+                            st.success("Translated Response (Hindi):")
+                            response_content_hindi = st.write_stream(stream.hindi())
+                        else:
+                            # Pack the prompt sections into the model's context window, highest priority first
+                            messages, _ = prompt_builder.pack_messages(SYSTEM_PROMPT, text_query_prompt, sections)
+
+                            # Call Hugging Face API and stream the response as it is generated
+                            st.success("Response:")
+                            response_content = st.write_stream(llm.stream_tokens(client, messages, max_tokens=1500))
+
+                            # Stream the Hindi translation of the response
+                            st.success("Translated Response (Hindi):")
+                            response_content_hindi = st.write_stream(translation.stream_translation(response_content, "en", "hi", translation_backend))
+                        semantic_cache.store(
+                            user_query,
+                            {"response": response_content, "hindi": response_content_hindi},
+                            language="en+hi",
+                            vector=query_vector,
+                        )
                 except Exception as e:
                     st.error(f"Error: {e}")
 
@@ -173,18 +193,15 @@ def main():
                 logging.info("Uploaded file detected.")
                 filename = uploaded_file.name
                 document_text = extract_text_from_file(uploaded_file, filename)
-                kanoon_info = fetch_indian_kanoon_info(document_text[:500])
+                kanoon_info = fetch_indian_kanoon_info(prompt_builder.lead_excerpt(document_text))
+
+                # Long documents are summarised section by section (map) before the analysis (reduce)
+                document_text = condense_with_progress(document_text)
 
                 # Updated analysis prompt for better response
-                analysis_prompt = f"""
+                analysis_prompt = """
                 Analyze the following legal document and provide a structured, detailed summary based on the following key points:
 
-                Document Content:
-                {document_text[:2000]}
-
-                Relevant Indian Kanoon Information:
-                {kanoon_info}
-
                 Please provide the response in the following format:
                 1. **Key Defense Points**: Outline key arguments that can be used to defend against any allegations or legal challenges.
                 2. **Supportive Points**: Highlight evidence, laws, or precedents that strengthen the case.
@@ -194,32 +211,36 @@ def main():
                 6. **Recommendations**: Suggest potential legal strategies or next steps.
 
                 Keep the response concise, factual, and actionable.
+
+                Document Content:
+                {document_text}
+
+                Relevant Indian Kanoon Information:
+                {kanoon_info}
                 """
 
-                # Pass prompt to Hugging Face API
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": analysis_prompt}
-                ]
-
-                max_allowed_tokens = 4096 - len(analysis_prompt.split())
-                max_new_tokens = min(1500, max_allowed_tokens)
-                completion = client.chat.completions.create(
-                    model="meta-llama/Llama-3.2-3B-Instruct",
-                    messages=messages,
-                    max_tokens=max_new_tokens
-                )
-
-                analysis_content = completion.choices[0].message["content"]
-
-                # Translate the analysis to Hindi
-                hindi_translation = translate_to_hindi(analysis_content)
-
-                # Display original and translated analysis
-                st.success("Analysis:")
-                st.markdown(analysis_content)
-                st.success("Translated Analysis (Hindi):")
-                st.markdown(hindi_translation)
+                sections = {"kanoon_info": kanoon_info, "document_text": document_text}
+                if LEGAL_HINDI_MODE == "single":
+                    # One (cached) completion writes the analysis in English and then in Hindi
+                    messages, max_new_tokens = bilingual.pack_bilingual_messages(SYSTEM_PROMPT, analysis_prompt, sections)
+                    stream = bilingual.BilingualStream(
+                        client, messages, max_new_tokens, translation_backend, stream_fn=document_analysis.stream_analysis
+                    )
+                    st.success("Analysis:")
+                    st.write_stream(stream.english())
+                    st.success("Translated Analysis (Hindi):")
+                    st.write_stream(stream.hindi())
+                else:
+                    # Pack the prompt sections into the model's context window, highest priority first
+                    messages, max_new_tokens = prompt_builder.pack_messages(
+                        SYSTEM_PROMPT, analysis_prompt, sections, max_new_tokens=1500
+                    )
+                    st.success("Analysis:")
+                    analysis_content = st.write_stream(document_analysis.stream_analysis(client, messages, max_new_tokens))
+
+                    # Stream the Hindi translation of the analysis
+                    st.success("Translated Analysis (Hindi):")
+                    st.write_stream(translation.stream_translation(analysis_content, "en", "hi", translation_backend))
             except Exception as e:
                 logging.error(f"Error analyzing document: {e}")
                 st.error(f"Error: {e}")
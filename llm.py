@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+import logging
+from dotenv import load_dotenv
+from huggingface_hub import InferenceClient, AsyncInferenceClient
+from singleflight import SingleFlight, AsyncSingleFlight
+from prefix_cache import PrefixTracker, reported_cached_tokens
+
+# Load environment variables
+load_dotenv()
+
+# Model used by every entry point
+MODEL_ID = os.getenv("LLM_MODEL", "meta-llama/Llama-3.2-3B-Instruct")
+
+# Optional OpenAI-compatible endpoint (e.g. a dedicated Inference Endpoint) and request timeout in seconds
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))
+
+# Context window (prompt plus generated tokens) the prompts are packed into
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", 4096))
+
+# Where completions run: "hf" (Hugging Face Inference API or LLM_BASE_URL) or "local" (quantized
+# GGUF build of the model on this machine's CPU, see local_llm.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "hf")
+
+
+# Identical prompts requested concurrently share one completion (or one token stream)
+generation_flights = SingleFlight("generate")
+stream_flights = SingleFlight("stream")
+async_generation_flights = AsyncSingleFlight("generate")
+async_stream_flights = AsyncSingleFlight("stream")
+
+
+# Measures how much prompt prefill repeats recent prompts (and so can be served from a prefix/KV
+# cache: automatic in TGI and vLLM with prefix caching, and the state cache of the local backend)
+prefix_tracker = PrefixTracker()
+
+
+# Helper function to create the synchronous inference client for the configured backend
+def create_client():
+    if LLM_BACKEND == "local":
+        import local_llm
+        return local_llm.LocalClient(local_llm.get_local_model(LLM_CONTEXT_WINDOW))
+    return InferenceClient(base_url=LLM_BASE_URL, api_key=os.getenv("HF_API_KEY"), timeout=LLM_TIMEOUT)
+
+
+# Helper function to create the asyncio inference client for the configured backend
+def create_async_client():
+    if LLM_BACKEND == "local":
+        import local_llm
+        return local_llm.AsyncLocalClient(local_llm.get_local_model(LLM_CONTEXT_WINDOW))
+    return AsyncInferenceClient(base_url=LLM_BASE_URL, api_key=os.getenv("HF_API_KEY"), timeout=LLM_TIMEOUT)
+
+
+# Helper function to hash the model, messages and token limit that determine a completion
+def prompt_key(messages, max_tokens):
+    serialized = json.dumps([MODEL_ID, messages, max_tokens], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+# Helper function to run a chat completion and return the full response text
+def generate(client, messages, max_tokens=1500):
+    return generation_flights.do(prompt_key(messages, max_tokens), _generate, client, messages, max_tokens)
+
+
+def _generate(client, messages, max_tokens):
+    completion = client.chat.completions.create(
+        model=MODEL_ID,
+        messages=messages,
+        max_tokens=max_tokens
+    )
+    prefix_tracker.record(messages, reported_cached_tokens(completion))
+    return completion.choices[0].message["content"]
+
+
+# Generator yielding response text as the inference client produces it
+def stream_tokens(client, messages, max_tokens=1500):
+    yield from stream_flights.stream(prompt_key(messages, max_tokens), _stream_tokens, client, messages, max_tokens)
+
+
+def _stream_tokens(client, messages, max_tokens):
+    logging.info("Streaming completion from the inference client...")
+    stream = client.chat.completions.create(
+        model=MODEL_ID,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            yield token
+    prefix_tracker.record(messages)
+
+
+# Async variant of generate() for the ASGI app
+async def agenerate(client, messages, max_tokens=1500):
+    return await async_generation_flights.do(prompt_key(messages, max_tokens), _agenerate, client, messages, max_tokens)
+
+
+async def _agenerate(client, messages, max_tokens):
+    completion = await client.chat.completions.create(
+        model=MODEL_ID,
+        messages=messages,
+        max_tokens=max_tokens
+    )
+    prefix_tracker.record(messages, reported_cached_tokens(completion))
+    return completion.choices[0].message["content"]
+
+
+# Async variant of stream_tokens() for the ASGI app
+async def astream_tokens(client, messages, max_tokens=1500):
+    async for token in async_stream_flights.stream(
+        prompt_key(messages, max_tokens), _astream_tokens, client, messages, max_tokens
+    ):
+        yield token
+
+
+async def _astream_tokens(client, messages, max_tokens):
+    stream = await client.chat.completions.create(
+        model=MODEL_ID,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            yield token
+    prefix_tracker.record(messages)
+
+
+# Helper function to report how many completions were shared between identical concurrent prompts
+def flight_stats():
+    return {
+        "generate": generation_flights.stats(),
+        "stream": stream_flights.stats(),
+        "async_generate": async_generation_flights.stats(),
+        "async_stream": async_stream_flights.stats(),
+    }
+
+
+# Helper function to report the configured backend, with scheduler metrics for the local model
+def backend_stats():
+    stats = {"backend": LLM_BACKEND, "model": MODEL_ID}
+    if LLM_BACKEND == "local":
+        import local_llm
+        stats["local"] = local_llm.local_stats()
+    return stats
+
+
+# Helper function to report the estimated reusable prefill tokens and the cached tokens backends confirmed
+def prefix_stats():
+    return prefix_tracker.stats()
@@ -0,0 +1,194 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import sqlite3
+import threading
+import numpy as np
+from kanoon_cache import cache_db_path
+from judgment_store import judgment_store
+import judgment_parser
+
+# Directory holding the on-disk BM25 index
+index_directory = os.path.abspath(os.getenv("LOCAL_INDEX_DIR", os.path.join("output_files", "index", "bm25")))
+
+# BM25 parameters
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+# Helper function to get the plain text body of a Kanoon /doc/ payload: a citations and bench
+# header, then one line per paragraph (parsed once per tid unless `cache` is off)
+def document_body(payload, cache=True):
+    return judgment_parser.payload_text(payload, cache)
+
+
+# Helper function to lowercase and tokenize text for indexing and querying
+def tokenize(text):
+    return [token for token in _token_re.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+# Helper function to read every stored judgment and cached /doc/ payload, plus the legacy response_context.json
+def iter_cached_documents(db_path=cache_db_path, output_directory=os.path.abspath("output_files")):
+    seen = set()
+    context_file_path = os.path.join(output_directory, "response_context.json")
+    if os.path.exists(context_file_path):
+        with open(context_file_path, encoding="utf-8") as file:
+            payload = json.load(file)
+        if payload.get("tid") is not None:
+            seen.add(str(payload["tid"]))
+            yield payload
+    for payload in judgment_store.iter_judgments():
+        if str(payload["tid"]) not in seen:
+            seen.add(str(payload["tid"]))
+            yield payload
+    if os.path.exists(db_path):
+        connection = sqlite3.connect(db_path)
+        try:
+            for key, value in connection.execute("SELECT key, value FROM cache_doc"):
+                if key not in seen:
+                    seen.add(key)
+                    yield json.loads(value)
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.close()
+
+
+# Build the inverted index and write it as flat NumPy arrays that can be memory-mapped
+def build_index(documents, path=index_directory):
+    postings = {}
+    doc_lengths = []
+    metadata = []
+    for payload in documents:
+        text = document_body(payload, cache=False)
+        tokens = tokenize(f"{payload.get('title', '')} {text}")
+        if not tokens:
+            continue
+        doc_number = len(metadata)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((doc_number, tf))
+        doc_lengths.append(len(tokens))
+        metadata.append({
+            "tid": payload.get("tid"),
+            "title": payload.get("title", ""),
+            "docsource": payload.get("docsource", ""),
+            "publishdate": payload.get("publishdate", ""),
+            "snippet": " ".join(text.split()[:60]),
+        })
+
+    vocabulary = {}
+    doc_ids = []
+    term_freqs = []
+    offset = 0
+    for term in sorted(postings):
+        entries = postings[term]
+        vocabulary[term] = [offset, len(entries)]
+        doc_ids.extend(doc for doc, _ in entries)
+        term_freqs.extend(min(tf, 65535) for _, tf in entries)
+        offset += len(entries)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "doc_ids.npy"), np.asarray(doc_ids, dtype=np.int32))
+    np.save(os.path.join(path, "term_freqs.npy"), np.asarray(term_freqs, dtype=np.uint16))
+    np.save(os.path.join(path, "doc_lengths.npy"), np.asarray(doc_lengths, dtype=np.int32))
+    with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as file:
+        json.dump(vocabulary, file, separators=(",", ":"))
+    with open(os.path.join(path, "documents.json"), "w", encoding="utf-8") as file:
+        json.dump(metadata, file, separators=(",", ":"))
+    logging.info(f"Built local BM25 index with {len(metadata)} documents and {len(vocabulary)} terms.")
+    return len(metadata)
+
+
+# Memory-mapped BM25 index over cached judgments
+class LocalIndex:
+    def __init__(self, path=index_directory):
+        self.path = path
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.term_freqs = np.load(os.path.join(path, "term_freqs.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(path, "doc_lengths.npy"))
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as file:
+            self.vocabulary = json.load(file)
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as file:
+            self.documents = json.load(file)
+        self.average_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.documents)
+
+    # Return (document metadata, score) pairs for the k best BM25 matches
+    def search(self, query, k=10):
+        if not self.documents:
+            return []
+        total = len(self.documents)
+        scores = np.zeros(total, dtype=np.float32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / self.average_length)
+        for term in set(tokenize(query)):
+            entry = self.vocabulary.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            docs = self.doc_ids[offset:offset + df]
+            tf = self.term_freqs[offset:offset + df].astype(np.float32)
+            idf = np.log(1 + (total - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.documents[i], float(scores[i])) for i in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# Helper function to get the shared index, loading it on first use; returns None when not built yet
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None and os.path.exists(os.path.join(index_directory, "documents.json")):
+                _index = LocalIndex()
+                logging.info(f"Loaded local BM25 index with {len(_index)} documents.")
+    return _index
+
+
+# Search the local index and return results shaped like a Kanoon /search/ response
+def local_search(query, k=10):
+    index = get_index()
+    if index is None:
+        return None
+    results = index.search(query, k)
+    return {
+        "source": "local",
+        "found": len(results),
+        "docs": [dict(document, score=round(score, 4)) for document, score in results],
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        count = build_index(iter_cached_documents())
+        print(f"Indexed {count} documents into {index_directory}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "search":
+        started = time.perf_counter()
+        response = local_search(" ".join(sys.argv[2:]))
+        elapsed = (time.perf_counter() - started) * 1000
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+        print(f"Search took {elapsed:.2f} ms")
+    else:
+        print("Usage: python local_index.py build | search <query>")
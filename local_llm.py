@@ -0,0 +1,223 @@
+import os
+import queue
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import Future
+
+try:
+    from llama_cpp import Llama, LlamaRAMCache
+except ImportError:  # llama-cpp-python is only needed for LLM_BACKEND=local
+    Llama = None
+
+# Quantized GGUF build of the served model: a local file, or a Hub repo and file downloaded on first use
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH")
+LOCAL_LLM_REPO = os.getenv("LOCAL_LLM_REPO", "bartowski/Llama-3.2-3B-Instruct-GGUF")
+LOCAL_LLM_FILE = os.getenv("LOCAL_LLM_FILE", "Llama-3.2-3B-Instruct-Q4_K_M.gguf")
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", os.cpu_count() or 4))
+# Prompt tokens evaluated per llama.cpp decode step
+LOCAL_LLM_BATCH_TOKENS = int(os.getenv("LOCAL_LLM_BATCH_TOKENS", 512))
+# Requests taken from the queue at once; they are ordered so requests sharing a prompt prefix run back to back
+LOCAL_LLM_MAX_BATCH = int(os.getenv("LOCAL_LLM_MAX_BATCH", 8))
+# Memory for saved KV states of evaluated prompts, looked up by longest matching token prefix
+LOCAL_LLM_PREFIX_CACHE_BYTES = int(os.getenv("LOCAL_LLM_PREFIX_CACHE_BYTES", 2 * 1024 * 1024 * 1024))
+
+
+# One queued completion; tokens and the final error (or None) are passed to the callbacks
+class _Request:
+    def __init__(self, messages, max_tokens, on_token, on_done):
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.on_token = on_token
+        self.on_done = on_done
+        self.cancelled = False
+
+    # Requests with the same system prompt share the evaluated prefix of the chat template
+    def prefix(self):
+        return self.messages[0]["content"] if self.messages and self.messages[0]["role"] == "system" else ""
+
+
+# The GGUF model, loaded once and kept in memory, with a scheduler thread that owns it. llama.cpp
+# contexts are not thread-safe, so requests are queued; each scheduling round takes up to
+# LOCAL_LLM_MAX_BATCH waiting requests and runs those sharing a system prompt consecutively, so
+# the KV state of the shared prefix is reused instead of evaluated again.
+class LocalModel:
+    def __init__(self, context_window):
+        if Llama is None:
+            raise RuntimeError("LLM_BACKEND=local needs llama-cpp-python (pip install llama-cpp-python)")
+        options = dict(n_ctx=context_window, n_threads=LOCAL_LLM_THREADS, n_batch=LOCAL_LLM_BATCH_TOKENS, verbose=False)
+        if LOCAL_LLM_MODEL_PATH:
+            logging.info(f"Loading local model {LOCAL_LLM_MODEL_PATH}...")
+            self.model = Llama(model_path=LOCAL_LLM_MODEL_PATH, **options)
+        else:
+            logging.info(f"Loading local model {LOCAL_LLM_REPO}/{LOCAL_LLM_FILE}...")
+            self.model = Llama.from_pretrained(repo_id=LOCAL_LLM_REPO, filename=LOCAL_LLM_FILE, **options)
+        self.model.set_cache(LlamaRAMCache(capacity_bytes=LOCAL_LLM_PREFIX_CACHE_BYTES))
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.rounds = 0
+        self.prefix_runs = 0
+        self.completion_tokens = 0
+        threading.Thread(target=self._schedule, name="local-llm", daemon=True).start()
+
+    def submit(self, messages, max_tokens, on_token, on_done):
+        request = _Request(messages, max_tokens, on_token, on_done)
+        self._queue.put(request)
+        return request
+
+    def _schedule(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < LOCAL_LLM_MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Stable sort: arrival order is kept within each prefix group
+            order = {}
+            for request in batch:
+                order.setdefault(request.prefix(), len(order))
+            batch.sort(key=lambda request: order[request.prefix()])
+            with self._stats_lock:
+                self.rounds += 1
+                self.requests += len(batch)
+                self.prefix_runs += len(batch) - len(order)
+            for request in batch:
+                self._run(request)
+
+    def _run(self, request):
+        if request.cancelled:
+            request.on_done(None)
+            return
+        error = None
+        tokens = 0
+        try:
+            stream = self.model.create_chat_completion(
+                messages=request.messages, max_tokens=request.max_tokens, stream=True
+            )
+            for chunk in stream:
+                if request.cancelled:
+                    break
+                token = chunk["choices"][0]["delta"].get("content")
+                if token:
+                    tokens += 1
+                    request.on_token(token)
+        except Exception as e:
+            logging.error(f"Local generation failed: {e}")
+            error = e
+        with self._stats_lock:
+            self.completion_tokens += tokens
+        request.on_done(error)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "rounds": self.rounds,
+                "avg_round_size": round(self.requests / self.rounds, 2) if self.rounds else 0.0,
+                "shared_prefix_runs": self.prefix_runs,
+                "completion_tokens": self.completion_tokens,
+                "queued": self._queue.qsize(),
+            }
+
+
+# Helper function to build a completion shaped like the Hugging Face client's response
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message={"role": "assistant", "content": text})])
+
+
+# Helper function to build a streamed chunk shaped like the Hugging Face client's chunks
+def _chunk(token):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+# Stand-in for InferenceClient: exposes chat.completions.create() on top of the local model
+class LocalClient:
+    def __init__(self, model):
+        self.model = model
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model=None, messages=None, max_tokens=1500, stream=False):
+        if stream:
+            return self._stream(messages, max_tokens)
+        future = Future()
+        tokens = []
+        self.model.submit(
+            messages, max_tokens, tokens.append,
+            lambda error: future.set_exception(error) if error else future.set_result(_completion("".join(tokens))),
+        )
+        return future.result()
+
+    def _stream(self, messages, max_tokens):
+        tokens = queue.Queue()
+        done = object()
+        request = self.model.submit(messages, max_tokens, tokens.put, lambda error: tokens.put((done, error)))
+        try:
+            while True:
+                item = tokens.get()
+                if isinstance(item, tuple) and item[0] is done:
+                    if item[1] is not None:
+                        raise item[1]
+                    return
+                yield _chunk(item)
+        finally:
+            request.cancelled = True
+
+
+# Stand-in for AsyncInferenceClient; tokens are handed to the event loop as the scheduler produces them
+class AsyncLocalClient:
+    def __init__(self, model):
+        self.model = model
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, model=None, messages=None, max_tokens=1500, stream=False):
+        if stream:
+            return self._stream(messages, max_tokens)
+        future = Future()
+        tokens = []
+        self.model.submit(
+            messages, max_tokens, tokens.append,
+            lambda error: future.set_exception(error) if error else future.set_result(_completion("".join(tokens))),
+        )
+        return await asyncio.wrap_future(future)
+
+    async def _stream(self, messages, max_tokens):
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        done = object()
+        request = self.model.submit(
+            messages, max_tokens,
+            lambda token: loop.call_soon_threadsafe(tokens.put_nowait, token),
+            lambda error: loop.call_soon_threadsafe(tokens.put_nowait, (done, error)),
+        )
+        try:
+            while True:
+                item = await tokens.get()
+                if isinstance(item, tuple) and item[0] is done:
+                    if item[1] is not None:
+                        raise item[1]
+                    return
+                yield _chunk(item)
+        finally:
+            request.cancelled = True
+
+
+_local_model = None
+_local_model_lock = threading.Lock()
+
+
+# Helper function to load the local model once per process
+def get_local_model(context_window):
+    global _local_model
+    if _local_model is None:
+        with _local_model_lock:
+            if _local_model is None:
+                _local_model = LocalModel(context_window)
+    return _local_model
+
+
+# Helper function to report scheduler metrics, or None when the local model is not loaded
+def local_stats():
+    return _local_model.stats() if _local_model is not None else None
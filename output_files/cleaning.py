@@ -1,30 +1,9 @@
-import json
-import re
-from bs4 import BeautifulSoup
-
-def clean_and_structure_text(input_text):
-    # Parse the text to remove HTML tags
-    soup = BeautifulSoup(input_text, "html.parser")
-    plain_text = soup.get_text()
-
-    # Remove extra whitespaces and normalize
-    plain_text = re.sub(r'\s+', ' ', plain_text).strip()
-
-    # Structure the content by splitting into sections
-    sections = re.split(r'\b(ISSUE NO\.\(\d+\)|\d+\.)', plain_text)
-    structured_text = []
-    current_section = []
-
-    for segment in sections:
-        if re.match(r'(ISSUE NO\.\(\d+\)|\d+\.)', segment):
-            if current_section:
-                structured_text.append(' '.join(current_section).strip())
-                current_section = []
-        current_section.append(segment)
-    if current_section:
-        structured_text.append(' '.join(current_section).strip())
-
-    return '\n\n'.join(structured_text)
+import os
+import sys
+
+# Cleaning and sectioning live in judgment_parser (one regex pass, no BeautifulSoup), shared with app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from judgment_parser import clean_and_structure_text
 
 # Update this path to the actual location of the file on your local system
 file_path = r"D:\AI-for-Law\output_files\readable_output.txt"
@@ -48,4 +27,3 @@ try:
 
 except FileNotFoundError:
     print(f"Error: File not found at {file_path}. Please check the file path and try again.")
-
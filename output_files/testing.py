@@ -1,25 +1,246 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
-# File paths
-ai_response_file = r"D:\AI-for-Law\output_files\ai_response.txt"
-cleaned_output_file = r"D:\AI-for-Law\output_files\cleaned_structured_output.txt"
+# Batch evaluation harness: runs a dataset of (query, reference judgment) pairs through the chat
+# pipeline, scores every response against every reference with one batched encode and one matrix
+# product, and writes per-sample, aggregate and latency stats to a JSON report. A previous report
+# can be passed as a baseline to fail the run when quality or latency regress.
+#
+# Dataset: JSON Lines, one object per sample with "query" and one of "reference" (text),
+# "reference_file" (path, relative to the dataset) or "reference_tid" (Kanoon document id).
+# An optional "response" is scored as is instead of running the pipeline.
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_directory)
 
-# Load content from files
-with open(ai_response_file, "r", encoding="utf-8") as file:
-    ai_response_text = file.read()
+import vector_index
 
-with open(cleaned_output_file, "r", encoding="utf-8") as file:
-    cleaned_output_text = file.read()
+output_directory = os.path.dirname(os.path.abspath(__file__))
+report_directory = os.path.join(output_directory, "eval")
 
-# Initialize SentenceTransformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
 
-# Compute embeddings
-embeddings = model.encode([ai_response_text, cleaned_output_text])
+# Helper function to read the dataset, resolving references given as files or Kanoon tids
+def load_dataset(path):
+    samples = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            if "reference" not in sample:
+                if "reference_file" in sample:
+                    reference_path = os.path.join(os.path.dirname(os.path.abspath(path)), sample["reference_file"])
+                    with open(reference_path, encoding="utf-8") as reference_file:
+                        sample["reference"] = reference_file.read()
+                elif "reference_tid" in sample:
+                    import kanoon_client
+                    import judgment_parser
 
-# Calculate cosine similarity
-similarity_score = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
+                    sample["reference"] = judgment_parser.payload_text(kanoon_client.fetch_doc(sample["reference_tid"]))
+                else:
+                    raise ValueError(f"Sample on line {line_number} has no reference, reference_file or reference_tid")
+            sample.setdefault("id", str(line_number))
+            samples.append(sample)
+    return samples
 
-# Print the similarity score
-print(f"Similarity Score: {similarity_score:.4f}")
+
+# Run one query through the chat pipeline (Kanoon retrieval, prompt packing, generation), timing each stage
+def run_pipeline(app, query, max_tokens):
+    import llm
+
+    started = time.perf_counter()
+    context = app.fetch_indian_kanoon_context(query)
+    retrieved = time.perf_counter()
+    messages = app.build_chat_messages(query, context)
+    response = llm.generate(app.client, messages, max_tokens=max_tokens)
+    finished = time.perf_counter()
+    return response, {
+        "retrieval_ms": (retrieved - started) * 1000,
+        "generation_ms": (finished - retrieved) * 1000,
+        "total_ms": (finished - started) * 1000,
+    }
+
+
+# Fill in each sample's response, generating the missing ones concurrently
+def generate_responses(samples, concurrency, max_tokens):
+    pending = [sample for sample in samples if "response" not in sample]
+    if not pending:
+        return 0.0
+    import app
+
+    def run(sample):
+        try:
+            sample["response"], sample["latency"] = run_pipeline(app, sample["query"], max_tokens)
+        except Exception as e:
+            sample["response"], sample["error"] = "", str(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, pending))
+    return time.perf_counter() - started
+
+
+# Encode many texts in one batch. Long texts are split into chunks (the encoder truncates at its
+# maximum sequence length) and their chunk vectors averaged, so a whole judgment counts, not its first page.
+def embed_texts(texts, chunk_words=vector_index.CHUNK_WORDS):
+    chunks, owners = [], []
+    for position, text in enumerate(texts):
+        pieces = vector_index.chunk_text(text, chunk_words, 0) or [""]
+        chunks.extend(pieces)
+        owners.extend([position] * len(pieces))
+    vectors = vector_index.encode(chunks)
+    pooled = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+    np.add.at(pooled, np.asarray(owners), vectors)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.where(norms == 0, 1, norms)
+
+
+# Score every response against every reference: the diagonal is each sample's similarity to its own
+# reference, and its rank within the row shows whether the response is closer to its reference than to the others
+def score(samples):
+    embeddings = embed_texts([sample["response"] for sample in samples] + [sample["reference"] for sample in samples])
+    responses, references = embeddings[:len(samples)], embeddings[len(samples):]
+    similarity = responses @ references.T
+    own = np.diag(similarity)
+    ranks = (similarity > own[:, None]).sum(axis=1) + 1
+    others = np.where(np.eye(len(samples), dtype=bool), -np.inf, similarity)
+    best_other = others.max(axis=1) if len(samples) > 1 else np.full(len(samples), np.nan)
+    return similarity, own, ranks, best_other
+
+
+# Helper function to summarize a list of values (latencies or scores)
+def summarize(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "min": round(ordered[0], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+# Build the report: one entry per sample, aggregate quality and latency stats, and the run settings
+def build_report(samples, similarity, own, ranks, best_other, generation_seconds, encode_seconds):
+    per_sample = []
+    for position, sample in enumerate(samples):
+        entry = {
+            "id": sample["id"],
+            "query": sample["query"],
+            "similarity": round(float(own[position]), 4),
+            "reference_rank": int(ranks[position]),
+            "margin": None if np.isnan(best_other[position]) else round(float(own[position] - best_other[position]), 4),
+            "response_words": len(sample["response"].split()),
+        }
+        if "latency" in sample:
+            entry["latency_ms"] = {name: round(value, 1) for name, value in sample["latency"].items()}
+        if "error" in sample:
+            entry["error"] = sample["error"]
+        per_sample.append(entry)
+
+    latencies = [sample["latency"] for sample in samples if "latency" in sample]
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "samples": len(samples),
+            "embedding_model": vector_index.VECTOR_MODEL,
+            "llm_backend": os.getenv("LLM_BACKEND", "hf"),
+        },
+        "aggregate": {
+            "similarity": summarize(own.tolist()),
+            "top1_accuracy": round(float((ranks == 1).mean()), 4),
+            "mean_reciprocal_rank": round(float((1.0 / ranks).mean()), 4),
+            "errors": sum(1 for sample in samples if "error" in sample),
+        },
+        "latency_ms": {
+            name: summarize([latency[name] for latency in latencies])
+            for name in ("retrieval_ms", "generation_ms", "total_ms")
+        } if latencies else {},
+        "throughput": {
+            "generated": len(latencies),
+            "generation_seconds": round(generation_seconds, 2),
+            "queries_per_second": round(len(latencies) / generation_seconds, 3) if generation_seconds else None,
+            "encode_seconds": round(encode_seconds, 2),
+        },
+        "samples": per_sample,
+        "similarity_matrix": np.round(similarity, 4).tolist(),
+    }
+
+
+# Compare a report with a baseline; returns the list of regressions beyond the allowed drop/slowdown
+def compare(report, baseline, max_drop, max_slowdown):
+    regressions = []
+    mean, baseline_mean = report["aggregate"]["similarity"]["mean"], baseline["aggregate"]["similarity"]["mean"]
+    if mean < baseline_mean - max_drop:
+        regressions.append(f"mean similarity fell from {baseline_mean:.4f} to {mean:.4f}")
+    p95 = report["latency_ms"].get("total_ms", {}).get("p95")
+    baseline_p95 = baseline.get("latency_ms", {}).get("total_ms", {}).get("p95")
+    if p95 and baseline_p95 and p95 > baseline_p95 * (1 + max_slowdown):
+        regressions.append(f"p95 latency rose from {baseline_p95:.0f} ms to {p95:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate chat answers against reference judgments in batch.")
+    parser.add_argument("dataset", nargs="?", help="JSON Lines file of {query, reference | reference_file | reference_tid}")
+    parser.add_argument("--response-file", help="score one saved response instead of a dataset")
+    parser.add_argument("--reference-file", help="reference judgment for --response-file")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    parser.add_argument("--report", help="report path (default output_files/eval/report-<time>.json)")
+    parser.add_argument("--baseline", help="previous report to regression-test against")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="allowed fall in mean similarity")
+    parser.add_argument("--max-slowdown", type=float, default=0.2, help="allowed relative rise in p95 latency")
+    args = parser.parse_args()
+
+    if args.response_file:
+        with open(args.response_file, encoding="utf-8") as file:
+            response = file.read()
+        with open(args.reference_file or os.path.join(output_directory, "cleaned_structured_output.txt"), encoding="utf-8") as file:
+            samples = [{"id": "1", "query": "", "response": response, "reference": file.read()}]
+    elif args.dataset:
+        samples = load_dataset(args.dataset)
+    else:
+        parser.error("pass a dataset, or --response-file (and --reference-file)")
+    if not samples:
+        parser.error("the dataset is empty")
+
+    generation_seconds = generate_responses(samples, args.concurrency, args.max_tokens)
+    started = time.perf_counter()
+    similarity, own, ranks, best_other = score(samples)
+    encode_seconds = time.perf_counter() - started
+    report = build_report(samples, similarity, own, ranks, best_other, generation_seconds, encode_seconds)
+
+    report_path = args.report or os.path.join(report_directory, f"report-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+
+    aggregate = report["aggregate"]
+    print(f"Samples: {len(samples)}  errors: {aggregate['errors']}")
+    print(f"Similarity: mean {aggregate['similarity']['mean']:.4f}  p50 {aggregate['similarity']['p50']:.4f}  "
+          f"min {aggregate['similarity']['min']:.4f}")
+    print(f"Top-1 reference match: {aggregate['top1_accuracy']:.2%}  MRR: {aggregate['mean_reciprocal_rank']:.4f}")
+    if report["latency_ms"]:
+        total = report["latency_ms"]["total_ms"]
+        print(f"Latency: mean {total['mean']:.0f} ms  p50 {total['p50']:.0f} ms  p95 {total['p95']:.0f} ms")
+    print(f"Report written to {report_path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(report, json.load(file), args.max_drop, args.max_slowdown)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
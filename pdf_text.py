@@ -0,0 +1,141 @@
+import io
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+import PyPDF2
+from kanoon_cache import TTLCache
+
+# PDFs with at least this many pages are extracted across a process pool, PDF_PAGES_PER_TASK pages per task
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 40))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_TEXT_TTL = int(os.getenv("PDF_TEXT_TTL", 30 * 24 * 60 * 60))
+
+# Extracted page texts keyed by the SHA-256 of the uploaded file, so re-uploads skip extraction
+page_cache = TTLCache("pdf_pages", ttl=PDF_TEXT_TTL)
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+# Helper function to get the shared process pool, starting it on first use
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # Workers then share this process's resource tracker, which the parent's unlink of
+                # each shared memory block updates, instead of each starting one of their own
+                resource_tracker.ensure_running()
+                _process_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _process_pool
+
+
+# Helper function to hash file content for the page cache
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Read-only file object over a buffer (the shared memory holding a PDF), so PyPDF2 can parse it
+# without copying it into a BytesIO
+class BufferStream(io.RawIOBase):
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._buffer)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, target):
+        chunk = self._buffer[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+# Extract the text of pages [start, stop) of a PDF held in the shared memory block `name`; runs in
+# a worker process for large files. The block is attached, not copied, and nothing is kept once
+# the range is extracted, so a finished document does not stay in the worker's memory.
+def extract_page_range(name, size, start, stop):
+    block = shared_memory.SharedMemory(name=name)
+    buffer = block.buf[:size]
+    try:
+        pdf_reader = PyPDF2.PdfReader(BufferStream(buffer))
+        texts = [pdf_reader.pages[number].extract_text() or "" for number in range(start, stop)]
+        del pdf_reader
+        return texts
+    finally:
+        buffer.release()
+        block.close()
+
+
+# Generator yielding the text of each page of a PDF in order, extracting pages only as they are
+# consumed. Large PDFs are extracted in page ranges across the process pool unless `parallel` is
+# off. A fully consumed document is cached by content hash, and cached documents are served from it.
+def iter_pdf_pages(data, parallel=True):
+    key = content_hash(data)
+    cached = page_cache.get(key)
+    if cached is not None:
+        yield from cached
+        return
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(pdf_reader.pages)
+    pages = []
+    if parallel and PDF_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        starts = range(0, page_count, PDF_PAGES_PER_TASK)
+        stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+        logging.info(f"Extracting {page_count} PDF pages across {PDF_WORKERS} processes...")
+        # The PDF is copied once into shared memory that every task attaches to, instead of each task
+        # pickling its bytes; the block is freed as soon as extraction ends or the consumer stops
+        block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            block.buf[:len(data)] = data
+            names, sizes = [block.name] * len(stops), [len(data)] * len(stops)
+            for texts in get_process_pool().map(extract_page_range, names, sizes, starts, stops):
+                for text in texts:
+                    pages.append(text)
+                    yield text
+        finally:
+            block.close()
+            block.unlink()
+    else:
+        for page in pdf_reader.pages:
+            text = page.extract_text() or ""
+            pages.append(text)
+            yield text
+    page_cache.set(key, pages)
+
+
+# Helper function to extract the full text of a PDF
+def extract_pdf_text(data):
+    return "\n".join(iter_pdf_pages(data))
+
+
+# Helper function to extract only the first pages of a PDF, until at least `limit` characters are read
+def extract_pdf_lead(data, limit=500):
+    text = ""
+    for page_text in iter_pdf_pages(data, parallel=False):
+        text += page_text
+        if len(text) >= limit:
+            break
+    return text
+
+
+# Helper function to report page cache metrics
+def cache_stats():
+    return page_cache.stats()
@@ -0,0 +1,104 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# How long a backend is assumed to keep an evaluated prefix (vLLM/TGI prefix caches and the local
+# llama.cpp state cache evict under memory pressure), and how many recent prompts are compared per system prompt
+PREFIX_CACHE_TTL = int(os.getenv("PREFIX_CACHE_TTL", 10 * 60))
+PREFIX_CACHE_RECENT_PROMPTS = int(os.getenv("PREFIX_CACHE_RECENT_PROMPTS", 8))
+PREFIX_CACHE_MAX_SYSTEM_PROMPTS = 64
+
+
+# Tracks how much of each prompt repeats a recently sent prompt, i.e. the prefill a prefix (KV)
+# cache can skip: the system prompt plus the longest common start of the user message. Backends
+# that report cached prompt tokens (OpenAI-style usage.prompt_tokens_details.cached_tokens) are
+# counted separately, so the estimate can be checked against what the server actually reused.
+class PrefixTracker:
+    def __init__(self, ttl=PREFIX_CACHE_TTL, recent_prompts=PREFIX_CACHE_RECENT_PROMPTS,
+                 max_system_prompts=PREFIX_CACHE_MAX_SYSTEM_PROMPTS):
+        self.ttl = ttl
+        self.recent_prompts = recent_prompts
+        self.max_system_prompts = max_system_prompts
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.reusable_tokens = 0
+        self.reported_requests = 0
+        self.reported_cached_tokens = 0
+
+    # Helper function to split messages into the system prompt and the rest of the prompt
+    @staticmethod
+    def _split(messages):
+        if messages and messages[0]["role"] == "system":
+            return messages[0]["content"], "\n".join(message["content"] for message in messages[1:])
+        return "", "\n".join(message["content"] for message in messages)
+
+    # Record one prompt sent to the backend; returns the estimated reusable prefix in tokens
+    def record(self, messages, cached_tokens=None):
+        import prompt_builder
+
+        system_prompt, rest = self._split(messages)
+        key = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = OrderedDict()
+                while len(self._recent) > self.max_system_prompts:
+                    self._recent.popitem(last=False)
+            self._recent.move_to_end(key)
+            for text, seen_at in list(recent.items()):
+                if now - seen_at > self.ttl:
+                    del recent[text]
+            warm = list(recent)
+            recent[rest] = now
+            recent.move_to_end(rest)
+            while len(recent) > self.recent_prompts:
+                recent.popitem(last=False)
+
+        reusable = 0
+        if warm:
+            shared = max((os.path.commonprefix([rest, text]) for text in warm), key=len)
+            reusable = prompt_builder.count_tokens(system_prompt) + (prompt_builder.count_tokens(shared) if shared else 0)
+        total = prompt_builder.count_tokens(system_prompt) + prompt_builder.count_tokens(rest)
+        reusable = min(reusable, total)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += total
+            self.reusable_tokens += reusable
+            if cached_tokens is not None:
+                self.reported_requests += 1
+                self.reported_cached_tokens += cached_tokens
+        return reusable
+
+    # The reusable figures are this process's estimate of what a prefix cache could skip; only the
+    # confirmed figures come from the backend, and only for backends that report cached tokens
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "prefill_tokens_reusable_estimate": self.reusable_tokens,
+                "prefill_tokens_reusable_estimate_per_request":
+                    round(self.reusable_tokens / self.requests, 1) if self.requests else 0.0,
+                "prefill_reusable_estimate_rate":
+                    round(self.reusable_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                "reported_requests": self.reported_requests,
+                "prefill_tokens_cached_confirmed": self.reported_cached_tokens,
+                "prefill_tokens_cached_confirmed_per_request":
+                    round(self.reported_cached_tokens / self.reported_requests, 1) if self.reported_requests else None,
+            }
+
+
+# Helper function to read the cached prompt tokens a backend reports in its usage block, if any
+def reported_cached_tokens(completion):
+    usage = getattr(completion, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+    if details is None:
+        return None
+    if isinstance(details, dict):
+        return details.get("cached_tokens")
+    return getattr(details, "cached_tokens", None)
@@ -0,0 +1,151 @@
+import os
+import re
+import inspect
+import logging
+import threading
+import llm
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+# Tokenizer used for counting: a local tokenizer.json path or a Hub model id (defaults to the served model)
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", llm.MODEL_ID)
+
+# Tokens added by the chat template around every message, and a margin for tokens merged across
+# section boundaries once the sections are joined into one prompt
+MESSAGE_OVERHEAD_TOKENS = 5
+PROMPT_OVERHEAD_TOKENS = 4
+SAFETY_MARGIN_TOKENS = 16
+
+# Never ask for fewer new tokens than this, even when the prompt nearly fills the window
+MIN_NEW_TOKENS = 256
+
+# Size of the document excerpt used as an Indian Kanoon search query
+KANOON_QUERY_TOKENS = int(os.getenv("KANOON_QUERY_TOKENS", 128))
+
+_horizontal_space_re = re.compile(r"[ \t\r\f\v\u00a0]+")
+_blank_lines_re = re.compile(r"\n\s*\n\s*")
+
+_tokenizer = None
+_tokenizer_failed = False
+_tokenizer_lock = threading.Lock()
+
+
+# Helper function to load the model tokenizer once; returns None when it is not available
+def get_tokenizer():
+    global _tokenizer, _tokenizer_failed
+    if _tokenizer is None and not _tokenizer_failed and Tokenizer is not None:
+        with _tokenizer_lock:
+            if _tokenizer is None and not _tokenizer_failed:
+                try:
+                    if os.path.exists(LLM_TOKENIZER):
+                        _tokenizer = Tokenizer.from_file(LLM_TOKENIZER)
+                    else:
+                        _tokenizer = Tokenizer.from_pretrained(LLM_TOKENIZER, token=os.getenv("HF_API_KEY"))
+                    logging.info(f"Loaded tokenizer {LLM_TOKENIZER}.")
+                except Exception as e:
+                    _tokenizer_failed = True
+                    logging.warning(f"Could not load tokenizer {LLM_TOKENIZER}, estimating token counts: {e}")
+    return _tokenizer
+
+
+# Helper function to estimate tokens without a tokenizer. Devanagari and other non-ASCII text
+# splits into far more tokens per character than English, so it is counted separately and
+# the estimate errs on the side of overcounting.
+def estimate_tokens(text):
+    ascii_characters = len(text.encode("ascii", "ignore"))
+    return int((ascii_characters * 0.25) + (len(text) - ascii_characters) * 0.67) + 1
+
+
+# Helper function to count the tokens of a piece of text
+def count_tokens(text):
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+# Helper function to cut text down to at most `max_tokens`; returns (text, token count)
+def fit_tokens(text, max_tokens):
+    if not text or max_tokens <= 0:
+        return "", 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        tokens = estimate_tokens(text)
+        if tokens <= max_tokens:
+            return text, tokens
+        cost = 1.0
+        end = 0
+        for end, character in enumerate(text):
+            step = 0.25 if character < "\x80" else 0.67
+            if cost + step > max_tokens:
+                break
+            cost += step
+        tokens = int(cost)
+    else:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= max_tokens:
+            return text, len(encoding.ids)
+        end, tokens = encoding.offsets[max_tokens - 1][1], max_tokens
+    # Prefer to stop at a word boundary rather than in the middle of a word
+    boundary = text.rfind(" ", 0, end)
+    if boundary > end // 2:
+        end = boundary
+    return text[:end].rstrip(), tokens
+
+
+# Helper function to cut text down to at most `max_tokens`
+def truncate_to_tokens(text, max_tokens):
+    return fit_tokens(text, max_tokens)[0]
+
+
+# Helper function to collapse runs of spaces and blank lines that only cost tokens
+def compact_whitespace(text):
+    lines = (_horizontal_space_re.sub(" ", line).strip() for line in text.split("\n"))
+    return _blank_lines_re.sub("\n\n", "\n".join(lines)).strip()
+
+
+# Helper function to take the opening of a document as an Indian Kanoon search query
+def lead_excerpt(text, max_tokens=KANOON_QUERY_TOKENS):
+    return truncate_to_tokens(compact_whitespace(text), max_tokens)
+
+
+# Assemble the system and user messages for a prompt template so the prompt plus `max_new_tokens`
+# fits the model's context window. `sections` fills the template's placeholders and is packed in
+# insertion order (highest priority first): each section takes what it needs from the remaining
+# budget, up to its cap in `caps`, and the last sections are truncated when the budget runs out.
+# Returns (messages, max_new_tokens).
+def pack_messages(system_prompt, template, sections, max_new_tokens=1500, caps=None,
+                  context_window=llm.LLM_CONTEXT_WINDOW):
+    caps = caps or {}
+    template = inspect.cleandoc(template)
+    fixed_tokens = (
+        count_tokens(system_prompt)
+        + count_tokens(template.format(**{name: "" for name in sections}))
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+        + PROMPT_OVERHEAD_TOKENS
+        + SAFETY_MARGIN_TOKENS
+    )
+    reserved = max(MIN_NEW_TOKENS, min(max_new_tokens, context_window - fixed_tokens))
+    remaining = context_window - fixed_tokens - reserved
+
+    packed = {}
+    used = fixed_tokens
+    for name, text in sections.items():
+        budget = min(remaining, caps.get(name, remaining))
+        text = compact_whitespace(text or "")
+        packed[name], tokens = fit_tokens(text, budget)
+        remaining -= tokens
+        used += tokens
+        if len(packed[name]) < len(text):
+            logging.info(f"Prompt section '{name}' truncated to {tokens} tokens.")
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": template.format(**packed)},
+    ]
+    return messages, max(MIN_NEW_TOKENS, min(max_new_tokens, context_window - used))
@@ -0,0 +1,146 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import vector_index
+from kanoon_cache import normalize_query
+
+# Minimum cosine similarity for a past answer to be reused, plus TTL (seconds) and size per language
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 24 * 60 * 60))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+
+
+# One language partition: LRU-ordered entries plus a lazily rebuilt embedding matrix
+class _Partition:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.matrix = None
+        self.keys = []
+
+    def vectors(self):
+        if self.matrix is None:
+            self.keys = [key for key, entry in self.entries.items() if entry["vector"] is not None]
+            self.matrix = (
+                np.stack([self.entries[key]["vector"] for key in self.keys]) if self.keys else None
+            )
+        return self.keys, self.matrix
+
+
+# Cache of generated answers looked up by embedding similarity of the incoming query
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Helper function to embed a query, or None when the embedding model is not installed
+    def _embed(self, query):
+        if not vector_index.available():
+            return None
+        try:
+            return vector_index.encode([query])[0]
+        except Exception as e:
+            logging.warning(f"Semantic cache could not embed query: {e}")
+            return None
+
+    def _expire(self, partition, now):
+        expired = [key for key, entry in partition.entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del partition.entries[key]
+        if expired:
+            partition.matrix = None
+
+    # Return (value, vector): the cached value is None on a miss; pass the vector back to store()
+    def lookup(self, query, language="en"):
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get(language)
+            if partition is not None:
+                self._expire(partition, now)
+                entry = partition.entries.get(key)
+                if entry is not None:
+                    partition.entries.move_to_end(key)
+                    self.hits += 1
+                    self.exact_hits += 1
+                    return entry["value"], entry["vector"]
+            if partition is None or not partition.entries:
+                self.misses += 1
+                return None, None
+
+        vector = self._embed(query)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        with self._lock:
+            keys, matrix = partition.vectors()
+            if matrix is not None:
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold and keys[best] in partition.entries:
+                    partition.entries.move_to_end(keys[best])
+                    self.hits += 1
+                    logging.info(f"Semantic cache hit ({scores[best]:.3f}) for query: {query[:80]}")
+                    return partition.entries[keys[best]]["value"], vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, query, value, language="en", vector=None):
+        if vector is None:
+            vector = self._embed(query)
+        key = normalize_query(query)
+        with self._lock:
+            partition = self._partitions.setdefault(language, _Partition())
+            partition.entries.pop(key, None)
+            partition.entries[key] = {"value": value, "vector": vector, "expires_at": time.time() + self.ttl}
+            while len(partition.entries) > self.max_entries:
+                partition.entries.popitem(last=False)
+                self.evictions += 1
+            partition.matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "partitions": {language: len(partition.entries) for language, partition in self._partitions.items()},
+            }
+
+
+# Shared cache used by the chat paths of every entry point
+response_cache = SemanticCache()
+
+
+# Helper function to look up a cached answer; returns (value, vector) and (None, None) when disabled
+def lookup(query, language="en"):
+    if not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    return response_cache.lookup(query, language)
+
+
+# Helper function to remember a generated answer for later near-duplicate queries
+def store(query, value, language="en", vector=None):
+    if SEMANTIC_CACHE_ENABLED and value:
+        response_cache.store(query, value, language, vector)
+
+
+# Helper function to report hit-rate metrics
+def cache_stats():
+    return response_cache.stats()
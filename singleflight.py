@@ -0,0 +1,270 @@
+import asyncio
+import weakref
+import threading
+from concurrent.futures import Future
+
+
+# Coalesces concurrent calls with the same key: the first caller (the leader) runs the function,
+# callers arriving while it is in flight wait for and share its result or exception. Nothing is
+# remembered once the call finishes; caching is left to the callers.
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                leader = False
+            else:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+                leader = True
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    # Generator variant: the first caller starts a producer thread that iterates `fn(*args)` into a
+    # buffer, and every caller (the first included) replays that buffer at its own pace. No caller
+    # owns the upstream stream, so one client disconnecting does not end it for the others; it is
+    # closed once every subscriber has gone.
+    def stream(self, key, fn, *args, **kwargs):
+        with self._lock:
+            flight = self._calls.get(key)
+            if flight is not None and flight.subscribe():
+                self.shared += 1
+            else:
+                flight = self._calls[key] = _StreamFlight()
+                flight.subscribe()
+                self.leaders += 1
+                threading.Thread(
+                    target=self._produce, args=(key, flight, fn, args, kwargs), name=f"{self.name}-stream", daemon=True
+                ).start()
+        return flight.reader()
+
+    def _produce(self, key, flight, fn, args, kwargs):
+        iterator = fn(*args, **kwargs)
+        try:
+            for item in iterator:
+                if not flight.append(item):
+                    break
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._calls.get(key) is flight:
+                    del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            calls = self.leaders + self.shared
+            return {
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "shared_rate": round(self.shared / calls, 4) if calls else 0.0,
+                "in_flight": len(self._calls),
+            }
+
+
+# Items produced so far by a shared stream, its completion state and how many callers are reading it
+class _StreamFlight:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._condition = threading.Condition()
+
+    # Join the stream; False once every earlier subscriber has left, since the producer is stopping
+    def subscribe(self):
+        with self._condition:
+            if self.subscribers == 0 and (self.items or self.done):
+                return False
+            self.subscribers += 1
+            return True
+
+    # Replay generator holding one subscription, released once when it finishes or is closed, or
+    # when it is garbage collected; a generator that is never started runs no `finally`, so an
+    # unread one would otherwise keep the producer going until the stream ends
+    def reader(self):
+        released = []
+
+        def release():
+            with self._condition:
+                if not released:
+                    released.append(True)
+                    self.subscribers -= 1
+
+        items = self.replay(release)
+        weakref.finalize(items, release)
+        return items
+
+    # Buffer one item; returns False when nobody is reading any more, so the producer can stop
+    def append(self, item):
+        with self._condition:
+            self.items.append(item)
+            self._condition.notify_all()
+            return self.subscribers > 0
+
+    def finish(self, error=None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def replay(self, release):
+        position = 0
+        try:
+            while True:
+                with self._condition:
+                    while position >= len(self.items) and not self.done:
+                        self._condition.wait()
+                    items = self.items[position:]
+                    done, error = self.done, self.error
+                yield from items
+                position += len(items)
+                if done and position >= len(self.items):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            release()
+
+
+# asyncio variant for the ASGI app: followers await the leader's task. Keys are tracked per
+# event loop, since a task cannot be awaited from another loop.
+class AsyncSingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, coroutine_fn, *args, **kwargs):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+        self.leaders += 1
+        task = calls[key] = asyncio.ensure_future(coroutine_fn(*args, **kwargs))
+        task.add_done_callback(lambda _: calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    # Async generator variant of SingleFlight.stream(): a producer task owned by no caller fills the
+    # buffer and every caller replays it
+    def stream(self, key, fn, *args, **kwargs):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        flight = calls.get(key)
+        if flight is not None and flight.subscribe():
+            self.shared += 1
+        else:
+            flight = calls[key] = _AsyncStreamFlight()
+            flight.subscribe()
+            self.leaders += 1
+            flight.task = asyncio.ensure_future(self._produce(calls, key, flight, fn, args, kwargs))
+        return flight.reader()
+
+    async def _produce(self, calls, key, flight, fn, args, kwargs):
+        iterator = fn(*args, **kwargs)
+        try:
+            async for item in iterator:
+                if not flight.append(item):
+                    break
+            flight.finish()
+        except asyncio.CancelledError:
+            flight.finish(RuntimeError("Shared stream was cancelled"))
+            raise
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            await iterator.aclose()
+            if calls.get(key) is flight:
+                del calls[key]
+
+    def stats(self):
+        calls = self.leaders + self.shared
+        return {
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "shared_rate": round(self.shared / calls, 4) if calls else 0.0,
+            "in_flight": sum(len(loop_calls) for loop_calls in self._calls.values()),
+        }
+
+
+# Async counterpart of _StreamFlight; `updated` is set (and replaced) whenever the stream changes
+class _AsyncStreamFlight:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self.updated = asyncio.Event()
+
+    def subscribe(self):
+        if self.subscribers == 0 and (self.items or self.done):
+            return False
+        self.subscribers += 1
+        return True
+
+    # Async replay generator holding one subscription, released as in _StreamFlight.reader()
+    def reader(self):
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self.subscribers -= 1
+
+        items = self.replay(release)
+        weakref.finalize(items, release)
+        return items
+
+    def _notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def append(self, item):
+        self.items.append(item)
+        self._notify()
+        return self.subscribers > 0
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def replay(self, release):
+        position = 0
+        try:
+            while True:
+                updated = self.updated
+                items = self.items[position:]
+                position += len(items)
+                for item in items:
+                    yield item
+                if self.done and position >= len(self.items):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                if position >= len(self.items):
+                    await updated.wait()
+        finally:
+            release()
@@ -1,6 +1,57 @@
 // Add loading animation HTML and CSS
 const loadingHTML = `<div class="loading-spinner"></div>`;
 
+// Read an NDJSON streaming response and render the markdown incrementally as tokens arrive
+async function renderStreamedResponse(response, responseContainer) {
+    if (!response.ok || !response.body) {
+        const data = await response.json();
+        responseContainer.textContent = "Error: " + (data.error || "Unknown error occurred.");
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let markdownResponse = "";
+    let renderFrame = null;
+
+    const render = () => {
+        renderFrame = null;
+        responseContainer.innerHTML = marked.parse(markdownResponse);
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+            if (event.error) {
+                // Cancel a pending render so it cannot overwrite the error with the partial answer
+                if (renderFrame !== null) cancelAnimationFrame(renderFrame);
+                responseContainer.textContent = "Error: " + event.error;
+                return;
+            }
+            if (event.status === "summarizing" && !markdownResponse) {
+                responseContainer.innerHTML = loadingHTML +
+                    `<p>Reading section ${event.done} of ${event.total}...</p>`;
+            }
+            if (event.token) {
+                markdownResponse += event.token;
+                if (renderFrame === null) {
+                    renderFrame = requestAnimationFrame(render);
+                }
+            }
+        }
+    }
+    if (renderFrame !== null) cancelAnimationFrame(renderFrame);
+    render();
+}
+
 // Handle query submission
 document.getElementById('submit-query').addEventListener('click', async function () {
     const query = document.getElementById('query').value.trim();
@@ -15,7 +66,7 @@ document.getElementById('submit-query').addEventListener('click', async function
     responseContainer.innerHTML = loadingHTML;
 
     try {
-        const response = await fetch("/chat", {
+        const response = await fetch("/chat?stream=1", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -23,13 +74,7 @@ document.getElementById('submit-query').addEventListener('click', async function
             body: JSON.stringify({ query }),
         });
 
-        const data = await response.json();
-        if (response.ok && data.response) {
-            const markdownResponse = data.response;
-            responseContainer.innerHTML = marked.parse(markdownResponse);
-        } else {
-            responseContainer.textContent = "Error: " + (data.error || "Unknown error occurred.");
-        }
+        await renderStreamedResponse(response, responseContainer);
     } catch (error) {
         responseContainer.textContent = "Error: " + error.message;
     }
@@ -57,18 +102,12 @@ document.getElementById('file-upload').addEventListener('change', async function
     formData.append("file", file);
 
     try {
-        const response = await fetch("/analyze", {
+        const response = await fetch("/analyze?stream=1", {
             method: "POST",
             body: formData,
         });
 
-        const data = await response.json();
-        if (response.ok && data.analysis) {
-            const markdownResponse = data.analysis;
-            responseContainer.innerHTML = marked.parse(markdownResponse);
-        } else {
-            responseContainer.textContent = "Error: " + (data.error || "Unknown error occurred.");
-        }
+        await renderStreamedResponse(response, responseContainer);
     } catch (error) {
         responseContainer.textContent = "Error: " + error.message;
     }
@@ -1,14 +1,19 @@
 import os
-import json
-import requests
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
-import tempfile
-import PyPDF2
 import docx
 from werkzeug.utils import secure_filename
+from kanoon_cache import cache_stats
+import kanoon_client
+from kanoon_client import KanoonError
+from judgment_store import judgment_store
+from local_index import document_body
+from pdf_text import extract_pdf_text
+from uploads import open_upload, read_upload, iter_decoded
+import prompt_builder
+import document_analysis
+import llm
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -21,8 +26,8 @@ load_dotenv()
 hf_api_key = os.getenv("HF_API_KEY")
 indian_kanoon_api_key = os.getenv("INDIAN_KANOON_API_KEY")
 
-# Initialize Hugging Face Inference Client
-client = InferenceClient(api_key=hf_api_key)
+# Initialize the inference client for the configured LLM backend
+client = llm.create_client()
 
 # Directory to save response files
 output_directory = os.path.abspath("output_files")
@@ -50,18 +55,14 @@ def allowed_file(filename):
 def extract_text_from_file(file, filename):
     try:
         file_extension = filename.rsplit('.', 1)[1].lower()
+        upload = open_upload(file)
         if file_extension == 'pdf':
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = "".join([page.extract_text() for page in pdf_reader.pages])
+            text = extract_pdf_text(read_upload(upload))
         elif file_extension in ['doc', 'docx']:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-                temp_file.write(file.read())
-                temp_file.close()
-                doc = docx.Document(temp_file.name)
-                text = "\n".join([para.text for para in doc.paragraphs])
-            os.unlink(temp_file.name)
+            doc = docx.Document(upload)
+            text = "\n".join([para.text for para in doc.paragraphs])
         elif file_extension == 'txt':
-            text = file.read().decode('utf-8')
+            text = "".join(iter_decoded(upload))
         else:
             raise ValueError("Unsupported file format")
         return text
@@ -71,37 +72,21 @@ def extract_text_from_file(file, filename):
 # Helper function to fetch legal information from Indian Kanoon
 def fetch_indian_kanoon_info(query):
     try:
-        url = "https://api.indiankanoon.org/search/"
-        params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-        response = requests.post(url, params=params, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            relevant_info = [
-                f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
-                for doc in data.get('docs', [])[:1]
-            ]
-            return "\n".join(relevant_info)
-        else:
-            return "Unable to fetch information from Indian Kanoon API."
+        data = kanoon_client.search(query)
+        relevant_info = [
+            f"Title: {doc.get('title', '')}\nSnippet: {doc.get('snippet', '')}\n"
+            for doc in kanoon_client.top_docs(data)
+        ]
+        return "\n".join(relevant_info)
+    except KanoonError:
+        return "Unable to fetch information from Indian Kanoon API."
     except Exception as e:
         return f"Error fetching Indian Kanoon info: {e}"
 
 # Helper function to fetch the top document's context
 def fetch_indian_kanoon_context(query):
     try:
-        search_url = "https://api.indiankanoon.org/search/"
-        search_params = {"formInput": query, "filter": "on", "pagenum": 1}
-        headers = {"Authorization": f"Token {indian_kanoon_api_key}"}
-
-        search_response = requests.post(search_url, params=search_params, headers=headers)
-        search_response.raise_for_status()
-        search_data = search_response.json()
-
-        # Save search_response.json
-        search_file_path = os.path.join(output_directory, "search_response.json")
-        with open(search_file_path, "w") as file:
-            json.dump(search_data, file, indent=4)
+        search_data = kanoon_client.search(query)
 
         # Get the first document's ID (tid)
         docs = search_data.get("docs", [])
@@ -110,17 +95,13 @@ def fetch_indian_kanoon_context(query):
         docid = docs[0].get("tid")
 
         # Fetch the document context
-        context_url = f"https://api.indiankanoon.org/doc/{docid}/"
-        context_response = requests.post(context_url, headers=headers)
-        context_response.raise_for_status()
-        context_data = context_response.json()
+        context_data = kanoon_client.fetch_doc(docid)
 
-        # Save response_context.json
-        context_file_path = os.path.join(output_directory, "response_context.json")
-        with open(context_file_path, "w") as file:
-            json.dump(context_data, file, indent=4)
+        # Append the fetched judgment to the judgment store (written in the background)
+        judgment_store.record_judgment(context_data)
 
-        return context_data.get("content", "No content found in the document context.")
+        # Kanoon /doc/ payloads carry the judgment under "doc"; document_body() reads it as plain text
+        return document_body(context_data) or "No content found in the document context."
     except Exception as e:
         return f"Error fetching Indian Kanoon context: {e}"
 
@@ -132,6 +113,10 @@ def index():
 def ai_help():
     return render_template('feature.html')
 
+@app.route("/metrics")
+def metrics():
+    return jsonify({"kanoon_cache": cache_stats(), "kanoon_client": kanoon_client.client_stats()})
+
 @app.route("/chat", methods=["POST"])
 def chatbot_response():
     query = request.json.get("query", "")
@@ -162,13 +147,13 @@ def analyze_document():
     filename = secure_filename(file.filename)
     try:
         document_text = extract_text_from_file(file, filename)
-        kanoon_info = fetch_indian_kanoon_info(document_text[:500])
+        kanoon_info = fetch_indian_kanoon_info(prompt_builder.lead_excerpt(document_text))
+        document_text = document_analysis.condense_document(client, document_text)
 
-        # Ensure the input is within token limits
-        analysis_prompt = f"""Analyze the following legal document and provide a comprehensive summary, highlighting relevant legal sections:
+        analysis_prompt = """Analyze the following legal document and provide a comprehensive summary, highlighting relevant legal sections:
 
         Document Content:
-        {document_text[:2000]}  # Truncate content if necessary to fit token limit
+        {document_text}
 
         Relevant Indian Kanoon Information:
         {kanoon_info}
@@ -181,22 +166,15 @@ def analyze_document():
         5. Any areas of ambiguity or potential legal challenges
         6. Recommendations for further legal review or action, if necessary."""
 
-        messages = [
-            {"role": "system", "content": system_template},
-            {"role": "user", "content": analysis_prompt}
-        ]
-
-        # Adjust max_tokens to fit within limit
-        max_allowed_tokens = 4096 - len(analysis_prompt.split())
-        max_new_tokens = min(1500, max_allowed_tokens)
-
-        completion = client.chat.completions.create(
-            model="meta-llama/Llama-3.2-3B-Instruct",
-            messages=messages,
-            max_tokens=max_new_tokens
+        # Pack the Kanoon information and as much of the document as fits into the context window
+        messages, max_new_tokens = prompt_builder.pack_messages(
+            system_template,
+            analysis_prompt,
+            {"kanoon_info": kanoon_info, "document_text": document_text},
+            max_new_tokens=1500,
         )
 
-        analysis_content = completion.choices[0].message["content"]
+        analysis_content = document_analysis.generate_analysis(client, messages, max_new_tokens)
         return jsonify({"analysis": analysis_content})
     except Exception as e:
         return jsonify({"error": f"Error analyzing document: {e}"}), 500
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Keep every store the modules open at import time out of the repo's output_files
+_store_directory = tempfile.mkdtemp(prefix="legal-ai-tests-")
+for name, path in {
+    "KANOON_CACHE_DIR": "cache",
+    "JOBS_DB": "jobs.sqlite3",
+    "JUDGMENT_STORE_DB": os.path.join("store", "judgments.sqlite3"),
+    "ENTITY_INDEX_DB": os.path.join("index", "entities.sqlite3"),
+    "CITATION_GRAPH_DIR": os.path.join("index", "graph"),
+    "LOCAL_INDEX_DIR": os.path.join("index", "bm25"),
+    "VECTOR_INDEX_DIR": os.path.join("index", "vectors"),
+}.items():
+    os.environ.setdefault(name, os.path.join(_store_directory, path))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
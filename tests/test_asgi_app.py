@@ -0,0 +1,17 @@
+import os
+import sys
+import subprocess
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_asgi_app_does_not_import_the_flask_app():
+    # A fresh interpreter, so modules imported by other tests do not leak in
+    script = (
+        "import sys, threading, asgi_app\n"
+        "assert 'app' not in sys.modules\n"
+        "assert not any(thread.name.startswith('job-worker') for thread in threading.enumerate())\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=repo_directory, env=os.environ.copy(),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
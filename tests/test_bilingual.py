@@ -0,0 +1,58 @@
+import bilingual
+
+ENGLISH = "1. The appeal is allowed.\n\n2. Costs are awarded."
+HINDI = "1. अपील स्वीकार की जाती है।\n\n2. खर्च दिया जाता है।"
+
+
+class FakeBackend:
+    name = "fake"
+    batch_chars = 1000
+
+    def __init__(self):
+        self.requests = []
+
+    def translate_batch(self, segments, src, dest):
+        self.requests.append(list(segments))
+        return [f"<hi>{segment}</hi>" for segment in segments]
+
+
+def stream_of(text, size=7):
+    return lambda client, messages, max_tokens: (text[i:i + size] for i in range(0, len(text), size))
+
+
+def test_reply_with_end_marker_is_complete():
+    reply = f"{bilingual.ENGLISH_MARKER}\n{ENGLISH}\n{bilingual.HINDI_MARKER}\n{HINDI}\n{bilingual.END_MARKER}"
+    english, hindi, complete = bilingual.parse_bilingual(reply)
+    assert english == ENGLISH
+    assert hindi == HINDI
+    assert complete
+
+
+def test_reply_cut_off_before_end_marker_is_not_complete():
+    reply = f"{bilingual.ENGLISH_MARKER}\n{ENGLISH}\n{bilingual.HINDI_MARKER}\n{HINDI[:20]}"
+    _, hindi, complete = bilingual.parse_bilingual(reply)
+    assert hindi
+    assert not complete
+
+
+def test_stream_translates_english_paragraphs_missing_from_a_cut_off_reply():
+    backend = FakeBackend()
+    reply = f"{bilingual.ENGLISH_MARKER}\n{ENGLISH}\n{bilingual.HINDI_MARKER}\n{HINDI[:40]}"
+    stream = bilingual.BilingualStream(None, [], backend=backend, stream_fn=stream_of(reply))
+    assert "".join(stream.english()).strip() == ENGLISH
+    hindi = "".join(stream.hindi())
+    assert stream.mode == "fallback"
+    # The finished first Hindi paragraph is kept; only the second English paragraph is translated
+    assert hindi.startswith("1. अपील स्वीकार की जाती है।\n\n")
+    assert hindi.rstrip().endswith("<hi>2. Costs are awarded.</hi>")
+    assert backend.requests == [["2. Costs are awarded."]]
+
+
+def test_stream_with_end_marker_keeps_the_model_translation():
+    backend = FakeBackend()
+    reply = f"{bilingual.ENGLISH_MARKER}\n{ENGLISH}\n{bilingual.HINDI_MARKER}\n{HINDI}\n{bilingual.END_MARKER}"
+    stream = bilingual.BilingualStream(None, [], backend=backend, stream_fn=stream_of(reply))
+    "".join(stream.english())
+    assert "".join(stream.hindi()).strip() == HINDI
+    assert stream.mode == "single"
+    assert backend.requests == []
@@ -0,0 +1,61 @@
+import os
+import json
+import numpy as np
+from entity_index import entity_index
+from citation_graph import CitationGraph, build_csr, pagerank
+
+sample_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output_files", "response_context.json")
+
+
+def citing_judgment(tid):
+    return {
+        "tid": tid, "title": f"Case {tid}", "docsource": "Supreme Court of India", "publishdate": "2001-01-01",
+        "doc": '<p>1. As held in AIR 1987 Gau 73 and <a href="/doc/5192/">Manohar Lal v. Seth Hiralal</a>, '
+               '<a href="/doc/56600062/">Section 151</a>, C.P.C. applies.</p>',
+    }
+
+
+def make_graph(tmp_path):
+    with open(sample_path, encoding="utf-8") as file:
+        sample = json.load(file)
+    judgments = [sample] + [citing_judgment(900 + i) for i in range(3)]
+    entity_index.index_judgments(judgments, cache=False)
+    graph = CitationGraph(str(tmp_path / "graph"))
+    graph.add_judgments(judgments)
+    graph.flush()
+    return graph, sample
+
+
+def test_pagerank_sums_to_one_and_favours_cited_nodes():
+    node_ids, indptr, indices = build_csr({1: {3}, 2: {3}, 4: {3, 1}})
+    scores, _ = pagerank(indptr, indices)
+    assert abs(scores.sum() - 1) < 1e-9
+    assert node_ids[np.argmax(scores)] == 3
+
+
+def test_statute_pages_are_not_nodes(tmp_path):
+    graph, sample = make_graph(tmp_path)
+    nodes = set(graph.snapshot()[0].tolist())
+    assert not nodes & {56600062, 85279687, 161831507, 679372}
+    assert {5192, sample["tid"]} <= nodes
+    assert graph.top(2)[0]["tid"] in {"5192", str(sample["tid"])}
+
+
+def test_recomputes_are_batched(tmp_path):
+    graph, _ = make_graph(tmp_path)
+    updates = graph.updates
+    graph.add_judgments([citing_judgment(950)])
+    graph.add_judgments([citing_judgment(951)])
+    assert graph.updates == updates and graph.stats()["pending_judgments"] == 2
+    graph.flush()
+    assert graph.updates == updates + 1 and graph.stats()["pending_judgments"] == 0
+
+
+def test_rerank_scales_authority_over_the_whole_graph(tmp_path):
+    graph, sample = make_graph(tmp_path)
+    # A judgment that cites others but is cited by nobody has the lowest authority in the graph, so
+    # being the only cached result in the pool does not move it up
+    docs = [{"tid": 111}, {"tid": 222}, {"tid": 901}]
+    assert [doc["tid"] for doc in graph.rerank(docs)] == [111, 222, 901]
+    docs = [{"tid": 111}, {"tid": sample["tid"]}, {"tid": 222}]
+    assert graph.rerank(docs, weight=0.6)[0]["tid"] == sample["tid"]
@@ -0,0 +1,54 @@
+import os
+import json
+import pytest
+from entity_index import EntityIndex, extract_entities, parse_section_reference
+
+sample_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output_files", "response_context.json")
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(sample_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+@pytest.fixture()
+def index(tmp_path, sample):
+    index = EntityIndex(str(tmp_path / "entities.sqlite3"))
+    index.index_judgments([sample], cache=False)
+    return index
+
+
+def test_comma_and_bare_abbreviation_sections_link_to_their_act(sample):
+    entities = extract_entities(sample, cache=False)
+    cpc_151 = entities[("section", "code of civil procedure 1908|151")][1]
+    unlinked_151 = entities.get(("section", "|151"), [None, 0])[1]
+    # "Section 151, C.P.C." and "Section 151 C.P.C." are linked to the Code, not left bare
+    assert cpc_151 > unlinked_151
+    assert entities[("section", "code of civil procedure 1908|10")][1] > 2
+
+
+def test_by_section_finds_cpc_sections(index, sample):
+    assert index.by_section("Section 151 of CPC") == [str(sample["tid"])]
+    assert index.by_section("Section 151, C.P.C.") == [str(sample["tid"])]
+
+
+def test_statute_links_are_not_indexed_as_judgments(sample):
+    links = {key for field, key in extract_entities(sample, cache=False) if field == "link"}
+    # Section 151, Section 10 and "of C.P.C" pages; precedents like Manohar Lal (5192) stay
+    assert not links & {"56600062", "85279687", "161831507"}
+    assert "5192" in links
+
+
+def test_free_text_section_questions_are_not_answered_locally(index):
+    assert parse_section_reference("section 10 of the code of civil procedure stay of suit") is None
+    assert index.search("section 10 of the code of civil procedure stay of suit") is None
+    response = index.search("Section 10 of the Code of Civil Procedure")
+    assert response["query_type"] == "section" and response["docs"]
+    assert response["docs"][0]["snippet"]
+
+
+def test_structured_queries(index, sample):
+    tid = str(sample["tid"])
+    assert [doc["tid"] for doc in index.search("judgments by K.N. Saikia")["docs"]] == [tid]
+    assert index.by_citation("AIR 1987 Gau. 73") == [tid]
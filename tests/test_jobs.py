@@ -0,0 +1,68 @@
+import pytest
+import jobs
+
+
+@pytest.mark.parametrize("webhook", [
+    "https://hooks.example.com/done",
+    "http://api.example.com:8080/jobs",
+    "https://example.com/done",
+])
+def test_allowed_webhooks(webhook):
+    assert jobs.validate_webhook(webhook, ["hooks.example.com", ".example.com"]) == webhook
+
+
+@pytest.mark.parametrize("webhook", [
+    "http://169.254.169.254/latest/meta-data/",
+    "http://localhost:5000/admin",
+    "https://example.com.evil.net/",
+    "https://evilexample.com/",
+    "file:///etc/passwd",
+    "gopher://example.com/",
+])
+def test_rejected_webhooks(webhook):
+    with pytest.raises(ValueError):
+        jobs.validate_webhook(webhook, [".example.com"])
+
+
+def test_submit_rejects_webhooks_without_an_allowlist(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0).register("echo", lambda payload, name: name)
+    with pytest.raises(ValueError):
+        queue.submit("echo", "a.txt", b"", webhook="https://example.com/done")
+
+
+def test_finish_requires_the_current_claim(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0).register("echo", lambda payload, name: name)
+    job_id = queue.submit("echo", "a.txt", b"")
+    assert queue._claim("worker-1", [])["id"] == job_id
+    # The lease expires and a second worker takes the job over
+    queue._connection().execute("UPDATE jobs SET started_at = 0 WHERE id = ?", (job_id,))
+    assert queue._claim("worker-2", [])["id"] == job_id
+    assert not queue._finish(job_id, "worker-1", result="stale")
+    assert queue._finish(job_id, "worker-2", result="fresh")
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == "fresh"
+    assert job["attempts"] == 2
+
+
+def test_job_fails_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_MAX_ATTEMPTS", 2)
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0).register("echo", lambda payload, name: name)
+    job_id = queue.submit("echo", "a.txt", b"")
+    for attempt in range(2):
+        assert queue._claim(f"worker-{attempt}", [])["id"] == job_id
+        queue._connection().execute("UPDATE jobs SET started_at = 0 WHERE id = ?", (job_id,))
+    abandoned = []
+    assert queue._claim("worker-3", abandoned) is None
+    assert [row["id"] for row in abandoned] == [job_id]
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "2 attempts" in job["error"]
+
+
+def test_kind_without_handler_is_queued_but_not_claimed(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0).register("analyze")
+    job_id = queue.submit("analyze", "a.pdf", b"")
+    assert queue._claim("worker-1", []) is None
+    runner = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), workers=0).register("analyze", lambda payload, name: name)
+    assert runner._claim("worker-2", [])["id"] == job_id
@@ -0,0 +1,12 @@
+import judgment_parser
+
+
+def test_changed_body_is_parsed_again():
+    payload = {"tid": 987654, "title": "A v. B", "doc": "<p>1. The appeal is dismissed.</p>"}
+    first = judgment_parser.parse_payload(payload)
+    assert "dismissed" in first["paragraphs"][0]["text"]
+    amended = dict(payload, doc="<p>1. The appeal is allowed.</p>")
+    second = judgment_parser.parse_payload(amended)
+    assert "allowed" in second["paragraphs"][0]["text"]
+    # The unchanged body is still served from the cache
+    assert judgment_parser.parse_payload(amended) == second
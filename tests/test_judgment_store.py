@@ -0,0 +1,37 @@
+import time
+import judgment_store
+import kanoon_client
+from judgment_store import JudgmentStore
+
+
+def test_only_live_searches_are_recorded(monkeypatch):
+    calls = []
+
+    def fake_post(path, params=None):
+        calls.append(params["formInput"])
+        return {"found": "1 - 1 of 1", "docs": [{"tid": 1, "title": "A v. B"}]}
+
+    monkeypatch.setattr(kanoon_client, "_post", fake_post)
+    store = kanoon_client.judgment_store
+    store.flush(5)
+    before = store.stats()["searches"]
+    kanoon_client.search("live search recording test")
+    kanoon_client.search("Live  search recording TEST")
+    store.flush(5)
+    assert calls == ["live search recording test"]
+    assert store.stats()["searches"] == before + 1
+
+
+def test_purge_drops_old_searches_and_caps_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(judgment_store, "JUDGMENT_STORE_MAX_SEARCHES", 3)
+    store = JudgmentStore(str(tmp_path / "judgments.sqlite3"))
+    connection = store._connection()
+    now = time.time()
+    old = now - (judgment_store.JUDGMENT_STORE_SEARCH_DAYS + 1) * 24 * 60 * 60
+    store._write(connection, [("search", (f"old {i}", {"docs": []}), old) for i in range(2)])
+    store._write(connection, [("search", (f"new {i}", {"docs": []}), now) for i in range(5)])
+    with connection:
+        assert store._purge_searches(connection, now) == 4
+    queries = [row[0] for row in connection.execute("SELECT query FROM searches ORDER BY id")]
+    assert queries == ["new 2", "new 3", "new 4"]
+    assert store.stats()["purged_searches"] == 4
@@ -0,0 +1,36 @@
+import time
+from kanoon_cache import TTLCache
+
+
+def test_stale_copy_survives_other_writes(tmp_path):
+    cache = TTLCache("stale_test", ttl=0.05, db_path=str(tmp_path / "cache.sqlite3"), stale_grace=60)
+    cache.set("doc", {"tid": 1})
+    time.sleep(0.1)
+    assert cache.get("doc") is None
+    for i in range(250):
+        cache.set(f"other-{i}", {"tid": i})
+    assert cache.get_stale("doc") == {"tid": 1}
+
+
+def test_stale_copy_from_disk_after_memory_eviction(tmp_path):
+    cache = TTLCache("stale_disk", ttl=0.05, max_entries=1, db_path=str(tmp_path / "cache.sqlite3"), stale_grace=60)
+    cache.set("doc", {"tid": 1})
+    cache.set("other", {"tid": 2})
+    time.sleep(0.1)
+    assert cache.get_stale("doc") == {"tid": 1}
+
+
+def test_entries_past_grace_are_not_served(tmp_path):
+    cache = TTLCache("stale_expired", ttl=0.01, db_path=str(tmp_path / "cache.sqlite3"), stale_grace=0.01)
+    cache.set("doc", {"tid": 1})
+    time.sleep(0.05)
+    assert cache.get_stale("doc") is None
+
+
+def test_disk_size_cap_evicts_least_recently_used(tmp_path):
+    cache = TTLCache("lru_test", ttl=60, max_entries=1, max_disk_entries=100, db_path=str(tmp_path / "cache.sqlite3"))
+    for i in range(300):
+        cache.set(f"key-{i}", i)
+    rows = cache._connection.execute("SELECT COUNT(*) FROM cache_lru_test").fetchone()[0]
+    assert rows <= 100
+    assert cache.get("key-299") == 299
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import pytest
+import requests
+import kanoon_client
+from kanoon_client import CircuitBreaker, CircuitOpenError, KanoonError
+
+
+# Helper function to get a breaker that is half-open: tripped, with its reset timeout already passed
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    return breaker
+
+
+class HangingClient:
+    async def post(self, path, params=None, headers=None):
+        await asyncio.sleep(60)
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        raise requests.JSONDecodeError("Expecting value", "<html>", 0)
+
+
+def test_cancelled_trial_releases_the_breaker(monkeypatch):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(kanoon_client, "breaker", breaker)
+    monkeypatch.setattr(kanoon_client, "get_async_client", lambda: HangingClient())
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(kanoon_client._apost("/doc/1/"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    # The next call is let through as a new trial instead of being rejected
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_unexpected_error_in_trial_counts_as_failure(monkeypatch):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(kanoon_client, "breaker", breaker)
+
+    def broken_post(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(kanoon_client.session, "post", broken_post)
+    with pytest.raises(RuntimeError):
+        kanoon_client._post("/doc/1/")
+    assert not breaker._trial_in_flight
+    assert breaker.failures == 2
+
+
+def test_non_json_body_falls_back_to_the_stale_copy(monkeypatch):
+    monkeypatch.setattr(kanoon_client, "breaker", CircuitBreaker())
+    monkeypatch.setattr(kanoon_client.session, "post", lambda *args, **kwargs: FakeResponse())
+    with pytest.raises(KanoonError):
+        kanoon_client._post("/doc/1/")
+    assert kanoon_client.breaker.failures == 1
+
+    kanoon_client.doc_cache.set("stale-json-test", {"tid": 1, "doc": "<p>cached</p>"})
+    monkeypatch.setattr(kanoon_client.doc_cache, "get", lambda key: None)
+    assert kanoon_client.fetch_doc("stale-json-test")["doc"] == "<p>cached</p>"
+
+
+def test_async_search_keeps_blocking_lookups_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def record(*args):
+        threads.append(threading.get_ident())
+        return None
+
+    async def fake_fetch(query, pagenum):
+        return {"docs": [{"tid": 1}]}
+
+    monkeypatch.setattr(kanoon_client.search_cache, "get", record)
+    monkeypatch.setattr(kanoon_client.search_cache, "set", record)
+    monkeypatch.setattr(kanoon_client, "_local_first", record)
+    monkeypatch.setattr(kanoon_client, "_afetch_search", fake_fetch)
+
+    async def search():
+        return threading.get_ident(), await kanoon_client.async_search("off loop test")
+
+    loop_thread, data = asyncio.run(search())
+    assert data == {"docs": [{"tid": 1}]}
+    assert len(threads) == 3
+    assert loop_thread not in threads
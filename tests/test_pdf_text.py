@@ -0,0 +1,41 @@
+import os
+import pdf_text
+
+
+# Helper function to build a small PDF with one line of text per page
+def make_pdf(texts):
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+    pdf, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    return pdf + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+
+def test_parallel_extraction_matches_sequential(monkeypatch):
+    monkeypatch.setattr(pdf_text, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_text, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(pdf_text, "PDF_WORKERS", 2)
+    data = make_pdf([f"Page number {number}" for number in range(5)])
+    sequential = list(pdf_text.iter_pdf_pages(data, parallel=False))
+    pdf_text.page_cache.clear()
+    before = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    parallel = list(pdf_text.iter_pdf_pages(data))
+    assert parallel == sequential
+    assert [text.strip() for text in parallel] == [f"Page number {number}" for number in range(5)]
+    # The shared memory handed to the workers is freed once extraction finishes
+    if os.path.isdir("/dev/shm"):
+        assert not set(os.listdir("/dev/shm")) - before
@@ -0,0 +1,15 @@
+from prefix_cache import PrefixTracker
+
+
+def test_estimate_and_confirmed_tokens_are_reported_separately():
+    tracker = PrefixTracker()
+    messages = [{"role": "system", "content": "You are a legal advisor. " * 20},
+                {"role": "user", "content": "Query: bail under section 437"}]
+    tracker.record(messages)
+    tracker.record(messages, cached_tokens=64)
+    stats = tracker.stats()
+    assert stats["prefill_tokens_reusable_estimate"] > 0
+    assert stats["prefill_tokens_cached_confirmed"] == 64
+    assert stats["reported_requests"] == 1
+    assert stats["prefill_tokens_cached_confirmed_per_request"] == 64
+    assert "prefill_tokens_saved" not in stats
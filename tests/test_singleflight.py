@@ -0,0 +1,118 @@
+import gc
+import asyncio
+import threading
+import time
+from singleflight import SingleFlight, AsyncSingleFlight
+
+
+def slow_tokens(count, delay=0.01):
+    for i in range(count):
+        time.sleep(delay)
+        yield f"t{i}"
+
+
+def test_stream_shares_one_upstream():
+    flights = SingleFlight("test")
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        yield from slow_tokens(5)
+
+    first = flights.stream("key", upstream)
+    second = flights.stream("key", upstream)
+    assert list(first) == list(second) == [f"t{i}" for i in range(5)]
+    assert len(calls) == 1
+    assert flights.stats()["shared"] == 1
+
+
+def test_stream_survives_leader_disconnect():
+    flights = SingleFlight("test")
+    leader = flights.stream("key", slow_tokens, 10)
+    follower = flights.stream("key", slow_tokens, 10)
+    assert next(leader) == "t0"
+    # The leader's client goes away partway through
+    leader.close()
+    assert list(follower) == [f"t{i}" for i in range(10)]
+
+
+def test_follower_is_not_paced_by_leader():
+    flights = SingleFlight("test")
+    leader = flights.stream("key", slow_tokens, 5)
+    follower = flights.stream("key", slow_tokens, 5)
+    next(leader)
+    started = time.perf_counter()
+    assert len(list(follower)) == 5
+    # The leader stopped reading after one item, yet the follower got every item at upstream speed
+    assert time.perf_counter() - started < 1
+
+
+def test_stream_error_reaches_every_subscriber():
+    flights = SingleFlight("test")
+
+    def failing():
+        yield "a"
+        raise ValueError("upstream failed")
+
+    results = []
+
+    def consume():
+        try:
+            list(flights.stream("key", failing))
+        except ValueError as e:
+            results.append(str(e))
+
+    threads = [threading.Thread(target=consume) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["upstream failed"] * 3
+
+
+def test_unread_stream_releases_its_subscription_when_dropped():
+    flights = SingleFlight("test")
+    produced = []
+
+    def upstream():
+        for token in slow_tokens(100):
+            produced.append(token)
+            yield token
+
+    stream = flights.stream("key", upstream)
+    # The caller never iterates the stream, so its generator's `finally` never runs
+    del stream
+    gc.collect()
+    time.sleep(0.1)
+    assert len(produced) < 100
+    assert flights.stats()["in_flight"] == 0
+
+
+async def slow_async_tokens(count, delay=0.01):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield f"t{i}"
+
+
+def test_async_stream_survives_leader_disconnect():
+    async def scenario():
+        flights = AsyncSingleFlight("test")
+        leader = flights.stream("key", slow_async_tokens, 10)
+        follower = flights.stream("key", slow_async_tokens, 10)
+        assert await leader.__anext__() == "t0"
+        await leader.aclose()
+        return [token async for token in follower]
+
+    assert asyncio.run(scenario()) == [f"t{i}" for i in range(10)]
+
+
+def test_unread_async_stream_releases_its_subscription_when_dropped():
+    async def scenario():
+        flights = AsyncSingleFlight("test")
+        stream = flights.stream("key", slow_async_tokens, 100)
+        del stream
+        gc.collect()
+        await asyncio.sleep(0.1)
+        return flights.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
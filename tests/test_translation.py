@@ -0,0 +1,19 @@
+import translation
+
+
+def test_segment_use_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(translation, "TRANSLATION_MEMORY_TRACKED", 3)
+    monkeypatch.setattr(translation, "_segment_uses", translation.OrderedDict())
+    for number in range(5):
+        translation.translation_cache.set(f"bounded-{number}", f"translated {number}")
+        assert translation._cached(f"bounded-{number}") == f"translated {number}"
+    assert list(translation._segment_uses) == ["bounded-2", "bounded-3", "bounded-4"]
+
+
+def test_reused_segment_is_promoted_to_phrase_memory(monkeypatch):
+    monkeypatch.setattr(translation, "_segment_uses", translation.OrderedDict())
+    translation.translation_cache.set("promoted", "अनुवाद")
+    for _ in range(translation.TRANSLATION_MEMORY_MIN_USES):
+        translation._cached("promoted")
+    assert "promoted" not in translation._segment_uses
+    assert translation.phrase_memory.get("promoted") == "अनुवाद"
@@ -0,0 +1,76 @@
+import json
+import pickle
+import numpy as np
+import vector_index
+
+
+# Stand-in for the faiss module: an exact inner-product index that records how often it is built
+class FakeFaiss:
+    METRIC_INNER_PRODUCT = 0
+    built = 0
+
+    class ScalarQuantizer:
+        QT_fp16 = 1
+
+    class IndexHNSWSQ:
+        def __init__(self, dimension, qtype, m, metric):
+            FakeFaiss.built += 1
+            self.vectors = np.zeros((0, dimension), dtype=np.float32)
+
+        @property
+        def ntotal(self):
+            return len(self.vectors)
+
+        def add(self, vectors):
+            self.vectors = np.vstack([self.vectors, vectors])
+
+        def search(self, queries, k):
+            scores = queries @ self.vectors.T
+            rows = np.argsort(-scores, axis=1)[:, :k]
+            return np.take_along_axis(scores, rows, axis=1), rows
+
+    @staticmethod
+    def write_index(index, path):
+        with open(path, "wb") as file:
+            pickle.dump(index, file)
+
+    @staticmethod
+    def read_index(path):
+        try:
+            with open(path, "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError as e:
+            raise RuntimeError(str(e))
+
+
+def write_chunks(path, tids):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((len(tids), 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(path / "embeddings.npy", vectors.astype(np.float16))
+    with open(path / "chunks.json", "w", encoding="utf-8") as file:
+        json.dump([{"tid": tid, "title": "", "chunk": 0, "text": str(tid)} for tid in tids], file)
+    return vectors
+
+
+def test_hnsw_index_is_saved_and_rebuilt_only_when_chunks_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "faiss", FakeFaiss)
+    monkeypatch.setattr(vector_index, "VECTOR_ANN_THRESHOLD", 0)
+    FakeFaiss.built = 0
+    vectors = write_chunks(tmp_path, [1, 2, 3])
+
+    first = vector_index.VectorIndex(str(tmp_path))
+    assert FakeFaiss.built == 1
+    assert (tmp_path / "hnsw.faiss").exists()
+
+    second = vector_index.VectorIndex(str(tmp_path))
+    assert FakeFaiss.built == 1
+    assert second.ann.ntotal == 3
+    _, rows = second.ann.search(vectors[1:2], 1)
+    assert rows[0][0] == 1
+    assert first.fingerprint == second.fingerprint
+
+    write_chunks(tmp_path, [1, 2, 3, 4])
+    third = vector_index.VectorIndex(str(tmp_path))
+    assert FakeFaiss.built == 2
+    assert third.ann.ntotal == 4
@@ -0,0 +1,249 @@
+import os
+import re
+import inspect
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import llm
+from kanoon_cache import TTLCache
+
+try:
+    from googletrans import Translator
+except ImportError:  # googletrans is only needed by the Hindi edition
+    Translator = None
+
+# Lines longer than this are split into sentences, so a cached sentence is reused inside new paragraphs
+TRANSLATION_SEGMENT_CHARS = int(os.getenv("TRANSLATION_SEGMENT_CHARS", 400))
+# Characters of uncached segments sent per request, per backend, and requests in flight at once
+TRANSLATION_GOOGLE_BATCH_CHARS = int(os.getenv("TRANSLATION_GOOGLE_BATCH_CHARS", 4500))
+TRANSLATION_LLM_BATCH_CHARS = int(os.getenv("TRANSLATION_LLM_BATCH_CHARS", 1200))
+TRANSLATION_LLM_MAX_TOKENS = int(os.getenv("TRANSLATION_LLM_MAX_TOKENS", 1500))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", 4))
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", 30 * 24 * 60 * 60))
+# Segments reused this many times (e.g. recurring statute titles and headings) move to the long-lived phrase memory
+TRANSLATION_MEMORY_MIN_USES = int(os.getenv("TRANSLATION_MEMORY_MIN_USES", 3))
+TRANSLATION_MEMORY_TTL = int(os.getenv("TRANSLATION_MEMORY_TTL", 365 * 24 * 60 * 60))
+# Most segments whose reuse is counted toward promotion; the least recently used counts are dropped
+TRANSLATION_MEMORY_TRACKED = int(os.getenv("TRANSLATION_MEMORY_TRACKED", 50000))
+
+LANGUAGE_NAMES = {"en": "English", "hi": "Hindi"}
+
+# Translated segments keyed by the hash of backend, language pair and source text
+translation_cache = TTLCache("translation", ttl=TRANSLATION_CACHE_TTL)
+phrase_memory = TTLCache("translation_memory", ttl=TRANSLATION_MEMORY_TTL)
+
+_line_re = re.compile(r"(\n+)")
+_sentence_re = re.compile(r"(?<=[.!?।])(\s+)")
+_padding_re = re.compile(r"^(\s*)(.*?)(\s*)$", re.DOTALL)
+_letter_re = re.compile(r"[^\W\d_]")
+_numbered_re = re.compile(r"^\s*\[?(\d+)\]?\s*[:.)\]-]\s?(.*)$")
+
+_segment_uses = OrderedDict()
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+# Translation through Google Translate (googletrans); segments are joined into one request per batch
+class GoogleBackend:
+    name = "google"
+    batch_chars = TRANSLATION_GOOGLE_BATCH_CHARS
+
+    def __init__(self):
+        if Translator is None:
+            raise RuntimeError("googletrans is not installed")
+        self.translator = Translator()
+
+    def translate_batch(self, segments, src, dest):
+        translated = self.translator.translate("\n".join(segments), src=src, dest=dest).text.split("\n")
+        if len(translated) == len(segments):
+            return translated
+        # Google merged or split lines; translate the segments one by one instead
+        logging.info(f"Batched translation returned {len(translated)} lines for {len(segments)} segments; retrying individually.")
+        return [result.text for result in self.translator.translate(segments, src=src, dest=dest)]
+
+
+# Translation through the chat model; segments are numbered so one completion translates a whole batch
+class LLMBackend:
+    name = "llm"
+    batch_chars = TRANSLATION_LLM_BATCH_CHARS
+
+    def __init__(self, client):
+        self.client = client
+
+    def build_messages(self, segments, src, dest):
+        numbered = "\n".join(f"{number}: {segment}" for number, segment in enumerate(segments, start=1))
+        prompt = inspect.cleandoc(f"""
+            Translate each numbered line from {LANGUAGE_NAMES.get(src, src)} into {LANGUAGE_NAMES.get(dest, dest)}.
+            Reply with exactly one line per number, as "number: translation", and nothing else.
+            Keep markdown, numbering, case names, section numbers and citations as they are.
+        """)
+        return [
+            {"role": "system", "content": f"You are a professional translator in {LANGUAGE_NAMES.get(dest, dest).lower()} language."},
+            {"role": "user", "content": f"{prompt}\n\n{numbered}"},
+        ]
+
+    def _request(self, segments, src, dest):
+        response = llm.generate(self.client, self.build_messages(segments, src, dest), max_tokens=TRANSLATION_LLM_MAX_TOKENS)
+        translated = {}
+        for line in response.splitlines():
+            match = _numbered_re.match(line)
+            if match and 1 <= int(match.group(1)) <= len(segments):
+                translated.setdefault(int(match.group(1)) - 1, match.group(2).strip())
+        return translated
+
+    def translate_batch(self, segments, src, dest):
+        translated = self._request(segments, src, dest)
+        missing = [index for index in range(len(segments)) if index not in translated]
+        if missing:
+            # Ask once more for the lines the model skipped; anything still missing stays untranslated
+            retried = self._request([segments[index] for index in missing], src, dest)
+            for position, index in enumerate(missing):
+                if position in retried:
+                    translated[index] = retried[position]
+        return [translated.get(index) for index in range(len(segments))]
+
+
+_google_backend = None
+_google_backend_lock = threading.Lock()
+
+
+# Helper function to get the shared Google Translate backend, created on first use
+def google_backend():
+    global _google_backend
+    if _google_backend is None:
+        with _google_backend_lock:
+            if _google_backend is None:
+                _google_backend = GoogleBackend()
+    return _google_backend
+
+
+# Helper function to split text into (prefix, segment, suffix) parts. Segments are single lines, or
+# sentences of long lines; parts without letters (blank lines, numbers) are kept as-is with segment None.
+def split_segments(text):
+    parts = []
+    for piece in _line_re.split(text):
+        if not piece:
+            continue
+        pieces = _sentence_re.split(piece) if len(piece) > TRANSLATION_SEGMENT_CHARS else [piece]
+        for sentence in pieces:
+            prefix, segment, suffix = _padding_re.match(sentence).groups()
+            if _letter_re.search(segment):
+                parts.append((prefix, segment, suffix))
+            else:
+                parts.append((sentence, None, ""))
+    return parts
+
+
+# Helper function to build the cache key for one segment
+def segment_key(backend, src, dest, segment):
+    return hashlib.sha256(f"{backend.name}|{src}|{dest}|{segment}".encode("utf-8")).hexdigest()
+
+
+# Helper function to look a segment up in the phrase memory, then the translation cache
+def _cached(key):
+    translated = phrase_memory.get(key)
+    if translated is not None:
+        _count("memory_hits")
+        return translated
+    translated = translation_cache.get(key)
+    if translated is None:
+        return None
+    _count("cache_hits")
+    with _stats_lock:
+        uses = _segment_uses.pop(key, 0) + 1
+        promote = uses >= TRANSLATION_MEMORY_MIN_USES
+        if not promote:
+            _segment_uses[key] = uses
+            if len(_segment_uses) > TRANSLATION_MEMORY_TRACKED:
+                _segment_uses.popitem(last=False)
+    if promote:
+        phrase_memory.set(key, translated)
+    return translated
+
+
+# Helper function to bump a translation counter
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+# Helper function to group segments into batches of at most `max_chars` characters
+def make_batches(segments, max_chars):
+    batches, batch, size = [], [], 0
+    for segment in segments:
+        if batch and size + len(segment) > max_chars:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(segment)
+        size += len(segment) + 1
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Helper function to translate one batch, caching each translated segment
+def _translate_batch(backend, batch, src, dest):
+    _count("requests")
+    _count("chars_translated", sum(len(segment) for segment in batch))
+    try:
+        translated = backend.translate_batch(batch, src, dest)
+    except Exception as e:
+        logging.error(f"Translation batch of {len(batch)} segments failed: {e}")
+        translated = [None] * len(batch)
+    results = {}
+    for segment, text in zip(batch, translated):
+        if text:
+            translation_cache.set(segment_key(backend, src, dest, segment), text)
+            results[segment] = text
+        else:
+            _count("untranslated")
+            results[segment] = segment
+    return results
+
+
+# Generator yielding the translation of `text` piece by piece, in order. Cached segments are
+# yielded immediately; the rest are deduplicated and translated in batches, concurrently.
+def stream_translation(text, src, dest, backend=None, max_workers=TRANSLATION_WORKERS):
+    backend = backend or google_backend()
+    parts = split_segments(text)
+    translated = {}
+    pending = {}
+    for _, segment, _ in parts:
+        if segment is None or segment in translated or segment in pending:
+            continue
+        cached = _cached(segment_key(backend, src, dest, segment))
+        if cached is not None:
+            translated[segment] = cached
+        else:
+            pending[segment] = None
+    _count("segments", sum(1 for _, segment, _ in parts if segment is not None))
+
+    batches = make_batches(pending, backend.batch_chars)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches))))
+    try:
+        results = executor.map(lambda batch: _translate_batch(backend, batch, src, dest), batches)
+        for prefix, segment, suffix in parts:
+            if segment is not None:
+                while segment not in translated:
+                    translated.update(next(results))
+                yield f"{prefix}{translated[segment]}{suffix}"
+            else:
+                yield prefix
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Helper function to translate text through the segment cache and batched backend requests
+def translate(text, src, dest, backend=None):
+    return "".join(stream_translation(text, src, dest, backend))
+
+
+# Helper function to report translation cache and request metrics
+def translation_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["cache"] = translation_cache.stats()
+    stats["phrase_memory"] = phrase_memory.stats()
+    return stats
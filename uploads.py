@@ -0,0 +1,47 @@
+import io
+import os
+import codecs
+import shutil
+import tempfile
+
+# Uploads from non-seekable streams are buffered in memory up to this size, then spill to disk
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 8 * 1024 * 1024))
+# Bytes read per step when copying or decoding an upload
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+# Helper function to get a seekable, rewound buffer for an upload without copying it when possible.
+# Accepts raw bytes, Werkzeug/Quart FileStorage objects (whose stream is already spooled),
+# Streamlit UploadedFile objects and other file-like objects.
+def open_upload(file):
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return io.BytesIO(file)
+    stream = getattr(file, "stream", file)
+    if stream.seekable():
+        stream.seek(0)
+        return stream
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    shutil.copyfileobj(stream, spooled, UPLOAD_CHUNK_BYTES)
+    spooled.seek(0)
+    return spooled
+
+
+# Helper function to get the whole upload as bytes. This is one full copy of the upload: getvalue()
+# copies an in-memory buffer without reading it through, and other uploads are read from the start.
+# Callers read it once and share the bytes between stages (see app.run_document_pipeline).
+def read_upload(upload):
+    if isinstance(upload, io.BytesIO):
+        return upload.getvalue()
+    upload.seek(0)
+    return upload.read()
+
+
+# Generator decoding a text upload chunk by chunk instead of decoding one large bytes object
+def iter_decoded(upload, encoding="utf-8"):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from local_index import document_body, iter_cached_documents
+from prompt_builder import count_tokens
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Embedding model (same one used by output_files/testing.py) and index location
+VECTOR_MODEL = os.getenv("VECTOR_MODEL", "all-MiniLM-L6-v2")
+vector_directory = os.path.abspath(os.getenv("VECTOR_INDEX_DIR", os.path.join("output_files", "index", "vectors")))
+
+# Chunking, encoding and storage settings
+CHUNK_WORDS = int(os.getenv("VECTOR_CHUNK_WORDS", 180))
+CHUNK_OVERLAP = int(os.getenv("VECTOR_CHUNK_OVERLAP", 30))
+ENCODE_BATCH_SIZE = int(os.getenv("VECTOR_BATCH_SIZE", 64))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")
+# Above this many chunks an HNSW index is used (when faiss is installed) instead of a full matmul;
+# it is saved next to the chunk files and rebuilt only when the chunks change
+VECTOR_ANN_THRESHOLD = int(os.getenv("VECTOR_ANN_THRESHOLD", 200000))
+# Rows scored per matmul block, so a memory-mapped matrix is never fully materialised as float32
+SCORE_BLOCK_ROWS = 65536
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+# Helper function to check whether sentence-transformers is installed
+def available():
+    return SentenceTransformer is not None
+
+
+# Helper function to load the embedding model once and keep it warm
+def get_encoder():
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                logging.info(f"Loading embedding model {VECTOR_MODEL}...")
+                _encoder = SentenceTransformer(VECTOR_MODEL, device="cpu")
+    return _encoder
+
+
+# Helper function to batch-encode texts into L2-normalised float32 vectors
+def encode(texts):
+    return get_encoder().encode(
+        list(texts),
+        batch_size=ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    ).astype(np.float32)
+
+
+# Helper function to split text into overlapping word windows
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(1, len(words) - overlap), step)]
+
+
+# Helper function to store embeddings compactly: float16, or int8 with a per-row scale
+def quantize(embeddings, dtype=VECTOR_DTYPE):
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1, keepdims=True) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(embeddings / scales).astype(np.int8), scales.astype(np.float32).ravel()
+    return embeddings.astype(np.float16), None
+
+
+# Chunk and encode every document and write the matrix and chunk metadata to disk
+def build_vector_index(documents, path=vector_directory, dtype=VECTOR_DTYPE):
+    chunks = []
+    for payload in documents:
+        for number, chunk in enumerate(chunk_text(document_body(payload, cache=False))):
+            chunks.append({"tid": payload.get("tid"), "title": payload.get("title", ""), "chunk": number, "text": chunk})
+    os.makedirs(path, exist_ok=True)
+    embeddings = encode([chunk["text"] for chunk in chunks]) if chunks else np.zeros((0, 1), dtype=np.float32)
+    matrix, scales = quantize(embeddings, dtype)
+    np.save(os.path.join(path, "embeddings.npy"), matrix)
+    if scales is not None:
+        np.save(os.path.join(path, "scales.npy"), scales)
+    elif os.path.exists(os.path.join(path, "scales.npy")):
+        os.unlink(os.path.join(path, "scales.npy"))
+    with open(os.path.join(path, "chunks.json"), "w", encoding="utf-8") as file:
+        json.dump(chunks, file, ensure_ascii=False, separators=(",", ":"))
+    logging.info(f"Built vector index with {len(chunks)} chunks.")
+    # Build and save the HNSW index now, so the server does not build it on first load
+    if faiss is not None and len(chunks) > VECTOR_ANN_THRESHOLD:
+        VectorIndex(path)
+    return len(chunks)
+
+
+# Memory-mapped matrix of chunk embeddings answering top-k cosine queries
+class VectorIndex:
+    def __init__(self, path=vector_directory):
+        self.matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        with open(os.path.join(path, "chunks.json"), "rb") as file:
+            raw = file.read()
+        self.chunks = json.loads(raw)
+        self.fingerprint = hashlib.sha256(raw).hexdigest()
+        self.rows_by_tid = {}
+        for row, chunk in enumerate(self.chunks):
+            self.rows_by_tid.setdefault(str(chunk["tid"]), []).append(row)
+        self.ann = None
+        if faiss is not None and len(self.chunks) > VECTOR_ANN_THRESHOLD:
+            self.ann = self._load_ann(path) or self._build_ann(path)
+
+    # Load the saved HNSW index if it was built from the current chunks; None otherwise
+    def _load_ann(self, path):
+        try:
+            with open(os.path.join(path, "hnsw.json"), encoding="utf-8") as file:
+                if json.load(file).get("fingerprint") != self.fingerprint:
+                    return None
+            ann = faiss.read_index(os.path.join(path, "hnsw.faiss"))
+        except (OSError, ValueError, RuntimeError):
+            return None
+        logging.info(f"Loaded HNSW index over {ann.ntotal} chunks.")
+        return ann
+
+    # Build the HNSW index block by block with float16 storage, so no float32 copy of the whole
+    # matrix is held, and save it with the fingerprint of the chunks it covers
+    def _build_ann(self, path):
+        logging.info(f"Building HNSW index over {len(self.chunks)} chunks...")
+        ann = faiss.IndexHNSWSQ(self.matrix.shape[1], faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT)
+        for start in range(0, len(self.chunks), SCORE_BLOCK_ROWS):
+            ann.add(self.vectors(np.arange(start, min(start + SCORE_BLOCK_ROWS, len(self.chunks)))))
+        try:
+            faiss.write_index(ann, os.path.join(path, "hnsw.faiss.tmp"))
+            os.replace(os.path.join(path, "hnsw.faiss.tmp"), os.path.join(path, "hnsw.faiss"))
+            with open(os.path.join(path, "hnsw.json"), "w", encoding="utf-8") as file:
+                json.dump({"fingerprint": self.fingerprint, "chunks": len(self.chunks)}, file)
+        except (OSError, RuntimeError) as e:
+            logging.warning(f"Could not save the HNSW index: {e}")
+        return ann
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # Dequantised float32 vectors for the given rows
+    def vectors(self, rows):
+        block = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[rows][:, None]
+        return block
+
+    # Cosine scores of every row against a normalised query vector, in blocks
+    def scores(self, query_vector):
+        scores = np.empty(len(self.chunks), dtype=np.float32)
+        for start in range(0, len(self.chunks), SCORE_BLOCK_ROWS):
+            rows = np.arange(start, min(start + SCORE_BLOCK_ROWS, len(self.chunks)))
+            scores[rows] = self.vectors(rows) @ query_vector
+        return scores
+
+    # Return (chunk metadata, score) pairs for the k chunks closest to the query
+    def search(self, query, k=5):
+        if not self.chunks:
+            return []
+        query_vector = encode([query])[0]
+        if self.ann is not None:
+            distances, rows = self.ann.search(query_vector[None, :], k)
+            return [(self.chunks[row], float(score)) for row, score in zip(rows[0], distances[0]) if row >= 0]
+        scores = self.scores(query_vector)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.chunks[row], float(scores[row])) for row in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+# Per-tid chunk embeddings for documents that are not in the on-disk index yet
+_chunk_cache = OrderedDict()
+_chunk_cache_lock = threading.Lock()
+CHUNK_CACHE_DOCUMENTS = int(os.getenv("VECTOR_CHUNK_CACHE_DOCUMENTS", 256))
+
+
+# Helper function to get the shared on-disk index, loading it on first use; None when not built yet
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None and os.path.exists(os.path.join(vector_directory, "chunks.json")):
+                _index = VectorIndex()
+                logging.info(f"Loaded vector index with {len(_index)} chunks.")
+    return _index
+
+
+# Helper function to get (chunk texts, embeddings) for a fetched document
+def document_chunks(payload):
+    tid = str(payload.get("tid"))
+    index = get_index()
+    if index is not None and tid in index.rows_by_tid:
+        rows = np.asarray(index.rows_by_tid[tid])
+        return [index.chunks[row]["text"] for row in rows], index.vectors(rows)
+    with _chunk_cache_lock:
+        if tid in _chunk_cache:
+            _chunk_cache.move_to_end(tid)
+            return _chunk_cache[tid]
+    texts = chunk_text(document_body(payload))
+    entry = (texts, encode(texts) if texts else np.zeros((0, 1), dtype=np.float32))
+    with _chunk_cache_lock:
+        _chunk_cache[tid] = entry
+        while len(_chunk_cache) > CHUNK_CACHE_DOCUMENTS:
+            _chunk_cache.popitem(last=False)
+    return entry
+
+
+# Build a prompt context from the passages of the fetched documents most similar to the query,
+# filling the token budget in score order and listing passages under their document title
+def select_passages(query, documents, token_budget):
+    query_vector = encode([query])[0]
+    candidates = []
+    for rank, payload in enumerate(documents):
+        texts, embeddings = document_chunks(payload)
+        if not texts:
+            continue
+        scores = embeddings @ query_vector
+        for number, (text, score) in enumerate(zip(texts, scores)):
+            candidates.append((float(score), rank, number, text))
+    candidates.sort(key=lambda candidate: -candidate[0])
+
+    chosen = []
+    remaining = token_budget
+    for score, rank, number, text in candidates:
+        if remaining <= 0:
+            break
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            continue
+        chosen.append((rank, number, text))
+        remaining -= tokens
+
+    sections = []
+    for rank, payload in enumerate(documents):
+        passages = [text for passage_rank, _, text in sorted(chosen) if passage_rank == rank]
+        if passages:
+            sections.append(f"Title: {payload.get('title', '')}\n" + "\n...\n".join(passages))
+    return "\n\n".join(sections)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        count = build_vector_index(iter_cached_documents())
+        print(f"Encoded {count} chunks into {vector_directory}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "search":
+        started = time.perf_counter()
+        results = get_index().search(" ".join(sys.argv[2:]))
+        elapsed = (time.perf_counter() - started) * 1000
+        for chunk, score in results:
+            print(f"{score:.4f}  [{chunk['tid']}] {chunk['text'][:160]}")
+        print(f"Search took {elapsed:.2f} ms")
+    else:
+        print("Usage: python vector_index.py build | search <query>")